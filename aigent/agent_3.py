@@ -105,18 +105,8 @@ class Agent(baseAgent):
 
     # check if path to target's coordinate is clear, by direction
     def is_clear(self, target_coords):
-        q = self.wm.get_nearest_enemy()
-        if q == None:
-            return False
-        q_coords = self.wm.get_object_absolute_coords(q)
-        qDir = self.wm.get_angle_to_point(q_coords)
-        qDist = self.wm.get_distance_to_point(q_coords)
-        
-        tDir = self.wm.get_angle_to_point(target_coords)
-        tDist = self.wm.get_distance_to_point(target_coords)
-
-        # the closest teammate is closer, or angle is clear
-        return tDist < qDist or abs(qDir - tDir) > 20
+        # the closest enemy is further, or angle is clear
+        return self.wm.is_clear(target_coords)
 
 
     # Action decisions start
@@ -125,7 +115,7 @@ class Agent(baseAgent):
     def find_ball(self):
         # find the ball
         if self.wm.ball is None or self.wm.ball.direction is None:
-            self.wm.ah.turn(30)
+            self.wm.search_for_ball()
             if not -7 <= self.wm.ball.direction <= 7:
                 self.wm.ah.turn(self.wm.ball.direction / 2)
 
@@ -197,31 +187,26 @@ class Agent(baseAgent):
     # do shoot
     def shoot(self):
         print "shoot"
-        return self.wm.kick_to(self.enemy_goal_pos, 1.0)
+        # aim for the part of the goal furthest from any enemy
+        return self.wm.kick_to(self.wm.get_best_shot(self.enemy_goal_pos), 1.0)
 
-    # condition for passing to the closest teammate
+    # condition for passing to the best placed teammate
     # if can kick ball, teammate is closer to goal, path clear
     def shall_pass(self):
         # self.defaultaction()
-        p = self.wm.get_nearest_teammate()
-        if p == None:
-            return False
-        p_coords = self.wm.get_object_absolute_coords(p)
-        pDistToGoal = self.wm.euclidean_distance(p_coords, self.enemy_goal_pos)
-        myDistToGoal = self.wm.get_distance_to_point(self.enemy_goal_pos)
-        # kickable, pass closer to goal, path is clear
-        return self.wm.is_ball_kickable() and pDistToGoal < myDistToGoal and self.is_clear(p_coords)
+        # kickable, and some teammate closer to goal has a clear lane
+        return self.wm.is_ball_kickable() and self.wm.get_best_pass(self.enemy_goal_pos) is not None
 
     # do passes
     def passes(self):
         print "pass"
-        p = self.wm.get_nearest_teammate()
-        if p == None:
+        best = self.wm.get_best_pass(self.enemy_goal_pos)
+        if best == None:
             return False
-        p_coords = self.wm.get_object_absolute_coords(p)
+        p_coords = best[2]
         dist = self.wm.get_distance_to_point(p_coords)
         power_ratio = 2*dist/55.0
-        # kick to closest teammate, power is scaled
+        # kick to the best placed teammate, power is scaled
         return self.wm.kick_to(p_coords, power_ratio)
 
     # condition for dribbling, if can't shoot or pass
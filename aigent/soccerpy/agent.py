@@ -1,19 +1,54 @@
 #!/usr/bin/env python
 
+import select
 import threading
 import time
 import random
 
+import game_object
 import sock
 import sp_exceptions
 import handler
+import instruments
+import select_loop
+import world_model
 from world_model import WorldModel
 
 class Agent:
+    # ways an agent can run.  the threaded runtime receives messages and
+    # thinks in two separate threads.  the select runtime does both from a
+    # single thread running a SelectLoop, which can be shared by many agents.
+    RUNTIME_THREADED = "threaded"
+    RUNTIME_SELECT = "select"
+
+    # the MessageHandler class our messages are handled with.  subclasses
+    # handling more message types set this to a subclass of their own.
+    MESSAGE_HANDLER = handler.MessageHandler
+
+    # whether messages are received into one reusable buffer per agent and
+    # parsed where they lie, instead of into a new string each.
+    RECEIVE_INTO_BUFFER = False
+
+    # whether the threaded runtime handles every message already waiting on
+    # the socket before waking the think loop, so that the burst the server
+    # starts each cycle with is thought about once, and all at once.
+    DRAIN_MESSAGES = False
+
+    # whether 'see' messages are decoded straight into reusable columns
+    # instead of being parsed into lists first.
+    USE_SEE_DECODER = False
+
+    # how our world model finds our position, one of the
+    # WorldModel.LOCALIZER_* constants.
+    LOCALIZER = WorldModel.LOCALIZER_KMEANS
+
     def __init__(self):
         # whether we're connected to a server yet or not
         self.__connected = False
 
+        # the runtime chosen at connect time
+        self.__runtime = Agent.RUNTIME_THREADED
+
         # set all variables and important objects to appropriate values for
         # pre-connect state.
 
@@ -31,22 +66,37 @@ class Agent:
         self.__thinking = False # think thread and control variable
         self.__think_thread = None
 
-        # whether we should run the think method
-        self.__should_think_on_data = False
+        # set whenever new data arrives that the think method should see.  the
+        # think loop blocks on this instead of polling for new data.
+        self.__data_ready = threading.Event()
+
+        # the number of messages handled since we last thought
+        self.__queued = 0
 
-        # whether we should send commands
-        self.__send_commands = False
+        # set once the server has answered our init message
+        self.__init_replied = threading.Event()
 
         # adding goal post markers
         self.enemy_goal_pos = None
         self.own_goal_pos = None
 
 
-    def connect(self, host, port, teamname, version=11):
+    def connect(self, host, port, teamname, version=11,
+            runtime=RUNTIME_THREADED, loop=None):
         """
         Gives us a connection to the server as one player on a team.  This
         immediately connects the agent to the server and starts receiving and
         parsing the information it sends.
+
+        'runtime' chooses how the agent runs, see RUNTIME_THREADED and
+        RUNTIME_SELECT.  With the select runtime, no threads are started and
+        messages after the server's init reply wait on the socket until the
+        agent starts playing.
+
+        If a SelectLoop is given (select runtime only), connect doesn't wait
+        for the server's reply at all.  The agent joins the loop right away,
+        and the reply and everything after it are handled as the loop runs,
+        so many agents can connect at once without blocking each other.
         """
 
         # if already connected, raise an error since user may have wanted to
@@ -55,6 +105,12 @@ class Agent:
             msg = "Cannot connect while already connected, disconnect first."
             raise sp_exceptions.AgentConnectionStateError(msg)
 
+        if runtime not in (Agent.RUNTIME_THREADED, Agent.RUNTIME_SELECT):
+            raise ValueError("Unknown runtime: '%s'" % runtime)
+
+        if loop is not None and runtime != Agent.RUNTIME_SELECT:
+            raise ValueError("Only the select runtime can connect in a loop.")
+
         # the pipe through which all of our communication takes place
         self.__sock = sock.Socket(host, port)
 
@@ -63,9 +119,32 @@ class Agent:
 
         # set the team name of the world model to the given name
         self.wm.teamname = teamname
+        self.wm.localizer = self.LOCALIZER
 
         # handles all messages received from the server
-        self.msg_handler = handler.MessageHandler(self.wm)
+        self.msg_handler = self.MESSAGE_HANDLER(self.wm,
+                use_see_decoder=self.USE_SEE_DECODER)
+
+        self.__runtime = runtime
+        if runtime == Agent.RUNTIME_SELECT:
+            # everything happens in the thread running the select loop, which
+            # think() sees as both our message and think threads.
+            self.__msg_thread = threading.current_thread()
+            self.__think_thread = threading.current_thread()
+
+            # send the init message and handle the reply that assigns our
+            # port, either now or once the loop receives it.
+            init_msg = "(init %s (version %d))"
+            self.__sock.send(init_msg % (teamname, version))
+            if loop is None:
+                self.msg_handler.handle_message(self.__sock.recv())
+
+            self.__parsing = True
+            self.__connected = True
+
+            if loop is not None:
+                loop.add(self)
+            return
 
         # set up our threaded message receiving system
         self.__parsing = True # tell thread that we're currently running
@@ -79,14 +158,16 @@ class Agent:
 
         # send the init message and allow the message handler to handle further
         # responses.
-        init_address = self.__sock.address
         init_msg = "(init %s (version %d))"
         self.__sock.send(init_msg % (teamname, version))
 
         # wait until the socket receives a response from the server and gets its
-        # assigned port.
-        while self.__sock.address == init_address:
-            time.sleep(0.0001)
+        # assigned port.  the wait is timed so that python 2 lets Ctrl-C
+        # through, which an untimed one never does.
+        while not self.__init_replied.wait(0.5):
+            if not self.__msg_thread.is_alive():
+                msg = "The message thread stopped before the server replied."
+                raise sp_exceptions.AgentConnectionStateError(msg)
 
         # create our thinking thread.  this will perform the actions necessary
         # to play a game of robo-soccer.
@@ -99,11 +180,45 @@ class Agent:
         # something goes wrong beforehand.
         self.__connected = True
 
-    def play(self):
+    def connect_offline(self, server_socket, teamname, use_see_decoder=False):
+        """
+        Sets the agent up to play over the given socket-like object without
+        contacting a server or starting any threads.  The caller then feeds
+        raw messages to self.msg_handler, and calls think() and
+        send_commands() itself, all from the calling thread.  Used to replay
+        recorded server traffic.
+        """
+
+        if self.__connected:
+            msg = "Cannot connect while already connected, disconnect first."
+            raise sp_exceptions.AgentConnectionStateError(msg)
+
+        self.__sock = server_socket
+
+        self.wm = WorldModel(handler.ActionHandler(self.__sock))
+        self.wm.teamname = teamname
+        self.msg_handler = self.MESSAGE_HANDLER(self.wm,
+                use_see_decoder=use_see_decoder)
+
+        # everything runs in the calling thread, which think() then sees as
+        # both our message and think threads.
+        self.__msg_thread = threading.current_thread()
+        self.__think_thread = threading.current_thread()
+
+        self.setup_environment()
+
+        self.__connected = True
+
+    def play(self, loop=None):
         """
         Kicks off the thread that does the agent's thinking, allowing it to play
         during the game.  Throws an exception if called while the agent is
         already playing.
+
+        With the select runtime, the agent is added to the given SelectLoop,
+        and the caller is responsible for running it.  If no loop is given,
+        the agent runs in a loop of its own in the calling thread, and play
+        only returns once the agent disconnects.
         """
 
         # ensure we're connected before doing anything
@@ -119,9 +234,19 @@ class Agent:
         # run the method that sets up the agent's persistant variables
         self.setup_environment()
 
-        # tell the thread that it should be running, then start it
         self.__thinking = True
-        self.__should_think_on_data = True
+
+        if self.__runtime == Agent.RUNTIME_SELECT:
+            if loop is not None:
+                loop.add(self)
+            else:
+                loop = select_loop.SelectLoop()
+                loop.add(self)
+                loop.run()
+            return
+
+        # tell the thread that it should be running, then start it
+        self.__data_ready.set()
         self.__think_thread.start()
 
     def disconnect(self):
@@ -143,26 +268,241 @@ class Agent:
         if not self.__connected:
             return
 
-        # tell the loops to terminate
+        # tell the loops to terminate, waking the think loop so it notices
         self.__parsing = False
         self.__thinking = False
+        self.__data_ready.set()
 
         # tell the server that we're quitting
         self.__sock.send("(bye)")
 
+        # write out our last timings
+        if self.wm.instruments is not None:
+            self.wm.instruments.close()
+
         # tell our threads to join, but only wait breifly for them to do so.
         # don't join them if they haven't been started (this can happen if
         # disconnect is called very quickly after connect).
-        if self.__msg_thread.is_alive():
+        # an offline agent's 'threads' are the calling thread, which can't be
+        # joined.
+        current = threading.current_thread()
+        if self.__msg_thread.is_alive() and self.__msg_thread is not current:
             self.__msg_thread.join(0.01)
 
-        if self.__think_thread.is_alive():
+        if (self.__think_thread.is_alive() and
+                self.__think_thread is not current):
             self.__think_thread.join(0.01)
 
         # reset all standard variables in this object.  self.__connected gets
         # reset here, along with all other non-user defined internal variables.
         Agent.__init__(self)
 
+    @classmethod
+    def preload(cls, server_param_message=None):
+        """
+        Builds the tables agents of this class would otherwise each build the
+        first time they need them: the dispatch tables of our message handler
+        and the unit circle flags are triangulated with.  If given the text
+        of a 'server_param' message, it's parsed too, and every world model
+        that gets the same message shares what it parsed into.  A launcher
+        calls this before forking agents off, so they all start with these.
+        """
+
+        cls.MESSAGE_HANDLER.get_dispatch_table()
+        game_object.unit_circle(world_model.TRIANGULATION_ANGLE_STEP)
+
+        if server_param_message is not None:
+            world_model.load_server_parameters(server_param_message)
+
+    def wait_for_server_parameters(self, timeout=None):
+        """
+        Waits up to 'timeout' seconds, or for as long as it takes if None, for
+        the server's parameters to arrive.  Returns the text of the
+        'server_param' message that carried them, or None if it hasn't come.
+        With the select runtime, messages are handled while we wait, so this
+        must be called before play.
+        """
+
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        while self.__connected and self.wm.server_param_message is None:
+            wait = 0.5
+            if deadline is not None:
+                wait = min(wait, deadline - time.time())
+                if wait <= 0:
+                    break
+
+            # our message thread handles them, unless we're all one thread.
+            # waits are timed so that python 2 lets Ctrl-C through.
+            if self.__runtime == Agent.RUNTIME_SELECT:
+                select.select([self.__sock], [], [], wait)
+                self.process_pending()
+            else:
+                self.wm.server_param_received.wait(wait)
+
+        return self.wm.server_param_message
+
+    def is_connected(self):
+        """
+        Returns whether the agent is currently connected to a server.
+        """
+
+        return self.__connected
+
+    def fileno(self):
+        """
+        Returns the file descriptor of our socket, so a SelectLoop can wait on
+        it.
+        """
+
+        return self.__sock.fileno()
+
+    def enable_instruments(self, path=None, socket_path=None,
+            interval=instruments.DUMP_INTERVAL, name=None):
+        """
+        Starts timing the stages of our runtime with an
+        instruments.Instruments, dumped every 'interval' seconds to the file
+        at 'path' and/or the UNIX datagram socket at 'socket_path', and once
+        more when we disconnect.  'name' identifies us in the dumps, and
+        defaults to our team name and uniform number.  Returns the
+        Instruments.
+        """
+
+        if not self.__connected:
+            msg = "Must be connected to a server to enable instruments."
+            raise sp_exceptions.AgentConnectionStateError(msg)
+
+        if name is None:
+            name = "%s %s" % (self.wm.teamname, self.wm.uniform_number)
+
+        self.wm.instruments = instruments.Instruments(name, path, socket_path,
+                interval)
+        return self.wm.instruments
+
+    def time_until_send(self, now=None):
+        """
+        Returns how many seconds are left until this cycle's commands are due
+        to be sent, negative once they are, or None if there's nothing to send
+        yet.  See the world model's CycleClock.
+        """
+
+        return self.wm.clock.time_until_send(now)
+
+    def send_commands(self):
+        """
+        Sends the commands we've decided on for this cycle right away, and
+        records when they went out.
+        """
+
+        primary = self.wm.ah.primary is not None
+        self.wm.ah.send_commands()
+        self.wm.clock.sent(primary)
+
+        # the time from this cycle's 'sense_body' to our commands going out
+        instruments = self.wm.instruments
+        if instruments is not None and self.wm.clock.arrival is not None:
+            instruments.send_latency.add(time.time() - self.wm.clock.arrival)
+
+    def send_commands_if_due(self, now=None):
+        """
+        Sends this cycle's commands if it's time to, returning whether it was.
+        """
+
+        delay = self.time_until_send(now)
+        if delay is None or delay > 0:
+            return False
+
+        self.send_commands()
+        return True
+
+    def __decide(self):
+        """
+        Thinks once, then tells the clock we've decided on this cycle's
+        commands, unless a new cycle started while we were thinking.
+        """
+
+        # the messages handled since we last thought, which we now catch up on
+        queued = self.__queued
+        self.__queued = 0
+
+        cycle = self.wm.clock.cycles
+        requests = self.wm.ah.primary_requests
+        instruments = self.wm.instruments
+        if instruments is None:
+            self.think()
+        else:
+            start = time.time()
+            self.think()
+            instruments.think.add(time.time() - start)
+            instruments.queue_depth.add(queued)
+
+            # we think whenever messages arrive, whether or not we then send
+            # anything, which is often enough to check whether to dump.
+            instruments.maybe_dump()
+
+        # thinking may have disconnected us
+        if self.__connected:
+            ah = self.wm.ah
+            if self.wm.clock.decide(cycle,
+                    requests=ah.primary_requests - requests):
+                ah.primary_late = True
+
+    def process_pending(self):
+        """
+        Used by SelectLoop to run an agent with the select runtime.  Handles
+        every message waiting on our socket, then thinks once on the result.
+        If a 'sense_body' was among the messages, a new cycle has started, and
+        the commands we just decided on are sent if they're already due.
+        Otherwise the loop sends them once they are.  Returns the number of
+        messages handled and the number of those that were 'sense_body'
+        messages, as a tuple.  More than one 'sense_body' means we fell behind
+        by whole cycles.
+        """
+
+        count = 0
+        cycles = 0
+        while self.__parsing:
+            msg_type = self.__handle_waiting()
+            if msg_type is None:
+                break
+
+            if msg_type == handler.ActionHandler.CommandType.SENSE_BODY:
+                cycles += 1
+            count += 1
+
+        if count > 0 and self.__thinking:
+            self.__decide()
+
+            if self.__connected:
+                self.send_commands_if_due()
+
+        return count, cycles
+
+    def __handle_waiting(self):
+        """
+        Handles one message if one is waiting on our socket, without blocking.
+        Returns its type, or None if there was none.
+        """
+
+        if self.RECEIVE_INTO_BUFFER:
+            length = self.__sock.recv_into_nowait()
+            if length is None:
+                return None
+
+            msg_type = self.msg_handler.handle_buffer(self.__sock.buffer,
+                    length)
+        else:
+            raw_msg = self.__sock.recv_nowait()
+            if raw_msg is None:
+                return None
+
+            msg_type = self.msg_handler.handle_message(raw_msg)
+
+        self.__queued += 1
+        return msg_type
+
     def __message_loop(self):
         """
         Handles messages received from the server.
@@ -176,16 +516,35 @@ class Agent:
             # receive message data from the server and pass it along to the
             # world model as-is.  the world model parses it and stores it within
             # itself for perusal at our leisure.
-            raw_msg = self.__sock.recv()
-            msg_type = self.msg_handler.handle_message(raw_msg)
+            if self.RECEIVE_INTO_BUFFER:
+                length = self.__sock.recv_into()
+            else:
+                raw_msg = self.__sock.recv()
 
-            # we send commands all at once every cycle, ie. whenever a
-            # 'sense_body' command is received
-            if msg_type == handler.ActionHandler.CommandType.SENSE_BODY:
-                self.__send_commands = True
+            # the first reply gives the socket its assigned port, which is what
+            # connect is waiting for.
+            if not self.__init_replied.is_set():
+                self.__init_replied.set()
+
+            if self.RECEIVE_INTO_BUFFER:
+                self.msg_handler.handle_buffer(self.__sock.buffer, length)
+            else:
+                self.msg_handler.handle_message(raw_msg)
+            self.__queued += 1
 
-            # flag new data as needing the think loop's attention
-            self.__should_think_on_data = True
+            # the rest of a burst is usually waiting by the time we've handled
+            # its first message
+            if self.DRAIN_MESSAGES:
+                while self.__parsing and self.__handle_waiting() is not None:
+                    pass
+
+            # wake the think loop to deal with the new data
+            self.__data_ready.set()
+
+            # dump even while the think loop is stuck
+            instruments = self.wm.instruments
+            if instruments is not None:
+                instruments.maybe_dump()
 
     def __think_loop(self):
         """
@@ -197,24 +556,43 @@ class Agent:
         """
 
         while self.__thinking:
-            # tell the ActionHandler to send its enqueued messages if it is time
-            if self.__send_commands:
-                self.__send_commands = False
-                self.wm.ah.send_commands()
-
-            # only think if new data has arrived
-            if self.__should_think_on_data:
-                # flag that data has been processed.  this shouldn't be a race
-                # condition, since the only change would be to make it True
-                # before changing it to False again, and we're already going to
-                # process data, so it doesn't make any difference.
-                self.__should_think_on_data = False
-
-                # performs the actions necessary for the agent to play soccer
-                self.think()
-            else:
-                # prevent from burning up all the cpu time while waiting for data
-                time.sleep(0.0001)
+            # sleep until new data arrives.  this must wait without a timeout:
+            # in python 2, a timed wait polls with sleeps of up to 50ms, while
+            # an untimed one blocks on a lock until woken.
+            self.__data_ready.wait()
+
+            # flag that data has been processed.  this isn't a race condition,
+            # since any data arriving after this point sets the event again,
+            # and any that arrived before it is already in the world model.
+            self.__data_ready.clear()
+
+            # we may have been woken to stop
+            if not self.__thinking:
+                break
+
+            # performs the actions necessary for the agent to play soccer
+            self.__decide()
+
+            # send this cycle's commands once we've decided on them, at the
+            # time the clock picks.  until then, anything new that arrives is
+            # thought about again, so a late 'see' still counts this cycle.  a
+            # timed wait never sleeps past its timeout, it only notices data a
+            # little late.
+            delay = self.time_until_send()
+            while delay is not None and delay > 0 and self.__thinking:
+                if not self.__data_ready.wait(delay):
+                    break
+
+                self.__data_ready.clear()
+                if not self.__thinking:
+                    break
+
+                self.__decide()
+                delay = self.time_until_send()
+
+            # we may have been disconnected while waiting
+            if delay is not None and self.__thinking:
+                self.send_commands()
 
     def setup_environment(self):
         """
@@ -303,7 +681,7 @@ class Agent:
         else:
             # find the ball
             if self.wm.ball is None or self.wm.ball.direction is None:
-                self.wm.ah.turn(30)
+                self.wm.search_for_ball()
 
                 return
 
@@ -312,12 +690,13 @@ class Agent:
                 self.wm.kick_to(goal_pos, 1.0)
                 return
             else:
-                # move towards ball
-                if -7 <= self.wm.ball.direction <= 7:
+                # move towards where we can first reach the ball
+                direction = self.wm.get_ball_intercept()[2]
+                if -7 <= direction <= 7:
                     self.wm.ah.dash(65)
                 else:
                     # face ball
-                    self.wm.ah.turn(self.wm.ball.direction / 2)
+                    self.wm.ah.turn(direction / 2)
 
                 return
 
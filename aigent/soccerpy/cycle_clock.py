@@ -0,0 +1,249 @@
+import sys
+import time
+
+# how many seconds into each cycle our commands are sent.  the server carries
+# out the commands it has received when a cycle ends, so sending late lets us
+# act on any 'see' that arrives during the cycle, at the risk of missing the
+# end of it.
+SEND_OFFSET = 0.05
+
+# the send offset is never more than this fraction of a cycle, however short
+# the server's cycles are.
+MAX_SEND_PHASE = 0.5
+
+# how much a single 'sense_body' arriving early or late moves our estimate of
+# when cycles start.  'sense_body' messages further off than half a cycle move
+# it all the way, since we've clearly lost track.
+PHASE_GAIN = 0.1
+
+class CycleClock:
+    """
+    Keeps track of where we are within the server's cycles.  The server starts
+    every cycle by sending a 'sense_body', so the times those arrive at give
+    the phase of its clock.  Arrival times jitter, so the estimated start of
+    each cycle is the previous start plus a whole number of cycles, nudged
+    towards when the 'sense_body' actually arrived.
+
+    Each cycle, the clock says when the commands decided on should be sent,
+    and keeps count of how well that went: how long deciding took after the
+    'sense_body', how far into the cycle commands went out, how many cycles
+    went by with no primary command sent, and how many had more than one
+    requested, all but the last of which were overwritten.  Primary commands
+    decided on once a cycle's commands are out wait for the next cycle, and
+    are counted as decided late.
+    """
+
+    def __init__(self, step=0.1, send_offset=SEND_OFFSET, clock=time.time):
+        """
+        'step' is the length of a cycle in seconds, and 'send_offset' how many
+        seconds into each cycle to send commands.  'clock' returns the current
+        time in seconds.
+        """
+
+        self.step = step
+        self.send_offset = send_offset
+        self.clock = clock
+
+        # the estimated time the current cycle started, and when its
+        # 'sense_body' really arrived
+        self.cycle_start = None
+        self.arrival = None
+
+        # the number of cycles started so far
+        self.cycles = 0
+
+        # whether we've decided on this cycle's commands, and sent them
+        self.decided = False
+        self.pending = False
+
+        # the metrics of the current cycle: seconds from its 'sense_body' to
+        # the end of the decision made on it, seconds from its start to when
+        # commands were sent, and the number of primary commands sent in it
+        # and requested for it.
+        self.latency = None
+        self.sent_offset = None
+        self.commands = 0
+        self.requests = 0
+
+        # totals over all finished cycles
+        self.empty = 0
+        self.multiple = 0
+        self.late = 0
+        self.decided_late = 0
+        self.latency_total = 0.0
+        self.latency_count = 0
+        self.latency_worst = 0.0
+        self.offset_total = 0.0
+        self.offset_count = 0
+        self.offset_worst = 0.0
+
+        # how far into their cycles 'see' messages arrive
+        self.sees = 0
+        self.see_offset_total = 0.0
+
+    def get_send_offset(self):
+        """
+        Returns how many seconds into a cycle commands are sent, limited to
+        MAX_SEND_PHASE of the cycle.
+        """
+
+        return max(0.0, min(self.send_offset, self.step * MAX_SEND_PHASE))
+
+    def _end_cycle(self):
+        """
+        Adds the metrics of the current cycle to the totals.
+        """
+
+        if self.commands == 0:
+            self.empty += 1
+        if self.requests > 1:
+            self.multiple += 1
+
+        if self.latency is not None:
+            self.latency_total += self.latency
+            self.latency_count += 1
+            self.latency_worst = max(self.latency_worst, self.latency)
+
+        if self.sent_offset is not None:
+            self.offset_total += self.sent_offset
+            self.offset_count += 1
+            self.offset_worst = max(self.offset_worst, self.sent_offset)
+
+    def sense_body(self, now=None, step=None):
+        """
+        Starts a new cycle for a 'sense_body' that arrived at 'now'.  'step',
+        if given, is the current length of a cycle in seconds.
+        """
+
+        if now is None:
+            now = self.clock()
+        if step is not None:
+            self.step = step
+
+        if self.cycles > 0:
+            self._end_cycle()
+
+        if self.cycle_start is None:
+            self.cycle_start = now
+        else:
+            # the start of the cycle this should be, had it arrived on time
+            elapsed = max(1, int(round((now - self.cycle_start) / self.step)))
+            expected = self.cycle_start + elapsed * self.step
+
+            error = now - expected
+            if abs(error) > self.step / 2:
+                self.cycle_start = now
+            else:
+                self.cycle_start = expected + PHASE_GAIN * error
+
+        self.arrival = now
+        self.cycles += 1
+        self.decided = False
+        self.pending = True
+        self.latency = None
+        self.sent_offset = None
+        self.commands = 0
+        self.requests = 0
+
+    def see(self, now=None):
+        """
+        Records a 'see' arriving at 'now'.
+        """
+
+        if self.cycle_start is None:
+            return
+
+        if now is None:
+            now = self.clock()
+
+        self.sees += 1
+        self.see_offset_total += (now - self.cycle_start) % self.step
+
+    def decide(self, cycle, now=None, requests=0):
+        """
+        Records that we finished deciding what to do at 'now', having started
+        during the given cycle, as counted by 'cycles', and requested
+        'requests' primary commands while doing so.  Decisions begun before
+        the current cycle's 'sense_body' don't count towards its latency,
+        since they couldn't have taken it into account.  Returns True if the
+        decision requested a primary command after this cycle's commands had
+        already gone out, leaving it to wait for the next cycle.
+        """
+
+        if not self.pending:
+            if self.cycles > 0 and requests > 0:
+                self.decided_late += 1
+                return True
+            return False
+
+        self.requests += requests
+        if cycle != self.cycles:
+            return False
+
+        if now is None:
+            now = self.clock()
+
+        if self.latency is None:
+            self.latency = now - self.arrival
+        self.decided = True
+        return False
+
+    def time_until_send(self, now=None):
+        """
+        Returns how many seconds are left until this cycle's commands should
+        be sent, which is negative once they're due.  Returns None if there's
+        nothing to send yet, either because we've already sent this cycle's
+        commands or because we haven't decided on them.
+        """
+
+        if not self.pending or not self.decided:
+            return None
+
+        if now is None:
+            now = self.clock()
+
+        return self.cycle_start + self.get_send_offset() - now
+
+    def sent(self, primary, now=None):
+        """
+        Records that this cycle's commands went out at 'now', including a
+        primary command if 'primary' is True.
+        """
+
+        if now is None:
+            now = self.clock()
+
+        self.pending = False
+        if primary:
+            self.commands += 1
+
+        if self.cycle_start is not None and self.sent_offset is None:
+            self.sent_offset = now - self.cycle_start
+            if self.sent_offset > self.step:
+                self.late += 1
+
+    def report(self, out=sys.stdout):
+        """
+        Prints the metrics of all the cycles finished so far.
+        """
+
+        finished = max(0, self.cycles - 1)
+        out.write("%d cycles, %d with no command, %d with more than one "
+                "requested, %d sent late, %d decided late\n" % (finished,
+                    self.empty, self.multiple, self.late, self.decided_late))
+
+        if self.latency_count > 0:
+            out.write("decision latency: mean %.2f ms, max %.2f ms\n" % (
+                self.latency_total / self.latency_count * 1e3,
+                self.latency_worst * 1e3))
+
+        if self.offset_count > 0:
+            out.write("send offset: mean %.2f ms, max %.2f ms "
+                    "(target %.2f ms)\n" % (
+                        self.offset_total / self.offset_count * 1e3,
+                        self.offset_worst * 1e3,
+                        self.get_send_offset() * 1e3))
+
+        if self.sees > 0:
+            out.write("'see' messages arrive %.2f ms into a cycle on average\n"
+                    % (self.see_offset_total / self.sees * 1e3))
@@ -1,9 +1,18 @@
+import array
+import math
+import re
 
-class GameObject:
+class GameObject(object):
     """
     Root class for all percievable objects in the world model.
+
+    Game objects are made for every object in every 'see' message, so they
+    have no instance dicts.  Each class lists the attributes it adds in its
+    __slots__, and nothing else can be set on them.
     """
 
+    __slots__ = ("distance", "direction")
+
     def __init__(self, distance, direction):
         """
         All objects have a distance and direction to the player, at a minimum.
@@ -17,6 +26,8 @@ class Line(GameObject):
     Represents a line on the soccer field.
     """
 
+    __slots__ = ("line_id",)
+
     def __init__(self, distance, direction, line_id):
         self.line_id = line_id
         
@@ -27,6 +38,8 @@ class Goal(GameObject):
     Represents a goal object on the field.
     """
 
+    __slots__ = ("goal_id",)
+
     def __init__(self, distance, direction, goal_id):
         self.goal_id = goal_id
 
@@ -37,6 +50,8 @@ class Flag(GameObject):
     A flag on the field.  Can be used by the agent to determine its position.
     """
 
+    __slots__ = ("flag_id", "flag_index")
+
     # a dictionary mapping all flag_ids to their on-field (x, y) coordinates
     # TODO: these are educated guesses based on Figure 4.2 in the documentation.
     #       where would one find the actual coordinates, besides in the server
@@ -116,13 +131,34 @@ class Flag(GameObject):
             "c": (0, 0)
         }
 
-    def __init__(self, distance, direction, flag_id):
+    # flag ids in a fixed order, so a flag can be referred to by its index
+    # into these instead of by its id string.
+    FLAG_IDS = sorted(FLAG_COORDS.keys())
+    FLAG_INDEX = dict((f, i) for i, f in enumerate(FLAG_IDS))
+
+    # flag coordinates by index
+    FLAG_X = array.array("d", [FLAG_COORDS[f][0] for f in FLAG_IDS])
+    FLAG_Y = array.array("d", [FLAG_COORDS[f][1] for f in FLAG_IDS])
+
+    # maps the members of a parsed flag name following the 'f' to the flag's
+    # index.  ex: ('t', 'r', 10) for 'tr10'.
+    FLAG_NAME_INDEX = dict((tuple(int(p) if p.isdigit() else p
+        for p in re.findall("[a-z]|[0-9]+", f)), i)
+        for i, f in enumerate(FLAG_IDS))
+
+    def __init__(self, distance, direction, flag_id, flag_index=None):
         """
         Adds a flag id for this field object.  Every flag has a unique id.
+        'flag_index' is the flag's index into FLAG_IDS, looked up if not given,
+        and None for flags we don't know the position of.
         """
 
         self.flag_id = flag_id
 
+        if flag_index is None:
+            flag_index = Flag.FLAG_INDEX.get(flag_id)
+        self.flag_index = flag_index
+
         GameObject.__init__(self, distance, direction)
 
 class MobileObject(GameObject):
@@ -130,6 +166,9 @@ class MobileObject(GameObject):
     Represents objects that can move.
     """
 
+    __slots__ = ("dist_change", "dir_change", "speed", "velocity",
+            "abs_velocity")
+
     def __init__(self, distance, direction, dist_change, dir_change, speed):
         """
         Adds variables for distance and direction deltas.
@@ -139,6 +178,11 @@ class MobileObject(GameObject):
         self.dir_change = dir_change
         self.speed = speed
 
+        # the object's (x, y) velocity relative to our neck's direction and on
+        # the field, once worked out from the deltas.
+        self.velocity = None
+        self.abs_velocity = None
+
         GameObject.__init__(self, distance, direction)
 
 class Ball(MobileObject):
@@ -146,6 +190,8 @@ class Ball(MobileObject):
     A spcial instance of a mobile object representing the soccer ball.
     """
 
+    __slots__ = ()
+
     def __init__(self, distance, direction, dist_change, dir_change, speed):
         
         MobileObject.__init__(self, distance, direction, dist_change,
@@ -156,6 +202,9 @@ class Player(MobileObject):
     Represents a friendly or enemy player in the game.
     """
 
+    __slots__ = ("team", "side", "uniform_number", "body_direction",
+            "neck_direction")
+
     def __init__(self, distance, direction, dist_change, dir_change, speed,
             team, side, uniform_number, body_direction, neck_direction):
         """
@@ -171,3 +220,113 @@ class Player(MobileObject):
         MobileObject.__init__(self, distance, direction, dist_change,
                 dir_change, speed)
 
+class ObjectPool:
+    """
+    Recycles the flags, goals and lines made for 'see' messages, so that each
+    agent reuses the same few dozen objects instead of making new ones every
+    cycle.  The ball and players aren't pooled, since the world model's
+    memory holds on to them for many cycles.
+
+    recycle must be called before making the objects for each new 'see'.
+    Nothing but the world model's lists may keep the pooled objects, which
+    last until the 'see' after next.
+    """
+
+    def __init__(self):
+        # the objects handed out since the last recycle, and before that
+        self.current = []
+        self.previous = []
+
+        # the objects free to be handed out again, by class
+        self.free = {Flag: [], Goal: [], Line: []}
+
+        # counts of objects made, and of objects handed out again
+        self.created = 0
+        self.reused = 0
+
+    def recycle(self):
+        """
+        Frees the objects handed out for the 'see' before last.  Those of the
+        last 'see' stay in use, since they're in the world model until the
+        new ones replace them.
+        """
+
+        free = self.free
+        for obj in self.previous:
+            free[obj.__class__].append(obj)
+
+        self.previous = self.current
+        self.current = []
+
+    def _take(self, cls):
+        """
+        Returns a free object of the given class to be initialized again, or
+        None if there's none.
+        """
+
+        free = self.free[cls]
+        if len(free) == 0:
+            self.created += 1
+            return None
+
+        self.reused += 1
+        return free.pop()
+
+    def flag(self, distance, direction, flag_id, flag_index=None):
+        """
+        Returns a Flag with the given values.
+        """
+
+        obj = self._take(Flag)
+        if obj is None:
+            obj = Flag(distance, direction, flag_id, flag_index)
+        else:
+            obj.__init__(distance, direction, flag_id, flag_index)
+
+        self.current.append(obj)
+        return obj
+
+    def goal(self, distance, direction, goal_id):
+        """
+        Returns a Goal with the given values.
+        """
+
+        obj = self._take(Goal)
+        if obj is None:
+            obj = Goal(distance, direction, goal_id)
+        else:
+            obj.__init__(distance, direction, goal_id)
+
+        self.current.append(obj)
+        return obj
+
+    def line(self, distance, direction, line_id):
+        """
+        Returns a Line with the given values.
+        """
+
+        obj = self._take(Line)
+        if obj is None:
+            obj = Line(distance, direction, line_id)
+        else:
+            obj.__init__(distance, direction, line_id)
+
+        self.current.append(obj)
+        return obj
+
+# cosines and sines of angles around a circle, by the step between angles
+_unit_circles = {}
+
+def unit_circle(angle_step):
+    """
+    Returns a list of (cos, sin) tuples for every 'angle_step' degrees from 0
+    up to 360, computed once per step.
+    """
+
+    circle = _unit_circles.get(angle_step)
+    if circle is None:
+        circle = [(math.cos(math.radians(i)), math.sin(math.radians(i)))
+                for i in xrange(0, 360, angle_step)]
+        _unit_circles[angle_step] = circle
+
+    return circle
@@ -1,7 +1,9 @@
 import collections
-import Queue as queue
+import inspect
+import time
 
 import message_parser
+import see_decoder
 import sp_exceptions
 import game_object
 from world_model import WorldModel
@@ -12,6 +14,69 @@ PRINT_SERVER_MESSAGES = False
 # should we print commands sent to the server?
 PRINT_SENT_COMMANDS = False
 
+# the most we put in one datagram to the server, which reads messages into a
+# buffer of this size
+MAX_DATAGRAM_SIZE = 8192
+
+def format_float(x):
+    """
+    Formats a number for a command as compactly as possible, to at most four
+    decimal places.  ex: 65.0 becomes '65', and -0.25 becomes '-0.25'.
+    """
+
+    text = "%.4f" % x
+    text = text.rstrip("0").rstrip(".")
+    if text == "-0":
+        return "0"
+
+    return text
+
+# the dispatch tables of MessageHandler and its subclasses, by class
+_dispatch_tables = {}
+
+def handles(*msg_types):
+    """
+    Marks a method of a MessageHandler subclass as the handler for the given
+    message types, whatever the method is named.  ex:
+
+        class FullstateHandler(MessageHandler):
+            @handles("fullstate")
+            def fullstate(self, msg):
+                ...
+    """
+
+    def mark(func):
+        func.handled_msg_types = msg_types
+        return func
+
+    return mark
+
+def handles_raw(*msg_types):
+    """
+    Like handles, but the marked method is given the raw text of the message
+    instead of its parsed form, so messages of these types are never parsed
+    unless the method does so itself.
+    """
+
+    def mark(func):
+        func.handled_msg_types = msg_types
+        func.takes_raw_message = True
+        return func
+
+    return mark
+
+def message_tag(msg):
+    """
+    Returns the type of a raw server message without parsing the rest of it.
+    ex: '(see 0 ((b) 10 0))' gives 'see'.
+    """
+
+    end = msg.find(" ", 1)
+    if end < 0:
+        end = msg.find(")", 1)
+
+    return msg[1:end]
+
 class MessageHandler:
     """
     Handles all incoming messages from the server.  Parses their data and puts
@@ -19,15 +84,138 @@ class MessageHandler:
 
     All '_handle_*' functions deal with their appropriate message types
     as received from a server.  This allows adding a message handler to be as
-    simple as adding a new '_handle_*' function to this object.
+    simple as adding a new '_handle_*' function to this object, or a method
+    marked with the handles decorator to a subclass, or registering one with
+    register_handler.  Message types are looked up in a table built once per
+    class from all of these, so no names are formatted or looked up per
+    message.
     """
 
     # an inner class used for creating named tuple 'hear' messages
     Message = collections.namedtuple("Message", "time sender message")
 
-    def __init__(self, world_model):
+    # maps the names of the values in 'sense_body' messages to the world model
+    # attributes their one or two parts are stored in, in order.  anything
+    # else is left out.
+    SENSE_BODY_FIELDS = {
+        "view_mode": ("view_quality", "view_width"),
+        "stamina": ("stamina", "effort"),
+        "speed": ("speed_amount", "speed_direction"),
+        "head_angle": ("neck_direction",),
+
+        # these update the counts of the basic actions taken
+        "kick": ("kick_count",),
+        "dash": ("dash_count",),
+        "turn": ("turn_count",),
+        "say": ("say_count",),
+        "turn_neck": ("turn_neck_count",),
+        "catch": ("catch_count",),
+        "move": ("move_count",),
+        "change_view": ("change_view_count",),
+    }
+
+    # a message whose handler takes its raw text, left unparsed
+    RawMessage = collections.namedtuple("RawMessage", "msg_type text")
+
+    @classmethod
+    def register_handler(cls, msg_type, func, raw=False):
+        """
+        Makes 'func', called with the handler and the parsed message, handle
+        messages of the given type for this class and its subclasses.  If
+        'raw' is True, it's called with the raw text of the message instead,
+        and the message is never parsed.
+        """
+
+        # kept on this class alone, not inherited through a parent's dict
+        if "_registered_handlers" not in cls.__dict__:
+            cls._registered_handlers = {}
+        cls._registered_handlers[msg_type] = (func, raw)
+
+        # tables of this class and any subclasses are now out of date
+        _dispatch_tables.clear()
+
+    @classmethod
+    def _get_dispatch_tables(cls):
+        """
+        Returns the tables mapping message types to the functions that handle
+        them for this class, one for functions given parsed messages and one
+        for those given raw ones, building them the first time.  Later
+        classes in the method resolution order override earlier ones, and
+        registered handlers override methods.
+        """
+
+        tables = _dispatch_tables.get(cls)
+        if tables is not None:
+            return tables
+
+        # every handler as a (function, raw) pair
+        handlers = {}
+        for klass in reversed(inspect.getmro(cls)):
+            for name, value in vars(klass).items():
+                if not callable(value):
+                    continue
+
+                raw = getattr(value, "takes_raw_message", False)
+                if name.startswith("_handle_"):
+                    handlers[name[len("_handle_"):]] = (value, raw)
+                for msg_type in getattr(value, "handled_msg_types", ()):
+                    handlers[msg_type] = (value, raw)
+
+            handlers.update(vars(klass).get("_registered_handlers", {}))
+
+        parsed_table = {}
+        raw_table = {}
+        for msg_type, (func, raw) in handlers.iteritems():
+            if raw:
+                raw_table[msg_type] = func
+            else:
+                parsed_table[msg_type] = func
+
+        tables = (parsed_table, raw_table)
+        _dispatch_tables[cls] = tables
+        return tables
+
+    @classmethod
+    def get_dispatch_table(cls):
+        """
+        Returns the table mapping message types to the functions that handle
+        their parsed forms for this class.
+        """
+
+        return cls._get_dispatch_tables()[0]
+
+    @classmethod
+    def get_raw_dispatch_table(cls):
+        """
+        Returns the table mapping message types to the functions that handle
+        their raw text for this class.
+        """
+
+        return cls._get_dispatch_tables()[1]
+
+    def __init__(self, world_model, use_see_decoder=False):
+        """
+        If 'use_see_decoder' is True, 'see' messages are decoded straight into
+        reusable columns instead of going through the generic parser.  Only
+        the ball, players, goals and lines are then turned into game objects;
+        flags stay in the columns, which the world model localizes from.
+        """
+
         self.wm = world_model
 
+        # the functions that handle each type of message, by whether they
+        # want it parsed or not
+        self.dispatch = self.get_dispatch_table()
+        self.raw_dispatch = self.get_raw_dispatch_table()
+
+        # recycles the objects made for every 'see'
+        self.pool = game_object.ObjectPool()
+
+        # the reusable columns 'see' messages get decoded into, if enabled
+        self.see_columns = None
+        if use_see_decoder:
+            self.see_columns = see_decoder.SeeColumns()
+
     def handle_message(self, msg):
         """
         Takes a raw message direct from the server, parses it, and stores its
@@ -35,25 +223,132 @@ class MessageHandler:
         type of message received.
         """
 
+        if self.wm.instruments is None:
+            return self.handle_parsed(self.parse(msg))
+
+        return self._handle_timed(self.parse, msg)
+
+    def handle_buffer(self, buf, length):
+        """
+        Like handle_message, but for a message received into the first
+        'length' bytes of the bytearray 'buf', which is parsed in place.  The
+        buffer may be reused as soon as this returns.
+        """
+
+        if self.wm.instruments is None:
+            return self.handle_parsed(self.parse_buffer(buf, length))
+
+        return self._handle_timed(self.parse_buffer, buf, length)
+
+    def _handle_timed(self, parse, *args):
+        """
+        Parses a message by calling 'parse' with 'args' and handles it, timing
+        both for our instruments.  Returns the type of message received.
+        """
+
+        instruments = self.wm.instruments
+
+        # time parsing, and handling by message type.  handling 'see'
+        # includes the world model's process_new_info, timed separately.
+        start = time.time()
+        parsed = parse(*args)
+        parsed_at = time.time()
+        msg_type = self.handle_parsed(parsed)
+        handled_at = time.time()
+
+        instruments.parse.add(parsed_at - start)
+        stage = instruments.handle.get(msg_type)
+        if stage is None:
+            stage = instruments.get_handle_stage(msg_type)
+        stage.add(handled_at - parsed_at)
+
+        return msg_type
+
+    def parse(self, msg):
+        """
+        Turns a raw message into the form handle_parsed expects: a SeeColumns
+        object for 'see' messages if we decode those into columns, or the
+        generic nested lists otherwise.  Messages whose handlers take raw
+        text aren't parsed at all, and come back as a RawMessage.
+        """
+
+        # find out what the message is before deciding how to parse it
+        msg_type = message_tag(msg)
+        if msg_type in self.raw_dispatch:
+            if PRINT_SERVER_MESSAGES:
+                print msg, "\n"
+
+            return MessageHandler.RawMessage(msg_type, msg)
+
+        # 'see' messages skip generic parsing entirely if we have columns
+        if self.see_columns is not None and msg_type == "see":
+            if PRINT_SERVER_MESSAGES:
+                print msg, "\n"
+
+            return see_decoder.decode_see(msg, self.see_columns,
+                    self.wm.teamname)
+
         # get all the expressions contained in the given message
-        parsed = message_parser.parse(msg)
+        parsed = message_parser.parse_fast(msg)
 
         if PRINT_SERVER_MESSAGES:
             print parsed[0] + ":", parsed[1:], "\n"
 
-        # this is the name of the function that should be used to handle
-        # this message type.  we pull it from this object dynamically to
-        # avoid having a huge if/elif/.../else statement.
-        msg_func = "_handle_%s" % parsed[0]
+        return parsed
+
+    def parse_buffer(self, buf, length):
+        """
+        Like parse, but for a message received into the first 'length' bytes
+        of the bytearray 'buf'.  Only the message type is copied out of the
+        buffer; everything else is tokenized where it lies, except for
+        messages whose handlers take raw text, which get a copy to keep.
+        """
+
+        end = buf.find(" ", 1, length)
+        if end < 0:
+            end = buf.find(")", 1, length)
+        msg_type = str(buf[1:end])
+
+        if msg_type in self.raw_dispatch:
+            msg = str(buf[:length])
+            if PRINT_SERVER_MESSAGES:
+                print msg, "\n"
+
+            return MessageHandler.RawMessage(msg_type, msg)
+
+        if PRINT_SERVER_MESSAGES:
+            print str(buf[:length]), "\n"
+
+        # the see decoder's regexes read a buffer object as well as a string
+        if self.see_columns is not None and msg_type == "see":
+            return see_decoder.decode_see(buffer(buf, 0, length),
+                    self.see_columns, self.wm.teamname)
+
+        return message_parser.parse_buffer(buf, length)
+
+    def handle_parsed(self, parsed):
+        """
+        Stores the data of an already parsed message in the world model.
+        Returns the type of message received.
+        """
+
+        if isinstance(parsed, see_decoder.SeeColumns):
+            self._handle_see_columns(parsed)
+            return "see"
+
+        if isinstance(parsed, MessageHandler.RawMessage):
+            self.raw_dispatch[parsed.msg_type](self, parsed.text)
+            return parsed.msg_type
 
-        if hasattr(self, msg_func):
-            # call the appropriate function with this message
-            getattr(self, msg_func).__call__(parsed)
+        # call the function that handles this message type
+        msg_func = self.dispatch.get(parsed[0])
+        if msg_func is not None:
+            msg_func(self, parsed)
 
         # throw an exception if we don't know about the given message type
         else:
-            m = "Can't handle message type '%s', function '%s' not found."
-            raise sp_exceptions.MessageTypeError(m % (parsed[0], msg_func))
+            m = "Can't handle message type '%s', no handler found."
+            raise sp_exceptions.MessageTypeError(m % parsed[0])
 
         # return the type of message received
         return parsed[0]
@@ -69,10 +364,16 @@ class MessageHandler:
         the world model.
         """
 
-        # the simulation cycle of the soccer server
-        # TODO: we should probably use this somewhere...
+        # the simulation cycle of the soccer server, which the world model
+        # remembers objects by
         sim_time = msg[1]
 
+        self.wm.clock.see()
+
+        # the objects of the 'see' before last can be used again
+        pool = self.pool
+        pool.recycle()
+
         # store new values before changing those in the world model.  all new
         # values replace those in the world model at the end of parsing.
         new_ball = None
@@ -119,16 +420,20 @@ class MessageHandler:
 
             # parse flags
             if name[0] == 'f':
-                # since the flag's name sometimes contains a number, the parser
-                # recognizes it as such and converts it into an int.  it's
-                # always the last item when it's a number, so we stringify the
-                # last item of the name to convert any numbers back.
-                name[-1] = str(name[-1])
-
-                # the flag's id is its name's members following the f as a string
-                flag_id = ''.join(name[1:])
-
-                new_flags.append(game_object.Flag(distance, direction, flag_id))
+                # known flags are looked up by the members of their name
+                # following the f, exactly as parsed, so no id string has to
+                # be built for them.
+                flag_index = game_object.Flag.FLAG_NAME_INDEX.get(
+                        tuple(name[1:]))
+                if flag_index is not None:
+                    flag_id = game_object.Flag.FLAG_IDS[flag_index]
+                else:
+                    # the flag's id is its name's members following the f as
+                    # a string
+                    flag_id = ''.join(str(n) for n in name[1:])
+
+                new_flags.append(pool.flag(distance, direction, flag_id,
+                    flag_index))
 
             # parse players
             elif name[0] == 'p':
@@ -156,9 +461,9 @@ class MessageHandler:
                         else:
                             side = WorldModel.SIDE_L
 
-                # calculate player's speed
+                # the world model works out speeds from the deltas for every
+                # mobile object at once
                 speed = None
-                # TODO: calculate player's speed!
 
                 new_players.append(game_object.Player(distance, direction,
                     dist_change, dir_change, speed, teamname, side,
@@ -171,7 +476,7 @@ class MessageHandler:
                 if len(name) > 1:
                     goal_id = name[1]
 
-                new_goals.append(game_object.Goal(distance, direction, goal_id))
+                new_goals.append(pool.goal(distance, direction, goal_id))
 
             # parse lines
             elif name[0] == 'l':
@@ -180,11 +485,11 @@ class MessageHandler:
                 if len(name) > 1:
                     line_id = name[1]
 
-                new_lines.append(game_object.Line(distance, direction, line_id))
+                new_lines.append(pool.line(distance, direction, line_id))
 
             # parse the ball
             elif name[0] == 'b':
-                # TODO: handle speed!
+                # the world model works out the ball's speed
                 new_ball = game_object.Ball(distance, direction, dist_change,
                         dir_change, None)
 
@@ -196,11 +501,11 @@ class MessageHandler:
 
             # an out-of-view flag
             elif name[0] == 'F':
-                new_flags.append(game_object.Flag(None, None, None))
+                new_flags.append(pool.flag(None, None, None))
 
             # an out-of-view goal
             elif name[0] == 'G':
-                new_goals.append(game_object.Goal(None, None, None))
+                new_goals.append(pool.goal(None, None, None))
 
             # an out-of-view player
             elif name[0] == 'P':
@@ -214,7 +519,94 @@ class MessageHandler:
         # tell the WorldModel to update any internal variables based on the
         # newly gleaned information.
         self.wm.process_new_info(new_ball, new_flags, new_goals, new_players,
-                new_lines)
+                new_lines, sim_time=sim_time)
+
+    def _handle_see_columns(self, cols):
+        """
+        Hands the columns of a decoded 'see' message to the world model.  Game
+        objects are created only for the few mobile and landmark objects the
+        rest of the code expects as objects.
+        """
+
+        self.wm.clock.see()
+
+        # the objects of the 'see' before last can be used again
+        pool = self.pool
+        pool.recycle()
+
+        # the side of the opposing team
+        other_side = WorldModel.SIDE_L
+        if self.wm.side == WorldModel.SIDE_L:
+            other_side = WorldModel.SIDE_R
+
+        new_ball = None
+        new_goals = []
+        new_lines = []
+        new_players = []
+
+        kind = cols.kind
+        for i in xrange(cols.count):
+            k = kind[i]
+            if k == see_decoder.KIND_FLAG:
+                continue
+
+            # convert the NaNs of missing values back to None
+            distance = cols.distance[i]
+            direction = cols.direction[i]
+            if distance != distance:
+                distance = None
+            if direction != direction:
+                direction = None
+
+            obj_id = cols.obj_id[i]
+
+            if k == see_decoder.KIND_BALL:
+                dist_change = cols.dist_change[i]
+                dir_change = cols.dir_change[i]
+                if dist_change != dist_change:
+                    dist_change = None
+                    dir_change = None
+                new_ball = game_object.Ball(distance, direction, dist_change,
+                        dir_change, None)
+
+            elif k == see_decoder.KIND_PLAYER:
+                dist_change = cols.dist_change[i]
+                dir_change = cols.dir_change[i]
+                body_dir = cols.body_dir[i]
+                neck_dir = cols.neck_dir[i]
+                if dist_change != dist_change:
+                    dist_change = None
+                    dir_change = None
+                if body_dir != body_dir:
+                    body_dir = None
+                    neck_dir = None
+
+                side = None
+                if cols.team[i] == see_decoder.TEAM_OURS:
+                    side = self.wm.side
+                elif cols.team[i] == see_decoder.TEAM_THEIRS:
+                    side = other_side
+
+                uniform_number = None
+                if obj_id != see_decoder.NO_ID:
+                    uniform_number = obj_id
+
+                new_players.append(game_object.Player(distance, direction,
+                    dist_change, dir_change, None, cols.team_name[i], side,
+                    uniform_number, body_dir, neck_dir))
+
+            else:
+                side_id = None
+                if obj_id != see_decoder.NO_ID:
+                    side_id = see_decoder.SIDE_IDS[obj_id]
+
+                if k == see_decoder.KIND_GOAL:
+                    new_goals.append(pool.goal(distance, direction, side_id))
+                else:
+                    new_lines.append(pool.line(distance, direction, side_id))
+
+        self.wm.process_new_info(new_ball, [], new_goals, new_players,
+                new_lines, see=cols, sim_time=cols.sim_time)
 
     def _handle_hear(self, msg):
         """
@@ -266,6 +658,11 @@ class MessageHandler:
             # deal with messages that indicate game mode, but that the agent
             # doesn't need to know about specifically.
             else:
+                # the referee places the ball, and at kick-offs the players,
+                # whenever the mode changes, so what we remember is stale.
+                if mode != self.wm.play_mode:
+                    self.wm.memory.clear()
+
                 # set the mode to the referee reported mode string
                 self.wm.play_mode = mode
                 return
@@ -281,85 +678,63 @@ class MessageHandler:
         Deals with the agent's body model information.
         """
 
+        self.wm.sim_time = msg[1]
+
+        # a 'sense_body' marks the start of a new cycle
+        self.wm.clock.sense_body(
+                step=self.wm.server_parameters.simulator_step / 1000.0)
+
         # update the body model information when received. each piece of info is
         # a list with the first item as the name of the data, and the rest as
-        # the values.
+        # the values.  we leave unknown values out of the equation.
+        fields = MessageHandler.SENSE_BODY_FIELDS
+        wm = self.wm
         for info in msg[2:]:
-            name = info[0]
-            values = info[1:]
-
-            if name == "view_mode":
-                self.wm.view_quality = values[0]
-                self.wm.view_width = values[1]
-            elif name == "stamina":
-                self.wm.stamina = values[0]
-                self.wm.effort = values[1]
-            elif name == "speed":
-                self.wm.speed_amount = values[0]
-                self.wm.speed_direction = values[1]
-            elif name == "head_angle":
-                self.wm.neck_direction = values[0]
-
-            # these update the counts of the basic actions taken
-            elif name == "kick":
-                self.wm.kick_count = values[0]
-            elif name == "dash":
-                self.wm.dash_count = values[0]
-            elif name == "turn":
-                self.wm.turn_count = values[0]
-            elif name == "say":
-                self.wm.say_count = values[0]
-            elif name == "turn_neck":
-                self.wm.turn_neck_count = values[0]
-            elif name == "catch":
-                self.wm.catch_count = values[0]
-            elif name == "move":
-                self.wm.move_count = values[0]
-            elif name == "change_view":
-                self.wm.change_view_count = values[0]
-
-            # we leave unknown values out of the equation
-            else:
-                pass
+            attrs = fields.get(info[0])
+            if attrs is None:
+                continue
+
+            # no value has more than two parts
+            setattr(wm, attrs[0], info[1])
+            if len(attrs) > 1:
+                setattr(wm, attrs[1], info[2])
 
+        # a new cycle has started, so account for how we moved in the last one
+        self.wm.predict_motion()
+
+    @handles_raw("change_player_type")
     def _handle_change_player_type(self, msg):
         """
-        Handle player change messages.
+        Handle player change messages.  Nothing uses them, so they're left
+        unparsed.
         """
 
+    @handles_raw("player_param")
     def _handle_player_param(self, msg):
         """
-        Deals with player parameter information.
+        Deals with player parameter information.  The raw message is stored,
+        and only parsed once something asks the world model for it.
         """
 
+        self.wm.set_player_param_message(msg)
+
+    @handles_raw("player_type")
     def _handle_player_type(self, msg):
         """
-        Handles player type information.
+        Handles player type information.  Like 'player_param', the raw
+        message is stored for the world model to parse when asked.
         """
 
+        self.wm.add_player_type_message(msg)
+
+    @handles_raw("server_param")
     def _handle_server_param(self, msg):
         """
-        Stores server parameter information.
+        Stores server parameter information.  Every world model given the
+        same message shares the parameters parsed from it.
         """
-        
-        # each list is two items: a value name and its value.  we add them all
-        # to the ServerParameters class inside WorldModel programmatically.
-        for param in msg[1:]:
-            # put all [param, value] pairs into the server settings object
-            # by setting the attribute programmatically.
-            if len(param) != 2:
-                continue
-            
-            # the parameter and its value
-            key = param[0]
-            value = param[1]
-
-            # set the attribute if it was accounted for, otherwise alert the user
-            if hasattr(self.wm.server_parameters, key):
-                setattr(self.wm.server_parameters, key, value)
-            else:
-                raise AttributeError("Couldn't find a matching parameter in "
-                        "ServerParameters class: '%s'" % key)
+
+        self.wm.set_server_param_message(msg)
 
     def _handle_init(self, msg):
         """
@@ -397,7 +772,7 @@ class ActionHandler:
     Provides facilities for sending commands to the soccer server.  Contains all
     possible commands that can be sent, as well as everything needed to send
     them.  All basic command methods are aliases for placing that command in the
-    internal queue and sending it at the appropriate time.
+    per-cycle buffer and sending it at the appropriate time.
     """
 
     class CommandType:
@@ -424,8 +799,13 @@ class ActionHandler:
             raise NotImplementedError("Can't instantiate a CommandType, access "
                     "its members through ActionHandler instead.")
 
-    # a command for our queue containing an id and command text
-    Command = collections.namedtuple("Command", "cmd_type text")
+    # a command for our buffer containing an id and command text, along with
+    # the command's name and arguments for anything that models its effects
+    Command = collections.namedtuple("Command", "cmd_type text name args")
+
+    # the secondary commands that get their own slot in the per-cycle buffer
+    SECONDARY_SLOTS = (CommandType.TURN_NECK, CommandType.SAY,
+            CommandType.CHANGE_VIEW)
 
     def __init__(self, server_socket):
         """
@@ -435,43 +815,93 @@ class ActionHandler:
 
         self.sock = server_socket
 
-        # this contains all requested actions for the current and future cycles
-        self.q = queue.Queue()
+        # the commands requested for the current cycle.  there's one slot for
+        # the primary command and one for each kind of secondary command,
+        # since the server only carries out one of each per cycle anyway.
+        # commands are only ever requested and sent from the thread that
+        # thinks, so the slots need no lock.
+        self.primary = None
+        self.secondary = dict((name, None) for name in
+                ActionHandler.SECONDARY_SLOTS)
+
+        # the primary command most recently sent, until the world model uses it
+        # to predict how we moved.
+        self.sent_primary = None
+
+        # counts of commands sent, of the datagrams they went out in, and of
+        # commands dropped by name because another of their kind replaced them
+        # before they were sent.
+        self.commands_sent = 0
+        self.datagrams_sent = 0
+        self.dropped = collections.defaultdict(int)
+
+        # the number of primary commands ever requested, and whether the one
+        # in its slot was decided on too late for the cycle it was meant for.
+        # the clock counts those as decided late, so they aren't counted as
+        # dropped if replaced.
+        self.primary_requests = 0
+        self.primary_late = False
+
+    def _put(self, cmd):
+        """
+        Puts a command in its slot for this cycle, replacing and counting as
+        dropped any command already there.
+        """
+
+        if cmd.cmd_type == ActionHandler.CommandType.TYPE_PRIMARY:
+            if self.primary is not None and not self.primary_late:
+                self.dropped[self.primary.name] += 1
+            self.primary = cmd
+            self.primary_requests += 1
+            self.primary_late = False
+        else:
+            old = self.secondary[cmd.name]
+            if old is not None:
+                self.dropped[old.name] += 1
+            self.secondary[cmd.name] = cmd
 
     def send_commands(self):
         """
-        Sends all the enqueued commands.
+        Sends all the commands requested this cycle, and empties their slots.
+        The server reads any number of commands from one message, so they all
+        go out together, secondary commands first and the primary last, in as
+        few datagrams as MAX_DATAGRAM_SIZE allows.
         """
 
-        # we only send the most recent primary command
-        primary_cmd = None
+        cmds = []
+        for name in ActionHandler.SECONDARY_SLOTS:
+            cmd = self.secondary[name]
+            if cmd is not None:
+                cmds.append(cmd)
+                self.secondary[name] = None
 
-        # dequeue all enqueued commands and send them
-        while 1:
-            try:
-                cmd = self.q.get_nowait()
-            except queue.Empty:
-                break
-
-            # save the most recent primary command and send it at the very end
-            if cmd.cmd_type == ActionHandler.CommandType.TYPE_PRIMARY:
-                primary_cmd = cmd
-            # send other commands immediately
-            else:
-                if PRINT_SENT_COMMANDS:
-                    print "sent:", cmd.text, "\n"
+        primary_cmd = self.primary
+        if primary_cmd is not None:
+            cmds.append(primary_cmd)
+            self.primary = None
+            self.primary_late = False
+            self.sent_primary = primary_cmd
 
-                self.sock.send(cmd.text)
+        if len(cmds) == 0:
+            return
 
-            # indicate that we finished processing a command
-            self.q.task_done()
+        if PRINT_SENT_COMMANDS:
+            for cmd in cmds:
+                print "sent:", cmd.text, "\n"
 
-        # send the saved primary command, if there was one
-        if primary_cmd is not None:
-            if PRINT_SENT_COMMANDS:
-                print "sent:", primary_cmd.text, "\n"
+        # pack the commands into datagrams, leaving room for the terminator
+        datagram = ""
+        for cmd in cmds:
+            if (len(datagram) > 0 and
+                    len(datagram) + len(cmd.text) >= MAX_DATAGRAM_SIZE):
+                self.sock.send(datagram)
+                self.datagrams_sent += 1
+                datagram = ""
+            datagram += cmd.text
 
-            self.sock.send(primary_cmd.text)
+        self.sock.send(datagram)
+        self.datagrams_sent += 1
+        self.commands_sent += len(cmds)
 
     def move(self, x, y):
         """
@@ -481,13 +911,11 @@ class ActionHandler:
         a random location on their side of the field.
         """
 
-        msg = "(move %.10f %.10f)" % (x, y)
+        msg = "(move %s %s)" % (format_float(x), format_float(y))
 
-        # create the command object for insertion into the queue
         cmd_type = ActionHandler.CommandType.TYPE_PRIMARY
-        cmd = ActionHandler.Command(cmd_type, msg)
-
-        self.q.put(cmd)
+        self._put(ActionHandler.Command(cmd_type, msg,
+            ActionHandler.CommandType.MOVE, (x, y)))
 
     def turn(self, relative_degrees):
         """
@@ -498,26 +926,22 @@ class ActionHandler:
         # disallow unreasonable turning
         assert -180 <= relative_degrees <= 180
 
-        msg = "(turn %.10f)" % relative_degrees
+        msg = "(turn %s)" % format_float(relative_degrees)
 
-        # create the command object for insertion into the queue
         cmd_type = ActionHandler.CommandType.TYPE_PRIMARY
-        cmd = ActionHandler.Command(cmd_type, msg)
-
-        self.q.put(cmd)
+        self._put(ActionHandler.Command(cmd_type, msg,
+            ActionHandler.CommandType.TURN, (relative_degrees,)))
 
     def dash(self, power):
         """
         Accelerate the player in the direction its body currently faces.
         """
 
-        msg = "(dash %.10f)" % power
+        msg = "(dash %s)" % format_float(power)
 
-        # create the command object for insertion into the queue
         cmd_type = ActionHandler.CommandType.TYPE_PRIMARY
-        cmd = ActionHandler.Command(cmd_type, msg)
-
-        self.q.put(cmd)
+        self._put(ActionHandler.Command(cmd_type, msg,
+            ActionHandler.CommandType.DASH, (power,)))
 
     def kick(self, power, relative_direction):
         """
@@ -525,13 +949,12 @@ class ActionHandler:
         relative to the current direction of the player's body.
         """
 
-        msg = "(kick %.10f %.10f)" % (power, relative_direction)
+        msg = "(kick %s %s)" % (format_float(power),
+                format_float(relative_direction))
 
-        # create the command object for insertion into the queue
         cmd_type = ActionHandler.CommandType.TYPE_PRIMARY
-        cmd = ActionHandler.Command(cmd_type, msg)
-
-        self.q.put(cmd)
+        self._put(ActionHandler.Command(cmd_type, msg,
+            ActionHandler.CommandType.KICK, (power, relative_direction)))
 
     def catch(self, relative_direction):
         """
@@ -539,13 +962,11 @@ class ActionHandler:
         remains there until the goalie kicks it away.
         """
 
-        msg = "(catch %.10f)" % relative_direction
+        msg = "(catch %s)" % format_float(relative_direction)
 
-        # create the command object for insertion into the queue
         cmd_type = ActionHandler.CommandType.TYPE_PRIMARY
-        cmd = ActionHandler.Command(cmd_type, msg)
-
-        self.q.put(cmd)
+        self._put(ActionHandler.Command(cmd_type, msg,
+            ActionHandler.CommandType.CATCH, (relative_direction,)))
 
     def say(self, message):
         """
@@ -555,11 +976,9 @@ class ActionHandler:
 
         msg = "(say %s)" % message
 
-        # create the command object for insertion into the queue
         cmd_type = ActionHandler.CommandType.TYPE_SECONDARY
-        cmd = ActionHandler.Command(cmd_type, msg)
-
-        self.q.put(cmd)
+        self._put(ActionHandler.Command(cmd_type, msg,
+            ActionHandler.CommandType.SAY, (message,)))
 
     def turn_neck(self, relative_direction):
         """
@@ -567,11 +986,96 @@ class ActionHandler:
         angle is relative to body angle.
         """
 
-        msg = "(turn_neck %.10f)" % relative_direction
+        msg = "(turn_neck %s)" % format_float(relative_direction)
 
-        # create the command object for insertion into the queue
         cmd_type = ActionHandler.CommandType.TYPE_SECONDARY
-        cmd = ActionHandler.Command(cmd_type, msg)
+        self._put(ActionHandler.Command(cmd_type, msg,
+            ActionHandler.CommandType.TURN_NECK, (relative_direction,)))
+
+    def change_view(self, width, quality):
+        """
+        Changes the width ('narrow', 'normal' or 'wide') and quality ('high' or
+        'low') of the player's view.  Narrower and lower quality views arrive
+        more often.
+        """
+
+        msg = "(change_view %s %s)" % (width, quality)
 
-        self.q.put(cmd)
+        cmd_type = ActionHandler.CommandType.TYPE_SECONDARY
+        self._put(ActionHandler.Command(cmd_type, msg,
+            ActionHandler.CommandType.CHANGE_VIEW, (width, quality)))
+
+def benchmark(path, repeat=5):
+    """
+    Compares finding the handler of every message in the given log through
+    MessageHandler's dispatch table with looking it up by formatted name, as
+    handle_parsed once did, then prints how long handle_parsed takes for each
+    type of message.  The best of 'repeat' runs is kept for each.
+    """
 
+    import time
+    from replay import read_log
+
+    lines = read_log(path)
+    msg_handler = MessageHandler(WorldModel(ActionHandler(None)))
+    msg_types = [msg_handler.parse(line)[0] for line in lines]
+
+    def by_name():
+        for msg_type in msg_types:
+            msg_func = "_handle_%s" % msg_type
+            if hasattr(msg_handler, msg_func):
+                getattr(msg_handler, msg_func)
+
+    def by_table():
+        dispatch = msg_handler.dispatch
+        for msg_type in msg_types:
+            dispatch.get(msg_type)
+
+    for name, func in (("by name", by_name), ("by table", by_table)):
+        best = None
+        for i in xrange(repeat):
+            start = time.time()
+            func()
+            elapsed = time.time() - start
+
+            if best is None or elapsed < best:
+                best = elapsed
+
+        print "lookup %-10s %8.3f us/message" % (name,
+                best / len(lines) * 1e6)
+
+    # handling has to start over from the first message every run
+    best = {}
+    counts = {}
+    for i in xrange(repeat):
+        msg_handler = MessageHandler(WorldModel(ActionHandler(None)))
+        totals = {}
+        for line in lines:
+            parsed = msg_handler.parse(line)
+
+            start = time.time()
+            msg_type = msg_handler.handle_parsed(parsed)
+            elapsed = time.time() - start
+
+            totals[msg_type] = totals.get(msg_type, 0.0) + elapsed
+            counts[msg_type] = counts.get(msg_type, 0) + 1
+
+        for msg_type, total in totals.iteritems():
+            if msg_type not in best or total < best[msg_type]:
+                best[msg_type] = total
+
+    for msg_type in sorted(best):
+        calls = counts[msg_type] / repeat
+        print "handle %-14s %6d calls %10.2f us/message" % (msg_type, calls,
+                best[msg_type] / calls * 1e6)
+
+if __name__ == "__main__":
+    import sys
+    from replay import DEFAULT_LOG
+
+    # benchmark against the given log, or the shipped one
+    path = DEFAULT_LOG
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+
+    benchmark(path)
@@ -0,0 +1,240 @@
+import bisect
+import collections
+import socket
+import threading
+import time
+
+# the number of most recent samples kept for each stage.  a busy agent handles
+# a few hundred messages between dumps, so the ring buffers hold all of them.
+RING_SIZE = 1024
+
+# the upper bounds of the histogram buckets for timed stages, in seconds.  a
+# last bucket holds everything slower.
+TIME_BUCKETS = (0.00001, 0.00002, 0.00005, 0.0001, 0.0002, 0.0005, 0.001,
+        0.002, 0.005, 0.01, 0.02, 0.05, 0.1)
+
+# the upper bounds of the histogram buckets for queue depths, in messages
+DEPTH_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 32)
+
+# how often, in seconds, instruments are dumped
+DUMP_INTERVAL = 5.0
+
+class Stage:
+    """
+    The samples of one stage of the runtime, kept in a fixed-size ring buffer
+    of the most recent ones.  Histograms and percentiles are worked out from
+    the ring buffer when it's dumped, so adding a sample only stores it.
+    """
+
+    def __init__(self, name, buckets, ring_size=RING_SIZE):
+        self.name = name
+        self.buckets = buckets
+
+        # a deque with a maximum length drops its oldest item for every one
+        # added once it's full.  adding is a call straight to its append,
+        # which costs a tenth of a method of our own.
+        self.ring = collections.deque(maxlen=ring_size)
+        self.add = self.ring.append
+
+    def recent(self):
+        """
+        Returns the samples in the ring buffer, oldest first.
+        """
+
+        return list(self.ring)
+
+    def histogram(self, samples):
+        """
+        Returns the number of samples in each bucket, plus one more count for
+        those past the last.
+        """
+
+        counts = [0] * (len(self.buckets) + 1)
+        for value in samples:
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+
+        return counts
+
+    def percentile(self, samples, p):
+        """
+        Returns the 'p'th percentile of some sorted samples.
+        """
+
+        if len(samples) == 0:
+            return 0.0
+
+        return samples[min(len(samples) - 1, int(p / 100.0 * len(samples)))]
+
+class Instruments:
+    """
+    Times the stages of an agent's runtime: parsing messages, handling each
+    type of message, processing what we see, thinking and sending commands,
+    along with how many messages pile up between thinks.  Every stage gets a
+    Stage of its own.  The world model holds the instruments of its agent in
+    its 'instruments' attribute, which is None unless they're enabled, so the
+    runtime does no timing at all otherwise.
+
+    Instruments are dumped as text every 'interval' seconds, appended to a
+    file, sent to a UNIX datagram socket, or both.
+    """
+
+    def __init__(self, name="agent", path=None, socket_path=None,
+            interval=DUMP_INTERVAL, ring_size=RING_SIZE, clock=time.time):
+        """
+        'name' identifies the agent in dumps.  'path' is a file that dumps are
+        appended to, and 'socket_path' the address of a UNIX datagram socket
+        they're sent to.
+        """
+
+        self.name = name
+        self.path = path
+        self.socket_path = socket_path
+        self.interval = interval
+        self.ring_size = ring_size
+        self.clock = clock
+
+        # stages by name, in the order they were first added to
+        self.stages = {}
+        self.order = []
+
+        self.sock = None
+        if socket_path is not None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.sock.setblocking(0)
+
+        self.last_dump = clock()
+        self.dumps = 0
+
+        # held while a thread dumps, since the message and think threads of
+        # the threaded runtime both check whether it's time to
+        self.dump_lock = threading.Lock()
+
+        # the stages the runtime times.  they're attributes so that the hot
+        # paths adding to them needn't look them up by name.
+        self.parse = self.get_stage("parse")
+        self.process_new_info = self.get_stage("process_new_info")
+        self.think = self.get_stage("think")
+        self.queue_depth = self.get_stage("queue depth", DEPTH_BUCKETS)
+        self.send_latency = self.get_stage("send latency")
+
+        # the stages for handling each type of message, by type
+        self.handle = {}
+
+    def get_stage(self, name, buckets=TIME_BUCKETS):
+        """
+        Returns the Stage with the given name, creating it if needed.
+        """
+
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = Stage(name, buckets, self.ring_size)
+            self.stages[name] = stage
+            self.order.append(name)
+
+        return stage
+
+    def get_handle_stage(self, msg_type):
+        """
+        Returns the Stage for handling the given type of message.
+        """
+
+        stage = self.handle.get(msg_type)
+        if stage is None:
+            stage = self.get_stage("handle " + msg_type)
+            self.handle[msg_type] = stage
+
+        return stage
+
+    def add(self, name, seconds):
+        """
+        Records that the named stage took some number of seconds, creating
+        the stage if needed.  The runtime's own stages are added to directly.
+        """
+
+        self.get_stage(name).add(seconds)
+
+    def format(self):
+        """
+        Returns a text dump of the samples in the ring buffer of every stage.
+        Times are in microseconds, and each stage's histogram follows it as
+        bucket upper bound:count pairs.
+        """
+
+        lines = ["# %s at %.3f" % (self.name, self.clock())]
+        lines.append("%-22s %8s %10s %10s %10s %10s %10s" % ("stage", "samples",
+            "mean", "p50", "p90", "p99", "max"))
+        for name in self.order:
+            stage = self.stages[name]
+
+            # depths are left as they are
+            scale = 1e6
+            if stage.buckets is DEPTH_BUCKETS:
+                scale = 1.0
+
+            samples = sorted(stage.recent())
+            if len(samples) == 0:
+                continue
+
+            lines.append("%-22s %8d %10.1f %10.1f %10.1f %10.1f %10.1f" % (
+                name, len(samples), sum(samples) / len(samples) * scale,
+                stage.percentile(samples, 50) * scale,
+                stage.percentile(samples, 90) * scale,
+                stage.percentile(samples, 99) * scale, samples[-1] * scale))
+
+            bounds = ["%g" % (b * scale) for b in stage.buckets] + ["inf"]
+            lines.append("  " + " ".join("%s:%d" % (b, c) for b, c in
+                zip(bounds, stage.histogram(samples)) if c > 0))
+
+        return "\n".join(lines) + "\n"
+
+    def dump(self, out=None):
+        """
+        Writes a dump to 'out' if given, otherwise to our file and socket.
+        """
+
+        text = self.format()
+        self.last_dump = self.clock()
+        self.dumps += 1
+
+        if out is not None:
+            out.write(text)
+            return
+
+        if self.path is not None:
+            with open(self.path, "a") as f:
+                f.write(text)
+
+        # nobody may be listening, which mustn't stop the agent
+        if self.sock is not None:
+            try:
+                self.sock.sendto(text, self.socket_path)
+            except socket.error:
+                pass
+
+    def maybe_dump(self):
+        """
+        Dumps if it's been at least 'interval' seconds since the last dump,
+        unless another thread is already dumping.
+        """
+
+        if self.clock() - self.last_dump < self.interval:
+            return
+
+        if not self.dump_lock.acquire(False):
+            return
+
+        try:
+            if self.clock() - self.last_dump >= self.interval:
+                self.dump()
+        finally:
+            self.dump_lock.release()
+
+    def close(self):
+        """
+        Dumps one last time and closes our socket.
+        """
+
+        self.dump()
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
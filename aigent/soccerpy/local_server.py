@@ -0,0 +1,513 @@
+#!/usr/bin/env python
+
+import collections
+import errno
+import re
+import socket
+import sys
+import time
+
+import replay
+import select_loop
+
+# the port rcssserver listens for players on
+DEFAULT_PORT = 6000
+
+# the length of a cycle in seconds, as rcssserver runs by default
+DEFAULT_STEP = 0.1
+
+# the most teams, and players per team, that can connect
+MAX_TEAMS = 2
+MAX_PLAYERS = 11
+
+# how many of each player's most recent command latencies are kept
+LATENCY_SAMPLES = 10000
+
+# the commands the server carries out only one of per cycle
+PRIMARY_COMMANDS = ("catch", "dash", "kick", "move", "tackle", "turn")
+
+# an init message, with the team name and an optional version
+pattern_init = re.compile(r'\(init\s+([^\s()]+)(?:\s+\(version\s+([\d.]+)\))?')
+
+# a single command in a datagram of them, giving its name.  commands never
+# nest, but the text of a 'say' may contain anything within its quotes.
+pattern_command = re.compile(r'\(([a-z_]+)(?:"[^"]*"|[^()"])*\)')
+
+def split_log(messages):
+    """
+    Splits the messages of a captured server log into those sent once when
+    the player connected and those sent every cycle.  Returns (preamble,
+    cycles), where 'cycles' is a list of the messages of each cycle, each
+    starting with its 'sense_body'.
+    """
+
+    preamble = []
+    cycles = []
+    for msg in messages:
+        if msg.startswith("(sense_body"):
+            cycles.append([msg])
+        elif len(cycles) > 0:
+            cycles[-1].append(msg)
+        else:
+            preamble.append(msg)
+
+    return preamble, cycles
+
+class Player:
+    """
+    One player connected to a LocalServer, with a socket of its own that the
+    server talks to it from, and counts of the commands it sent.
+    """
+
+    def __init__(self, address, teamname, side, uniform_number, host):
+        self.address = address
+        self.teamname = teamname
+        self.side = side
+        self.uniform_number = uniform_number
+
+        # like rcssserver, we answer from a new port for every player, which
+        # the player sends all its commands to from then on.
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, 0))
+        self.sock.setblocking(0)
+
+        self.connected = True
+
+        # when the current cycle's 'sense_body' was sent, and the number of
+        # primary commands received since
+        self.cycle_sent = None
+        self.primary = 0
+
+        # the number of cycles sent, those that ended without a primary
+        # command, and those with more than one
+        self.cycles = 0
+        self.missed = 0
+        self.multiple = 0
+
+        # the number of commands received, by name, and of datagrams
+        self.commands = collections.defaultdict(int)
+        self.datagrams = 0
+
+        # seconds from sending a 'sense_body' to receiving the first primary
+        # command of its cycle, the most recent of them and over all cycles
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.latency_total = 0.0
+        self.latency_count = 0
+        self.latency_worst = 0.0
+
+    def get_name(self):
+        """
+        Returns the player's team name and uniform number.
+        """
+
+        return "%s %d" % (self.teamname, self.uniform_number)
+
+    def send(self, msg):
+        """
+        Sends a message to the player, null terminated as the server does.
+        """
+
+        self.sock.sendto(msg + "\0", self.address)
+
+    def start_cycle(self, now):
+        """
+        Ends the current cycle, counting it as missed if no primary command
+        came in during it, and starts the next at 'now'.
+        """
+
+        if self.cycle_sent is not None:
+            if self.primary == 0:
+                self.missed += 1
+            elif self.primary > 1:
+                self.multiple += 1
+
+        self.cycle_sent = now
+        self.primary = 0
+        self.cycles += 1
+
+    def received(self, datagram, now):
+        """
+        Counts the commands in a datagram received at 'now'.
+        """
+
+        self.datagrams += 1
+        for name in pattern_command.findall(datagram):
+            self.commands[name] += 1
+            if name not in PRIMARY_COMMANDS:
+                continue
+
+            # only a cycle's first primary command is carried out
+            self.primary += 1
+            if self.primary == 1 and self.cycle_sent is not None:
+                latency = now - self.cycle_sent
+                self.latencies.append(latency)
+                self.latency_total += latency
+                self.latency_count += 1
+                self.latency_worst = max(self.latency_worst, latency)
+
+class LocalServer:
+    """
+    A stand-in for rcssserver on this machine, for load and latency testing
+    without a real server.  Players connect to it with init messages as they
+    would to rcssserver, and are answered from a port of their own with the
+    messages a captured log starts with.  After that, every cycle sends each
+    player the messages of the next cycle of the log, looping back to its
+    start when it runs out.  All of a cycle's messages are sent together at
+    its start; the real server sends 'see' messages on a schedule of their
+    own.  Nothing is simulated: every player gets the same log, with its own
+    team name put in for the logged team's.
+
+    The server counts the commands every player sends back, how long the
+    first primary command of each cycle took to arrive after its
+    'sense_body', and the cycles that ended without one.
+
+    It runs in a SelectLoop, which may also drive agents using the select
+    runtime in the same thread.
+    """
+
+    def __init__(self, host="localhost", port=DEFAULT_PORT, step=DEFAULT_STEP,
+            log=replay.DEFAULT_LOG, log_teamname=replay.DEFAULT_TEAMNAME,
+            clock=time.time):
+        """
+        Listens for players at 'host' and 'port', and runs cycles of 'step'
+        seconds from the first player's connection.  'log' is the captured
+        server log replayed to players, recorded by a player of the team
+        'log_teamname'.
+        """
+
+        self.host = host
+        self.step = step
+        self.clock = clock
+        self.log_teamname = log_teamname
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(0)
+        self.address = self.sock.getsockname()
+
+        self.preamble, self.log_cycles = split_log(replay.read_log(log))
+        if len(self.log_cycles) == 0:
+            raise ValueError("The log at '%s' has no cycles." % log)
+
+        # players see our cycle length in the server parameters, and the play
+        # mode the log started in when they're accepted.
+        self.init_reply = "(init %s %d before_kick_off)"
+        for i, msg in enumerate(self.preamble):
+            if msg.startswith("(init"):
+                self.init_reply = "(init %s %d " + msg.split()[-1]
+            elif msg.startswith("(server_param"):
+                self.preamble[i] = re.sub(r"\(simulator_step [\d.]+\)",
+                        "(simulator_step %d)" % int(round(step * 1000)), msg)
+        self.preamble = [m for m in self.preamble if not m.startswith("(init")]
+
+        # the log's messages for each team, with its name put in
+        self.team_cycles = {}
+
+        # players by the address they sent init from, and team names in the
+        # order they connected, which gives their sides
+        self.players = {}
+        self.teams = []
+
+        # the number of cycles run, and when the next starts.  no cycles run
+        # until the first player connects.
+        self.cycle = 0
+        self.next_cycle = None
+
+        self.running = False
+        self.loop = None
+
+    def fileno(self):
+        """
+        Returns the file descriptor of the socket players connect to.
+        """
+
+        return self.sock.fileno()
+
+    def attach(self, loop):
+        """
+        Has the given SelectLoop read from our sockets.
+        """
+
+        self.loop = loop
+        loop.add_reader(self.sock, self.handle_connects)
+        for player in self.players.itervalues():
+            if player.connected:
+                self._add_player_reader(player)
+
+    def _add_player_reader(self, player):
+        """
+        Has our loop read the given player's commands.
+        """
+
+        if self.loop is not None:
+            self.loop.add_reader(player.sock,
+                    lambda: self.handle_commands(player))
+
+    def _receive(self, sock):
+        """
+        Returns the next datagram waiting on a socket and the address it came
+        from, or (None, None) if there's none.
+        """
+
+        try:
+            return sock.recvfrom(8192)
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return None, None
+            raise
+
+    def _get_team_cycles(self, teamname):
+        """
+        Returns the log's cycles for the given team.
+        """
+
+        cycles = self.team_cycles.get(teamname)
+        if cycles is None:
+            old = '"%s"' % self.log_teamname
+            new = '"%s"' % teamname
+            cycles = [[m.replace(old, new) for m in c] for c in self.log_cycles]
+            self.team_cycles[teamname] = cycles
+
+        return cycles
+
+    def handle_connects(self):
+        """
+        Accepts every init message waiting on our socket.  A player that sends
+        init again is sent its reply again.
+        """
+
+        while True:
+            data, address = self._receive(self.sock)
+            if data is None:
+                return
+
+            m = pattern_init.match(data.rstrip("\0"))
+            if m is None:
+                self.sock.sendto("(error unknown_command)\0", address)
+                continue
+
+            player = self.players.get(address)
+            if player is None:
+                player = self.add_player(address, m.group(1))
+                if player is None:
+                    self.sock.sendto("(error no_more_team_or_player_or_goalie)"
+                            "\0", address)
+                    continue
+
+            player.send(self.init_reply % (player.side,
+                player.uniform_number))
+            for msg in self.preamble:
+                player.send(msg)
+
+    def add_player(self, address, teamname):
+        """
+        Adds a player of the given team connecting from 'address', or returns
+        None if the team, or the game, is full.
+        """
+
+        if teamname not in self.teams:
+            if len(self.teams) >= MAX_TEAMS:
+                return None
+            self.teams.append(teamname)
+
+        uniform_number = 1 + sum(1 for p in self.players.itervalues()
+                if p.teamname == teamname)
+        if uniform_number > MAX_PLAYERS:
+            return None
+
+        side = "lr"[self.teams.index(teamname)]
+        player = Player(address, teamname, side, uniform_number, self.host)
+        self.players[address] = player
+        self._add_player_reader(player)
+
+        # the game starts with its first player
+        if self.next_cycle is None:
+            self.next_cycle = self.clock() + self.step
+
+        return player
+
+    def handle_commands(self, player):
+        """
+        Counts every command waiting on a player's socket.
+        """
+
+        while True:
+            data, address = self._receive(player.sock)
+            if data is None:
+                return
+
+            data = data.rstrip("\0")
+            if data.startswith("(bye"):
+                self.remove_player(player)
+                return
+
+            player.received(data, self.clock())
+
+    def remove_player(self, player):
+        """
+        Stops sending to a player that said goodbye.  Its counts are kept.
+        """
+
+        player.connected = False
+        if self.loop is not None:
+            self.loop.remove_reader(player.sock)
+        player.sock.close()
+
+    def start_cycle(self, now):
+        """
+        Sends every connected player the messages of the next cycle.
+        """
+
+        index = self.cycle % len(self.log_cycles)
+        for player in self.players.itervalues():
+            if not player.connected:
+                continue
+
+            player.start_cycle(now)
+            for msg in self._get_team_cycles(player.teamname)[index]:
+                player.send(msg)
+
+        self.cycle += 1
+
+    def time_until_cycle(self, now=None):
+        """
+        Returns how many seconds are left until the next cycle starts, or None
+        if no player has connected yet.
+        """
+
+        if self.next_cycle is None:
+            return None
+
+        if now is None:
+            now = self.clock()
+
+        return self.next_cycle - now
+
+    def start_cycle_if_due(self, now=None):
+        """
+        Starts the next cycle if it's time to, returning whether it was.  If
+        we fell behind by more than a cycle, the missed cycles are skipped.
+        """
+
+        delay = self.time_until_cycle(now)
+        if delay is None or delay > 0:
+            return False
+
+        if now is None:
+            now = self.clock()
+
+        self.start_cycle(now)
+        self.next_cycle += self.step
+        if self.next_cycle <= now:
+            self.next_cycle = now + self.step
+
+        return True
+
+    def stop(self):
+        """
+        Tells run to return at its next opportunity.
+        """
+
+        self.running = False
+
+    def run(self, cycles=None, loop=None, poll_interval=1.0):
+        """
+        Serves players until stop is called, or until 'cycles' cycles have
+        run if given.  'loop' is the SelectLoop to run in, which is created if
+        not given.  Without players, the loop checks for stop at least every
+        'poll_interval' seconds.
+        """
+
+        if loop is None:
+            loop = select_loop.SelectLoop()
+        self.attach(loop)
+
+        self.running = True
+        while self.running and (cycles is None or self.cycle < cycles):
+            self.start_cycle_if_due()
+
+            timeout = self.time_until_cycle()
+            if timeout is None:
+                timeout = poll_interval
+            loop.run_once(max(0.0, timeout))
+
+        self.running = False
+
+    def close(self):
+        """
+        Closes our sockets and those of every connected player.
+        """
+
+        for player in self.players.itervalues():
+            if player.connected:
+                self.remove_player(player)
+
+        if self.loop is not None:
+            self.loop.remove_reader(self.sock)
+        self.sock.close()
+
+    def report(self, out=sys.stdout):
+        """
+        Prints each player's counts, and the latency of its commands in
+        milliseconds.
+        """
+
+        out.write("%d cycles of %.0f ms\n" % (self.cycle, self.step * 1e3))
+        out.write("%-16s %7s %8s %7s %7s %8s %8s %8s %8s\n" % ("player",
+            "cycles", "commands", "missed", ">1", "mean ms", "p50 ms",
+            "p90 ms", "max ms"))
+
+        cycles = missed = 0
+        players = sorted(self.players.itervalues(),
+                key=lambda p: (p.side, p.uniform_number))
+        for p in players:
+            latencies = sorted(p.latencies)
+            mean = p50 = p90 = 0.0
+            if len(latencies) > 0:
+                mean = p.latency_total / p.latency_count
+                p50 = latencies[len(latencies) // 2]
+                p90 = latencies[min(len(latencies) - 1,
+                    int(0.9 * len(latencies)))]
+
+            out.write("%-16s %7d %8d %7d %7d %8.2f %8.2f %8.2f %8.2f\n" % (
+                p.get_name()[:16], p.cycles, sum(p.commands.itervalues()),
+                p.missed, p.multiple, mean * 1e3, p50 * 1e3, p90 * 1e3,
+                p.latency_worst * 1e3))
+
+            cycles += p.cycles
+            missed += p.missed
+
+        if cycles > 0:
+            out.write("%d of %d player cycles missed (%.1f%%)\n" % (missed,
+                cycles, 100.0 * missed / cycles))
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local stand-in for "
+            "the soccer server that replays a captured log to every player "
+            "and counts the commands they send back.")
+    parser.add_argument("log", nargs="?", default=replay.DEFAULT_LOG,
+            help="captured server messages, one per line")
+    parser.add_argument("--host", default="localhost",
+            help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+            help="port to listen on")
+    parser.add_argument("--step", type=float, default=DEFAULT_STEP * 1e3,
+            help="length of a cycle in milliseconds")
+    parser.add_argument("--cycles", type=int, default=None,
+            help="stop after this many cycles (default: run until "
+                 "interrupted)")
+    parser.add_argument("--team", default=replay.DEFAULT_TEAMNAME,
+            help="the team name of the player that recorded the log")
+    args = parser.parse_args()
+
+    server = LocalServer(args.host, args.port, args.step / 1e3, args.log,
+            args.team)
+    print "Listening on %s:%d..." % server.address
+    try:
+        server.run(args.cycles)
+    except KeyboardInterrupt:
+        pass
+
+    server.report()
@@ -0,0 +1,410 @@
+#!/usr/bin/env python
+
+import math
+
+# the number of Gauss-Newton refinement steps taken after the linear solution
+REFINE_STEPS = 2
+
+# below this determinant, flags are too nearly collinear to solve with
+MIN_DETERMINANT = 1e-6
+
+def locate(flag_points, refine_steps=REFINE_STEPS):
+    """
+    Finds the point that best agrees with the distances to all the given
+    flags, as a list of (x, y, distance) tuples, by least squares.  Returns
+    None if the flags don't determine a unique point, ie. there are fewer than
+    three, or they're all in a line.
+
+    Subtracting the mean of all the circle equations (x - xi)^2 + (y - yi)^2 =
+    di^2 from each one leaves a linear system in x and y, solved at once for
+    every flag seen.  A few Gauss-Newton steps on the original distances then
+    remove the bias the linearization introduces.  A 'see' holds too few
+    flags for numpy's per-call overhead to pay off, so this is plain python.
+    """
+
+    if len(flag_points) < 3:
+        return None
+
+    n = float(len(flag_points))
+    mean_x = sum(p[0] for p in flag_points) / n
+    mean_y = sum(p[1] for p in flag_points) / n
+    mean_c = sum(p[0] * p[0] + p[1] * p[1] - p[2] * p[2]
+            for p in flag_points) / n
+
+    # the linear system, relative to the mean of all the flags
+    sxx = sxy = syy = bx = by = 0.0
+    for fx, fy, fd in flag_points:
+        ax = fx - mean_x
+        ay = fy - mean_y
+        b = 0.5 * (fx * fx + fy * fy - fd * fd - mean_c)
+        sxx += ax * ax
+        sxy += ax * ay
+        syy += ay * ay
+        bx += ax * b
+        by += ay * b
+
+    det = sxx * syy - sxy * sxy
+    if abs(det) < MIN_DETERMINANT:
+        return None
+
+    x = (syy * bx - sxy * by) / det
+    y = (sxx * by - sxy * bx) / det
+
+    return refine((x, y), flag_points, refine_steps)
+
+def refine(point, flag_points, steps=REFINE_STEPS):
+    """
+    Takes the given number of Gauss-Newton steps from 'point' towards the
+    position that best agrees with the distances to the given flags.  Stops
+    early if the flags don't pin down both coordinates, which with a good
+    starting point can still be the case for just one or two flags.
+    """
+
+    x, y = point
+    for i in xrange(steps):
+        sxx = sxy = syy = gx = gy = 0.0
+        for fx, fy, fd in flag_points:
+            dx = x - fx
+            dy = y - fy
+            r = max(math.sqrt(dx * dx + dy * dy), 1e-9)
+
+            # the jacobian rows are the unit vectors from each flag to us
+            jx = dx / r
+            jy = dy / r
+            e = r - fd
+            sxx += jx * jx
+            sxy += jx * jy
+            syy += jy * jy
+            gx += jx * e
+            gy += jy * e
+
+        det = sxx * syy - sxy * sxy
+        if abs(det) < MIN_DETERMINANT:
+            break
+
+        x -= (syy * gx - sxy * gy) / det
+        y -= (sxx * gy - sxy * gx) / det
+
+    return (x, y)
+
+def _wrap_angle(a):
+    """
+    Returns the given angle in degrees as one in [-180, 180).
+    """
+
+    return (a + 180.0) % 360.0 - 180.0
+
+class MotionFilter:
+    """
+    Tracks our position and body direction from cycle to cycle, instead of
+    working them out from scratch on every 'see'.  A scalar Kalman filter
+    keeps one variance for the position and one for the direction.
+
+    Every 'sense_body' the position is predicted from our reported speed, or
+    from the last dash if there isn't one, and the body direction from the
+    last turn.  Every 'see' the prediction is corrected by a couple of
+    Gauss-Newton steps from the predicted position towards the seen flags,
+    which is cheaper than a full fix and works with fewer flags.  A full fix
+    is only done at the start, after a 'move', or when the flags no longer
+    agree with the prediction at all.
+    """
+
+    # the variance of the position and direction when nothing is known
+    UNKNOWN_VARIANCE = 1e6
+
+    # the variance the position gains every cycle, plus a share of the
+    # distance moved, for the noise the server adds to movement
+    POSITION_NOISE = 0.01
+    MOTION_NOISE = 0.1
+
+    # the variance the direction gains every cycle, in degrees squared
+    DIRECTION_NOISE = 4.0
+
+    # the lowest variance a position and direction fix can be trusted to
+    MIN_POSITION_VARIANCE = 0.01
+    MIN_DIRECTION_VARIANCE = 1.0
+
+    # a corrected position whose RMS distance error exceeds this, in meters,
+    # means the prediction was too far off to start from
+    MAX_RESIDUAL = 2.0
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets everything, so the next 'see' gets a full fix.
+        """
+
+        self.x = None
+        self.y = None
+        self.position_variance = MotionFilter.UNKNOWN_VARIANCE
+
+        self.body_dir = None
+        self.direction_variance = MotionFilter.UNKNOWN_VARIANCE
+
+        # our velocity after the last predicted step, for when no speed is
+        # reported.
+        self.vx = 0.0
+        self.vy = 0.0
+
+        # the last reported speed, which slows down turns
+        self.speed = 0.0
+
+        # how many corrections were full fixes and how many were cheap ones
+        self.fixes = 0
+        self.corrections = 0
+
+    def get_position(self):
+        """
+        Returns our (x, y) position, or None if we don't know it.
+        """
+
+        if self.x is None:
+            return None
+
+        return (self.x, self.y)
+
+    def predict(self, params, command=None, speed_amount=None,
+            speed_direction=None, neck_direction=None):
+        """
+        Moves the estimate forward one cycle.  'params' are the server
+        parameters, 'command' the ActionHandler.Command sent last cycle if
+        any, and the rest is from the 'sense_body' that started this one.
+        Speed directions are relative to the neck, which is relative to the
+        body, as in the world model.
+        """
+
+        name = None
+        if command is not None:
+            name = command.name
+
+        # a 'move' teleports us somewhere we may not have asked for
+        if name == "move":
+            self.reset()
+            return
+
+        # turns are slowed by the speed we had when they were made
+        if name == "turn" and self.body_dir is not None:
+            moment = max(min(command.args[0], params.maxmoment),
+                    params.minmoment)
+            turned = moment / (1.0 + params.inertia_moment * self.speed)
+            self.body_dir = (self.body_dir - turned) % 360.0
+            self.direction_variance += (0.1 * turned) ** 2
+
+        if self.body_dir is not None:
+            self.direction_variance += MotionFilter.DIRECTION_NOISE
+
+        if self.x is None:
+            return
+
+        # the server moves us by our velocity, then decays it before
+        # reporting it, so the reported speed undoes to the step we took.
+        if (speed_amount is not None and speed_direction is not None and
+                self.body_dir is not None):
+            neck = neck_direction or 0.0
+            a = math.radians(self.body_dir + neck - speed_direction)
+            step = speed_amount / params.player_decay
+            dx = step * math.cos(a)
+            dy = step * math.sin(a)
+            self.speed = speed_amount
+        else:
+            # no speed reported, so accelerate along our body by the last dash
+            dx = self.vx
+            dy = self.vy
+            if name == "dash" and self.body_dir is not None:
+                power = max(min(command.args[0], params.maxpower),
+                        params.minpower)
+                accel = min(abs(power) * params.dash_power_rate,
+                        params.player_accel_max)
+                if power < 0:
+                    accel = -accel
+                a = math.radians(self.body_dir)
+                dx += accel * math.cos(a)
+                dy += accel * math.sin(a)
+
+            step = math.sqrt(dx * dx + dy * dy)
+            if step > params.player_speed_max:
+                dx *= params.player_speed_max / step
+                dy *= params.player_speed_max / step
+                step = params.player_speed_max
+            self.speed = step * params.player_decay
+
+        self.x += dx
+        self.y += dy
+        self.vx = dx * params.player_decay
+        self.vy = dy * params.player_decay
+        self.position_variance += (MotionFilter.POSITION_NOISE +
+                (MotionFilter.MOTION_NOISE * step) ** 2)
+
+    def correct(self, flag_points):
+        """
+        Corrects the predicted position with the seen flags, as a list of
+        (x, y, distance) tuples.  Returns the new position, or None if it's
+        still unknown.
+        """
+
+        if len(flag_points) == 0:
+            return self.get_position()
+
+        fix = None
+        if self.x is not None:
+            fix = refine((self.x, self.y), flag_points)
+            error = residual(fix, flag_points)
+            if error > MotionFilter.MAX_RESIDUAL:
+                fix = None
+
+        # start over from a full fix if the prediction was no good
+        if fix is None:
+            fix = locate(flag_points)
+            if fix is None:
+                return self.get_position()
+
+            self.x, self.y = fix
+            self.position_variance = MotionFilter.MIN_POSITION_VARIANCE
+            self.vx = self.vy = 0.0
+            self.fixes += 1
+            return fix
+
+        # trust the fix more the more flags agree on it
+        fix_variance = max(error * error * 2.0 / len(flag_points),
+                MotionFilter.MIN_POSITION_VARIANCE)
+        gain = self.position_variance / (self.position_variance + fix_variance)
+
+        self.x += gain * (fix[0] - self.x)
+        self.y += gain * (fix[1] - self.y)
+        self.position_variance *= 1.0 - gain
+        self.corrections += 1
+
+        return (self.x, self.y)
+
+    def correct_direction(self, body_dir):
+        """
+        Corrects the predicted body direction with one worked out from the
+        seen flags, if there was one.  Returns the new direction, or None if
+        it's still unknown.
+        """
+
+        if body_dir is None:
+            return self.body_dir
+
+        if self.body_dir is None:
+            self.body_dir = body_dir % 360.0
+            self.direction_variance = MotionFilter.DIRECTION_NOISE
+            return self.body_dir
+
+        variance = self.direction_variance
+        gain = variance / (variance + MotionFilter.DIRECTION_NOISE)
+        self.body_dir = (self.body_dir +
+                gain * _wrap_angle(body_dir - self.body_dir)) % 360.0
+        self.direction_variance = max(variance * (1.0 - gain),
+                MotionFilter.MIN_DIRECTION_VARIANCE)
+
+        return self.body_dir
+
+def residual(point, flag_points):
+    """
+    Returns the root mean square difference between the distances from the
+    given point to each flag and the distances reported for them.
+    """
+
+    if len(flag_points) == 0:
+        return 0.0
+
+    total = 0.0
+    for fx, fy, fd in flag_points:
+        e = math.sqrt((point[0] - fx) ** 2 + (point[1] - fy) ** 2) - fd
+        total += e * e
+
+    return math.sqrt(total / len(flag_points))
+
+def benchmark(path, samples=500, seed=0):
+    """
+    Compares the least-squares localizer with WorldModel's k-means one.  Each
+    is timed on the flags of every 'see' message in the given log, where its
+    accuracy is the RMS disagreement with the reported flag distances.  Both
+    are then run on synthetic 'see's from random known positions, with
+    distances quantized the way the server does, to measure position error.
+    """
+
+    import random
+    import time
+
+    import game_object
+    import handler
+    import see_decoder
+    from replay import read_log
+    from world_model import WorldModel
+
+    random.seed(seed)
+    wm = WorldModel(handler.ActionHandler(None))
+
+    # the flag points of every 'see' in the log
+    logged = []
+    cols = see_decoder.SeeColumns()
+    for msg in read_log(path):
+        if msg.startswith("(see "):
+            points = see_decoder.decode_see(msg, cols, None).flag_points()
+            if len(points) >= 3:
+                logged.append(points)
+
+    # synthetic flag points from known positions, each seen flag's distance
+    # quantized as the server does for landmarks (quantize_step_l 0.01, then
+    # one decimal place)
+    synthetic = []
+    for i in xrange(samples):
+        x = random.uniform(-52, 52)
+        y = random.uniform(-34, 34)
+        points = []
+        for j in xrange(len(game_object.Flag.FLAG_IDS)):
+            fx = game_object.Flag.FLAG_X[j]
+            fy = game_object.Flag.FLAG_Y[j]
+            d = math.sqrt((x - fx) ** 2 + (y - fy) ** 2)
+
+            # about a quarter of the flags are in view at a time
+            if random.random() > 0.25 or d < 0.1:
+                continue
+
+            d = math.exp(round(math.log(d + 0.1) / 0.01) * 0.01)
+            points.append((fx, fy, round(d, 1)))
+
+        if len(points) >= 3:
+            synthetic.append(((x, y), points))
+
+    methods = (("kmeans", wm.triangulate_position_from_points),
+               ("lsq", locate))
+
+    print "%d logged see messages, %d synthetic" % (len(logged),
+            len(synthetic))
+    print "%-8s %12s %14s %14s %14s" % ("method", "us/locate",
+            "log resid m", "synth mean m", "synth max m")
+
+    for name, func in methods:
+        start = time.time()
+        results = [func(points) for points in logged]
+        elapsed = time.time() - start
+
+        resid = [residual(p, pts) for p, pts in zip(results, logged)
+                if p is not None]
+
+        errors = []
+        for truth, points in synthetic:
+            p = func(points)
+            if p is not None:
+                errors.append(math.sqrt((p[0] - truth[0]) ** 2 +
+                    (p[1] - truth[1]) ** 2))
+
+        print "%-8s %12.1f %14.3f %14.3f %14.3f" % (name,
+                elapsed / len(logged) * 1e6, sum(resid) / len(resid),
+                sum(errors) / len(errors), max(errors))
+
+if __name__ == "__main__":
+    import sys
+    from replay import DEFAULT_LOG
+
+    # benchmark against the given log, or the shipped one
+    path = DEFAULT_LOG
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+
+    benchmark(path)
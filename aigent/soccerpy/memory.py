@@ -0,0 +1,152 @@
+import math
+
+# how much we trust a remembered object less for every cycle since we saw it
+CONFIDENCE_DECAY = 0.9
+
+# objects not seen for this many cycles are forgotten
+MAX_AGE = 50
+
+# velocities are only worked out between sightings at most this many cycles
+# apart, since the object has likely been kicked or changed course otherwise
+MAX_VELOCITY_AGE = 3
+
+class RememberedObject:
+    """
+    Where an object was when we last saw it, and how fast it was moving then.
+    """
+
+    def __init__(self, sim_time, coords, velocity, obj):
+        self.sim_time = sim_time
+        self.coords = coords
+        self.velocity = velocity
+
+        # the game object as it was last seen
+        self.obj = obj
+
+        # the last estimate made from this, as (sim_time, estimate)
+        self.estimate = None
+
+    def extrapolate(self, sim_time, decay):
+        """
+        Returns an (x, y, confidence) estimate of where the object is at the
+        given time, assuming it kept moving with its velocity decaying by
+        'decay' every cycle.  The estimate for a time is only worked out once.
+        """
+
+        if self.estimate is not None and self.estimate[0] == sim_time:
+            return self.estimate[1]
+
+        age = max(0, sim_time - self.sim_time)
+
+        # the sum of the geometric series of decayed velocities over 'age'
+        travel = float(age)
+        if decay != 1:
+            travel = (1.0 - decay ** age) / (1.0 - decay)
+
+        estimate = (self.coords[0] + self.velocity[0] * travel,
+                self.coords[1] + self.velocity[1] * travel,
+                CONFIDENCE_DECAY ** age)
+
+        self.estimate = (sim_time, estimate)
+        return estimate
+
+class ObjectMemory:
+    """
+    Remembers the last known absolute positions and velocities of the ball and
+    of every identified player, by the simulation time they were seen at.
+    Objects that leave our view are extrapolated from there with the server's
+    decay rates, and trusted less the longer ago we saw them.
+    """
+
+    def __init__(self):
+        self.ball = None
+
+        # remembered players by (side, uniform number)
+        self.players = {}
+
+    def clear(self):
+        """
+        Forgets everything, for when the positions of objects are reset.
+        """
+
+        self.ball = None
+        self.players = {}
+
+    def _remember(self, old, sim_time, coords, obj, max_speed):
+        """
+        Returns a new RememberedObject for something seen at 'coords'.  Its
+        velocity is the one worked out from the distance and direction
+        changes the server reported, or failing that, from its last sighting
+        if that was recent enough.
+        """
+
+        velocity = (0.0, 0.0)
+        if obj.abs_velocity is not None:
+            velocity = obj.abs_velocity
+        elif old is not None:
+            age = sim_time - old.sim_time
+            if 0 < age <= MAX_VELOCITY_AGE:
+                velocity = ((coords[0] - old.coords[0]) / age,
+                        (coords[1] - old.coords[1]) / age)
+            elif age == 0:
+                velocity = old.velocity
+
+        # don't believe anything faster than the server allows
+        vx, vy = velocity
+        speed = math.sqrt(vx * vx + vy * vy)
+        if speed > max_speed:
+            velocity = (vx * max_speed / speed, vy * max_speed / speed)
+
+        return RememberedObject(sim_time, coords, velocity, obj)
+
+    def update(self, snapshot, sim_time, params):
+        """
+        Remembers everything with known coordinates in the given
+        WorldSnapshot, as seen at 'sim_time', and forgets anything not seen
+        for MAX_AGE cycles.
+        """
+
+        if sim_time is None:
+            return
+
+        if snapshot.ball_coords is not None:
+            self.ball = self._remember(self.ball, sim_time,
+                    snapshot.ball_coords, snapshot.ball, params.ball_speed_max)
+
+        for p, coords in zip(snapshot.players, snapshot.player_coords):
+            # we can only tell players apart by their side and number
+            if coords is None or p.side is None or p.uniform_number is None:
+                continue
+
+            key = (p.side, p.uniform_number)
+            self.players[key] = self._remember(self.players.get(key),
+                    sim_time, coords, p, params.player_speed_max)
+
+        if self.ball is not None and sim_time - self.ball.sim_time > MAX_AGE:
+            self.ball = None
+        for key, r in self.players.items():
+            if sim_time - r.sim_time > MAX_AGE:
+                del self.players[key]
+
+    def get_ball(self, sim_time, params):
+        """
+        Returns an (x, y, confidence) estimate of where the ball is at the
+        given time, or None if we don't remember it.
+        """
+
+        if self.ball is None:
+            return None
+
+        return self.ball.extrapolate(sim_time, params.ball_decay)
+
+    def get_player(self, side, uniform_number, sim_time, params):
+        """
+        Returns an (x, y, confidence) estimate of where the given player is at
+        the given time, or None if we don't remember them.
+        """
+
+        r = self.players.get((side, uniform_number))
+        if r is None:
+            return None
+
+        return r.extrapolate(sim_time, params.player_decay)
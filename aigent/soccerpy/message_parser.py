@@ -6,6 +6,24 @@ import re
 pattern_int = re.compile("^-?\d+$")
 pattern_float = re.compile("^-?\d*[.]\d+$")
 
+# used by parse_fast to split a message into parens, ints, floats and atoms in
+# a single pass.  the group that matched tells us the token's type directly, so
+# numbers never need a second regex test.  the groups are, in order: open
+# paren, close paren, int, float, atom, and stray quote.  atoms may contain
+# quoted segments, as long as those segments hold no spaces or escapes (team
+# names in 'see' messages look like this).  a quote that can't be matched that
+# way falls through to the last group, which makes us hand the message to the
+# legacy parser instead.  like the $ in the legacy patterns, a number may be
+# followed by one newline and still count as a number.
+pattern_token = re.compile(r"""
+    (\() |
+    (\)) |
+    (-?\d+)\n?(?=[ ()]|\Z) |
+    (-?\d*[.]\d+)\n?(?=[ ()]|\Z) |
+    ((?:[^ ()"]+|"[^" \\]*")+) |
+    (")
+""", re.VERBOSE)
+
 def parse(text):
     """
     This is what amounts to a simple lisp parser for turning the server's
@@ -135,11 +153,149 @@ def parse(text):
     # append the first '('.
     return result[0]
 
+def parse_fast(text):
+    """
+    A faster replacement for parse that returns exactly the same nested list
+    structure.
+
+    Instead of walking the message a character at a time, this tokenizes it
+    with a single regex pass and keeps a pointer to the list currently being
+    filled, so nesting is never re-walked from the root.  ints and floats are
+    recognized by the tokenizer itself and converted directly.  The rare
+    messages whose quoting the tokenizer can't reproduce exactly (quoted
+    strings containing spaces, escaped quotes) are handed to parse.
+    """
+
+    # make sure all of our parenthesis match
+    if text.count("(") != text.count(")"):
+        raise ValueError("Message text has unmatching parenthesis!")
+
+    # escapes change how quotes are treated, leave those to the slow parser
+    if "\\" in text:
+        return parse(text)
+
+    result = _build(pattern_token.findall(text))
+    if result is None:
+        return parse(text)
+
+    return result
+
+def parse_buffer(buf, length):
+    """
+    Parses a message received into the first 'length' bytes of the bytearray
+    'buf', exactly as parse_fast would parse it as a string, but without ever
+    copying the whole message out of the buffer.  The tokenizer reads the
+    bytes in place through a buffer object; python 2's re module can't read
+    from a memoryview.
+    """
+
+    # make sure all of our parenthesis match
+    if buf.count("(", 0, length) != buf.count(")", 0, length):
+        raise ValueError("Message text has unmatching parenthesis!")
+
+    # the rare messages that need the slow parser are copied out for it
+    if buf.find("\\", 0, length) >= 0:
+        return parse(str(buf[:length]))
+
+    result = _build(pattern_token.findall(buffer(buf, 0, length)))
+    if result is None:
+        return parse(str(buf[:length]))
+
+    return result
+
+def _build(tokens):
+    """
+    Turns the tokens pattern_token finds in a message into its nested lists,
+    for parse_fast and parse_buffer.  Returns None if the message needs the
+    slow parser: it has a quote that can't be tokenized faithfully, or closes
+    more parens than it has opened, which parse makes what it can of.
+    """
+
+    # the list currently being filled, and the lists enclosing it
+    result = []
+    cur = result
+    stack = []
+
+    # exactly one group of each token tuple is non-empty.  the checks are
+    # ordered by how often each token type shows up in 'see' messages.
+    for t_open, t_close, t_int, t_float, t_atom, t_quote in tokens:
+        if t_int:
+            cur.append(int(t_int))
+        elif t_float:
+            cur.append(float(t_float))
+        elif t_close:
+            if not stack:
+                return None
+            cur = stack.pop()
+        elif t_open:
+            new = []
+            cur.append(new)
+            stack.append(cur)
+            cur = new
+        elif t_atom:
+            # the quotes themselves are never part of the value, and what's
+            # left can still be a number, just as with the legacy parser.
+            if '"' in t_atom:
+                t_atom = t_atom.replace('"', "")
+                if len(t_atom) == 0:
+                    continue
+                if pattern_int.match(t_atom):
+                    t_atom = int(t_atom)
+                elif pattern_float.match(t_atom):
+                    t_atom = float(t_atom)
+
+            cur.append(t_atom)
+        else:
+            # a quote we can't tokenize faithfully
+            return None
+
+    # as with parse, we return the first and only message found
+    return result[0]
+
+def benchmark(path, repeat=5):
+    """
+    Parses every message in the given log file 'repeat' times with both parse
+    and parse_fast, verifies that they agree, and prints messages/sec for each.
+    """
+
+    import time
+
+    with open(path, "r") as f:
+        lines = [line.strip() for line in f if line.strip()]
+
+    # both parsers must agree on every message before their speed matters
+    for line in lines:
+        if parse(line) != parse_fast(line):
+            raise ValueError("Parsers disagree on message: '%s'" % line)
+
+    rates = {}
+    for func in (parse, parse_fast):
+        # keep the best of several runs to reduce scheduling noise
+        best = None
+        for i in xrange(repeat):
+            start = time.time()
+            for line in lines:
+                func(line)
+            elapsed = time.time() - start
+
+            if best is None or elapsed < best:
+                best = elapsed
+
+        rates[func.__name__] = len(lines) / best
+        print "%-12s %10.1f messages/sec" % (func.__name__,
+                rates[func.__name__])
+
+    print "speedup: %.2fx" % (rates["parse_fast"] / rates["parse"])
+
 if __name__ == "__main__":
     import sys
     
+    # compare parser throughput on the message file
+    if len(sys.argv) > 2 and sys.argv[2] == "--bench":
+        benchmark(sys.argv[1])
+
     # interactive mode if any args were specified
-    if len(sys.argv) > 2:
+    elif len(sys.argv) > 2:
            from pprint import pprint
            with open(sys.argv[1], 'r') as f:
                for line in f:
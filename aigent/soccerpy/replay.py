@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+
+import os
+import random
+import sys
+import time
+import traceback
+
+import handler
+import sp_exceptions
+from agent import Agent
+from world_model import WorldModel
+
+# the log of real server traffic shipped alongside this module
+DEFAULT_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        "client_recv")
+
+# the name of the team whose player recorded DEFAULT_LOG
+DEFAULT_TEAMNAME = "team_jason"
+
+# the stages of handling a message, in the order they happen
+STAGES = ("parse", "handle", "localize", "decide", "send")
+
+class RecordingSocket:
+    """
+    A stand-in for sock.Socket that never touches the network.  Everything
+    sent through it is recorded in order in 'sent' instead.
+    """
+
+    def __init__(self, host="localhost", port=6000):
+        self.address = (host, port)
+
+        # every message sent, with null terminators if they were requested
+        self.sent = []
+
+    def send(self, msg, append_null_terminator=True):
+        """
+        Records a message instead of sending it.
+        """
+
+        if append_null_terminator:
+            msg = msg + "\0"
+
+        self.sent.append(msg)
+
+    def recv(self, conform_address=True):
+        """
+        Replayed messages are fed to the message handler directly, so there's
+        never anything to receive.
+        """
+
+        raise sp_exceptions.AgentConnectionStateError(
+                "A recording socket can't receive messages.")
+
+class StageTimings:
+    """
+    Accumulates the time spent in each stage of message handling.
+    """
+
+    def __init__(self):
+        self.total = dict((s, 0.0) for s in STAGES)
+        self.calls = dict((s, 0) for s in STAGES)
+        self.worst = dict((s, 0.0) for s in STAGES)
+
+    def add(self, stage, elapsed):
+        """
+        Records one call of a stage that took 'elapsed' seconds.
+        """
+
+        self.total[stage] += elapsed
+        self.calls[stage] += 1
+        if elapsed > self.worst[stage]:
+            self.worst[stage] = elapsed
+
+    def report(self, messages, out=sys.stdout):
+        """
+        Prints a table of the time spent per stage, followed by the overall
+        throughput for the given number of messages.
+        """
+
+        grand_total = sum(self.total.values())
+
+        out.write("%-10s %8s %12s %12s %12s %7s\n" % ("stage", "calls",
+            "total ms", "mean us", "max us", "share"))
+        for s in STAGES:
+            calls = self.calls[s]
+            mean = 0.0
+            if calls > 0:
+                mean = self.total[s] / calls
+
+            share = 0.0
+            if grand_total > 0:
+                share = 100.0 * self.total[s] / grand_total
+
+            out.write("%-10s %8d %12.2f %12.1f %12.1f %6.1f%%\n" % (s, calls,
+                self.total[s] * 1e3, mean * 1e6, self.worst[s] * 1e6, share))
+
+        if grand_total > 0:
+            out.write("%d messages in %.2f ms, %.1f messages/sec\n" %
+                    (messages, grand_total * 1e3, messages / grand_total))
+
+class _NullWriter:
+    """
+    Swallows everything written to it, used to silence chatty agents.
+    """
+
+    def write(self, s):
+        pass
+
+def read_log(path):
+    """
+    Returns the non-empty messages in a captured server log, one per line.
+    """
+
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+def replay(messages, agent_class=Agent, teamname=DEFAULT_TEAMNAME,
+        use_see_decoder=False, timings=None, seed=0, quiet=True,
+        localizer=None, use_buffer=False, strict=False):
+    """
+    Feeds the given raw server messages, in order, through a fresh agent's
+    message handler, world model and think method, exactly as its message
+    and think loops would, but all in the calling thread and without a
+    server.  The commands decided on after every 'sense_body' are sent
+    right away, rather than at the point in the cycle the agent's CycleClock
+    would pick live, and recorded by a RecordingSocket.
+
+    The time spent in each stage is added to 'timings', a StageTimings object
+    created if not given.  'seed' seeds the random module, so that replays are
+    repeatable.  If 'quiet' is True, anything the agent prints is discarded.
+    'localizer', if given, is one of the WorldModel.LOCALIZER_* constants.
+    If 'use_buffer' is True, each message is copied into one reusable buffer,
+    as Socket.recv_into would receive it, and parsed from there.
+
+    Returns (agent, socket, timings, think_errors), where think_errors lists
+    the formatted tracebacks of any exceptions raised by think().  If 'strict'
+    is True, the first such exception is raised instead.
+    """
+
+    if timings is None:
+        timings = StageTimings()
+
+    random.seed(seed)
+
+    sock = RecordingSocket()
+    agent = agent_class()
+    agent.connect_offline(sock, teamname, use_see_decoder=use_see_decoder)
+
+    msg_handler = agent.msg_handler
+    wm = agent.wm
+    if localizer is not None:
+        wm.localizer = localizer
+    clock = time.time
+
+    # time localization separately from the rest of message handling.  it
+    # happens inside the handler, so we take it back out of the handle stage.
+    localized = [0.0]
+    process_new_info = wm.process_new_info
+    def timed_process_new_info(*args, **kwargs):
+        start = clock()
+        process_new_info(*args, **kwargs)
+        elapsed = clock() - start
+
+        timings.add("localize", elapsed)
+        localized[0] += elapsed
+    wm.process_new_info = timed_process_new_info
+
+    buf = bytearray(8192)
+
+    think_errors = []
+    stdout = sys.stdout
+    if quiet:
+        sys.stdout = _NullWriter()
+
+    try:
+        for msg in messages:
+            start = clock()
+            if use_buffer:
+                buf[:len(msg)] = msg
+                parsed = msg_handler.parse_buffer(buf, len(msg))
+            else:
+                parsed = msg_handler.parse(msg)
+            parse_done = clock()
+            timings.add("parse", parse_done - start)
+
+            localized[0] = 0.0
+            msg_type = msg_handler.handle_parsed(parsed)
+            handle_done = clock()
+            timings.add("handle", handle_done - parse_done - localized[0])
+
+            cycle = wm.clock.cycles
+            requests = wm.ah.primary_requests
+            try:
+                agent.think()
+            except Exception:
+                if strict:
+                    raise
+                think_errors.append(traceback.format_exc())
+            decide_done = clock()
+            timings.add("decide", decide_done - handle_done)
+            if wm.clock.decide(cycle,
+                    requests=wm.ah.primary_requests - requests):
+                wm.ah.primary_late = True
+
+            # commands go out once per cycle, once we've decided on them
+            if msg_type == handler.ActionHandler.CommandType.SENSE_BODY:
+                agent.send_commands()
+                timings.add("send", clock() - decide_done)
+    finally:
+        sys.stdout = stdout
+
+    return agent, sock, timings, think_errors
+
+def load_agent_class(name):
+    """
+    Imports an agent class given as 'module' (which must define 'Agent') or
+    'module:ClassName'.
+    """
+
+    module_name, _, class_name = name.partition(":")
+    module = __import__(module_name, fromlist=["Agent"])
+    return getattr(module, class_name or "Agent")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay a captured server "
+            "log through an agent and report time spent per stage.")
+    parser.add_argument("log", nargs="?", default=DEFAULT_LOG,
+            help="captured server messages, one per line")
+    parser.add_argument("--agent", default=None,
+            help="agent to run, as 'module' or 'module:Class' "
+                 "(default: the base soccerpy agent)")
+    parser.add_argument("--team", default=DEFAULT_TEAMNAME,
+            help="our team's name, as it appears in the log")
+    parser.add_argument("--repeat", type=int, default=1,
+            help="number of times to replay the log")
+    parser.add_argument("--see-decoder", action="store_true",
+            help="decode 'see' messages into columns")
+    parser.add_argument("--recv-into", action="store_true",
+            help="parse messages in place from a reusable buffer")
+    parser.add_argument("--localizer", default=None,
+            choices=(WorldModel.LOCALIZER_KMEANS,
+                WorldModel.LOCALIZER_LEAST_SQUARES,
+                WorldModel.LOCALIZER_FILTER),
+            help="how the world model finds the agent's position")
+    parser.add_argument("--strict", action="store_true",
+            help="stop at the first exception raised by the agent's think()")
+    parser.add_argument("--verbose", action="store_true",
+            help="let the agent print, and show the commands it sent")
+    args = parser.parse_args()
+
+    agent_class = Agent
+    if args.agent is not None:
+        agent_class = load_agent_class(args.agent)
+
+    messages = read_log(args.log)
+    timings = StageTimings()
+    for i in xrange(args.repeat):
+        agent, sock, timings, errors = replay(messages, agent_class,
+                args.team, args.see_decoder, timings, quiet=not args.verbose,
+                localizer=args.localizer, use_buffer=args.recv_into,
+                strict=args.strict)
+
+    if args.verbose:
+        for cmd in sock.sent:
+            print "sent:", cmd.rstrip("\0")
+
+    timings.report(len(messages) * args.repeat)
+    print ("%d commands sent in %d datagrams, %d think() errors in the last "
+            "replay" % (agent.wm.ah.commands_sent, len(sock.sent),
+                len(errors)))
+    print ("%d cycles with no primary command, %d with more than one "
+            "requested, %d decided late" % (agent.wm.clock.empty,
+                agent.wm.clock.multiple, agent.wm.clock.decided_late))
+    if len(errors) > 0:
+        print "first error:"
+        print errors[0]
@@ -0,0 +1,226 @@
+import array
+import re
+
+import game_object
+import sp_exceptions
+
+# the kinds of objects a 'see' message can contain.  the 'blank' (upper-case)
+# objects the server reports when something is too close to be identified are
+# stored with the same kind as their visible counterpart, with no id and no
+# values.
+KIND_FLAG = 0
+KIND_GOAL = 1
+KIND_LINE = 2
+KIND_BALL = 3
+KIND_PLAYER = 4
+
+# the kind of object for each leading name character of a seen object
+KIND_BY_NAME = {
+        "f": KIND_FLAG, "F": KIND_FLAG,
+        "g": KIND_GOAL, "G": KIND_GOAL,
+        "l": KIND_LINE,
+        "b": KIND_BALL, "B": KIND_BALL,
+        "p": KIND_PLAYER, "P": KIND_PLAYER
+    }
+
+# the leading name characters of 'blank' objects
+BLANK_NAMES = frozenset("FGBP")
+
+# values for the team column, which only has meaning for players
+TEAM_UNKNOWN = 0
+TEAM_OURS = 1
+TEAM_THEIRS = 2
+
+# goal and line ids are stored as indices into these
+SIDE_IDS = ("l", "r", "t", "b")
+SIDE_INDEX = dict((s, i) for i, s in enumerate(SIDE_IDS))
+
+# used for any id that's unknown
+NO_ID = -1
+
+# flags are stored as their index into Flag.FLAG_IDS
+FLAG_IDS = game_object.Flag.FLAG_IDS
+FLAG_X = game_object.Flag.FLAG_X
+FLAG_Y = game_object.Flag.FLAG_Y
+
+# maps the raw name text following the 'f' directly to a flag's index.  ex:
+# ' t r 10' for 'tr10'.
+FLAG_NAME_INDEX = dict((" " + " ".join(str(n) for n in name), i)
+        for name, i in game_object.Flag.FLAG_NAME_INDEX.iteritems())
+
+# the simulation time at the start of a 'see' message
+pattern_see_time = re.compile(r"^\(see (-?\d+)")
+
+# one seen object: its leading name character, the rest of its name, and its
+# values.  ex: '((f t r 10) 59.7 -8)' gives ('f', ' t r 10', ' 59.7 -8').
+pattern_see_object = re.compile(r"\(\(([a-zA-Z])([^()]*)\)([^()]*)\)")
+
+NAN = float("nan")
+
+class SeeColumns:
+    """
+    Holds the decoded contents of a 'see' message as parallel, preallocated
+    arrays, one entry per seen object.  The arrays are reused for every
+    message, so decoding allocates no per-object containers.  Missing values
+    are NaN, and ids are NO_ID when unknown.
+
+    Flags are identified by their index into FLAG_IDS, goals and lines by their
+    index into SIDE_IDS, and players by their uniform number.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = 0
+        self.count = 0
+        self.sim_time = None
+
+        self.kind = array.array("b")
+        self.obj_id = array.array("i")
+        self.team = array.array("b")
+        self.distance = array.array("d")
+        self.direction = array.array("d")
+        self.dist_change = array.array("d")
+        self.dir_change = array.array("d")
+        self.body_dir = array.array("d")
+        self.neck_dir = array.array("d")
+
+        # the raw team names of seen players, by row.  only players have one.
+        self.team_name = []
+
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        """
+        Extends all columns to hold at least 'capacity' objects.
+        """
+
+        extra = capacity - self.capacity
+        if extra <= 0:
+            return
+
+        self.kind.extend([0] * extra)
+        self.obj_id.extend([NO_ID] * extra)
+        self.team.extend([TEAM_UNKNOWN] * extra)
+        for col in (self.distance, self.direction, self.dist_change,
+                self.dir_change, self.body_dir, self.neck_dir):
+            col.extend([NAN] * extra)
+        self.team_name.extend([None] * extra)
+
+        self.capacity = capacity
+
+    def rows(self, kind):
+        """
+        Returns the row numbers of all objects of the given kind.
+        """
+
+        k = self.kind
+        return [i for i in xrange(self.count) if k[i] == kind]
+
+    def flag_points(self):
+        """
+        Returns an (x, y, distance) tuple for every identified flag seen with a
+        distance, for use in localization.
+        """
+
+        points = []
+        kind = self.kind
+        obj_id = self.obj_id
+        distance = self.distance
+        for i in xrange(self.count):
+            d = distance[i]
+
+            # NaN distances are the only values not equal to themselves
+            if kind[i] == KIND_FLAG and obj_id[i] != NO_ID and d == d:
+                points.append((FLAG_X[obj_id[i]], FLAG_Y[obj_id[i]], d))
+
+        return points
+
+def decode_see(text, cols, our_teamname):
+    """
+    Decodes a raw 'see' message directly into the given SeeColumns object,
+    without building any intermediate nested lists.  'our_teamname' decides
+    which seen players are on our team.  Returns the columns.
+    """
+
+    m = pattern_see_time.match(text)
+    if m is None:
+        raise ValueError("Not a see message: '%s'" % text)
+    cols.sim_time = int(m.group(1))
+
+    objects = pattern_see_object.findall(text, m.end())
+    if len(objects) > cols.capacity:
+        cols.grow(len(objects) * 2)
+
+    # bind the columns locally, since they're written once per object
+    kind_col = cols.kind
+    id_col = cols.obj_id
+    team_col = cols.team
+    team_name_col = cols.team_name
+    dist_col = cols.distance
+    dir_col = cols.direction
+    dist_chg_col = cols.dist_change
+    dir_chg_col = cols.dir_change
+    body_col = cols.body_dir
+    neck_col = cols.neck_dir
+
+    row = 0
+    for first, name, values in objects:
+        kind = KIND_BY_NAME.get(first)
+        if kind is None:
+            raise sp_exceptions.ObjectTypeError("Unknown object: '%s%s'" %
+                    (first, name))
+
+        kind_col[row] = kind
+        team_col[row] = TEAM_UNKNOWN
+        team_name_col[row] = None
+
+        # identify the object from the rest of its name
+        obj_id = NO_ID
+        if kind == KIND_FLAG:
+            obj_id = FLAG_NAME_INDEX.get(name, NO_ID)
+        elif kind == KIND_PLAYER:
+            # player names are: team name, uniform number, 'goalie'
+            parts = name.split()
+            if len(parts) >= 1:
+                teamname = parts[0].replace('"', "")
+                team_name_col[row] = teamname
+                if teamname == our_teamname:
+                    team_col[row] = TEAM_OURS
+                else:
+                    team_col[row] = TEAM_THEIRS
+            if len(parts) >= 2 and parts[1].isdigit():
+                obj_id = int(parts[1])
+        elif kind == KIND_GOAL or kind == KIND_LINE:
+            obj_id = SIDE_INDEX.get(name.strip(), NO_ID)
+        id_col[row] = obj_id
+
+        # different numbers of values specify different fields, exactly as in
+        # MessageHandler._handle_see.  blank objects never get any.
+        if first in BLANK_NAMES:
+            n = 0
+        else:
+            vals = values.split()
+            n = len(vals)
+
+        dist_col[row] = NAN
+        dir_col[row] = NAN
+        dist_chg_col[row] = NAN
+        dir_chg_col[row] = NAN
+        body_col[row] = NAN
+        neck_col[row] = NAN
+
+        if n == 1:
+            dir_col[row] = float(vals[0])
+        elif n >= 2:
+            dist_col[row] = float(vals[0])
+            dir_col[row] = float(vals[1])
+            if n >= 4:
+                dist_chg_col[row] = float(vals[2])
+                dir_chg_col[row] = float(vals[3])
+            if n >= 6:
+                body_col[row] = float(vals[4])
+                neck_col[row] = float(vals[5])
+
+        row += 1
+
+    cols.count = row
+    return cols
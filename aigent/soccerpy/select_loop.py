@@ -0,0 +1,214 @@
+import select
+import sys
+import time
+import traceback
+
+class CycleStats:
+    """
+    Counts how well an agent in a SelectLoop keeps up with the server's cycles.
+    A cycle is missed if the agent finished handling its 'sense_body' more than
+    the loop's deadline after the loop noticed it, and skipped if the agent
+    only got to it after the next one had already arrived.
+    """
+
+    def __init__(self):
+        self.cycles = 0
+        self.missed = 0
+        self.skipped = 0
+
+        # the longest time taken to respond to a new cycle, in seconds
+        self.worst = 0.0
+
+    def add(self, cycles, elapsed, deadline):
+        """
+        Records a batch of messages that contained 'cycles' 'sense_body'
+        messages and took 'elapsed' seconds to respond to.
+        """
+
+        if cycles == 0:
+            return
+
+        self.cycles += cycles
+        self.skipped += cycles - 1
+        if elapsed > deadline:
+            self.missed += 1
+        if elapsed > self.worst:
+            self.worst = elapsed
+
+class SelectLoop:
+    """
+    Runs any number of agents that use the select runtime from a single thread.
+    The loop waits on all of their sockets at once, and whenever one becomes
+    readable it has that agent handle every waiting message and think once.
+    Each agent's commands are sent at the point in the cycle its CycleClock
+    picks, so the loop never waits on its sockets past then.  Since parsing,
+    thinking and sending all happen in this one thread, there are no flags
+    shared between threads and no GIL contention.
+
+    Anything else with a file descriptor, like a local stand-in server, can
+    share the loop by registering a callback with add_reader.
+    """
+
+    def __init__(self, poll_interval=1.0, deadline=0.1):
+        """
+        'poll_interval' is the longest the loop waits on its sockets before
+        checking whether it's been told to stop.  'deadline' is how many
+        seconds an agent has to respond to a new cycle before it counts as a
+        missed cycle in its CycleStats.
+        """
+
+        self.poll_interval = poll_interval
+        self.deadline = deadline
+
+        # maps socket file descriptors to the agents that own them
+        self.agents = {}
+
+        # maps other file descriptors to the callbacks that read from them
+        self.readers = {}
+
+        # the CycleStats of every agent ever added, in the order they were
+        self.stats = []
+
+        self.running = False
+
+    def add(self, agent):
+        """
+        Starts driving the given connected agent.  Adding an agent that's
+        already in the loop does nothing.
+        """
+
+        if self.agents.get(agent.fileno()) is agent:
+            return
+
+        self.agents[agent.fileno()] = agent
+        self.stats.append((agent, CycleStats()))
+
+    def remove(self, agent):
+        """
+        Stops driving the given agent.  It isn't disconnected.
+        """
+
+        for fd, a in self.agents.items():
+            if a is agent:
+                del self.agents[fd]
+
+    def add_reader(self, fileobj, callback):
+        """
+        Calls 'callback' with no arguments whenever 'fileobj', a file
+        descriptor or an object with a fileno method, has data to read.
+        """
+
+        if not isinstance(fileobj, int):
+            fileobj = fileobj.fileno()
+
+        self.readers[fileobj] = callback
+
+    def remove_reader(self, fileobj):
+        """
+        Stops watching the given file descriptor or object.
+        """
+
+        if not isinstance(fileobj, int):
+            fileobj = fileobj.fileno()
+
+        self.readers.pop(fileobj, None)
+
+    def stop(self):
+        """
+        Tells the loop to return from run at its next opportunity.
+        """
+
+        self.running = False
+
+    def run_once(self, timeout):
+        """
+        Waits up to 'timeout' seconds for messages, then has every agent and
+        reader with messages waiting deal with them.  Returns the number that
+        did.
+        """
+
+        if len(self.agents) == 0 and len(self.readers) == 0:
+            return 0
+
+        # wake up in time to send any commands that will be due
+        for agent in self.agents.itervalues():
+            delay = agent.time_until_send()
+            if delay is not None:
+                timeout = max(0.0, min(timeout, delay))
+
+        fds = self.agents.keys() + self.readers.keys()
+        readable, _, _ = select.select(fds, [], [], timeout)
+        woke = time.time()
+
+        for fd in readable:
+            agent = self.agents.get(fd)
+            if agent is None:
+                callback = self.readers.get(fd)
+                if callback is not None:
+                    callback()
+                continue
+
+            # like a thread dying, an agent that raises an exception only
+            # takes itself out of the game, not every agent in this loop.
+            try:
+                count, cycles = agent.process_pending()
+                self.get_stats(agent).add(cycles, time.time() - woke,
+                        self.deadline)
+            except Exception:
+                sys.stderr.write("Agent raised an exception, removing it:\n")
+                traceback.print_exc()
+                self.remove(agent)
+                continue
+
+            # drop agents that disconnected while handling their messages
+            if not agent.is_connected():
+                self.remove(agent)
+
+        for agent in self.agents.values():
+            try:
+                agent.send_commands_if_due()
+            except Exception:
+                sys.stderr.write("Agent raised an exception, removing it:\n")
+                traceback.print_exc()
+                self.remove(agent)
+
+        return len(readable)
+
+    def get_stats(self, agent):
+        """
+        Returns the CycleStats of the given agent.
+        """
+
+        for a, stats in self.stats:
+            if a is agent:
+                return stats
+
+        return None
+
+    def report(self, out=sys.stdout):
+        """
+        Prints how well each agent has kept up with the server's cycles.
+        """
+
+        out.write("%-8s %8s %8s %8s %10s\n" % ("agent", "cycles", "missed",
+            "skipped", "worst ms"))
+        for agent, stats in self.stats:
+            # agents are named by uniform number once the server assigns one
+            name = "?"
+            if agent.wm is not None and agent.wm.uniform_number is not None:
+                name = str(agent.wm.uniform_number)
+
+            out.write("%-8s %8d %8d %8d %10.2f\n" % (name, stats.cycles,
+                stats.missed, stats.skipped, stats.worst * 1e3))
+
+    def run(self):
+        """
+        Drives all our agents and readers until stop is called or no agents
+        are left.
+        """
+
+        self.running = True
+        while self.running and len(self.agents) > 0:
+            self.run_once(self.poll_interval)
+
+        self.running = False
@@ -0,0 +1,377 @@
+import math
+
+import spatial_index
+import velocity
+
+# an enemy within this many meters of the straight path of a pass or shot is
+# taken to be able to intercept it
+LANE_WIDTH = 2.0
+
+# how many points across the goal mouth are tried as shot targets
+SHOT_TARGETS = 5
+
+def absolute_coords(origin, abs_neck_dir, distance, direction):
+    """
+    Returns the absolute coordinates of something seen 'distance' meters away
+    at 'direction' degrees relative to our neck, from 'origin' with our neck
+    at 'abs_neck_dir' degrees.  Directions on the field are our neck's
+    direction less relative ones.  Returns None if any of these are unknown.
+    """
+
+    if (distance is None or direction is None or abs_neck_dir is None or
+            origin is None or origin[0] is None):
+        return None
+
+    angle = math.radians(abs_neck_dir - direction)
+
+    return (origin[0] + distance * math.cos(angle),
+            origin[1] + distance * math.sin(angle))
+
+class WorldSnapshot:
+    """
+    The state of the world as of one 'see' message.  The absolute coordinates
+    of the ball and every seen player are worked out once, when the snapshot
+    is built, and the queries decisions are made from are answered from those
+    the first time they're asked and remembered after that.  A snapshot is
+    never changed once built; the world model builds a new one for every
+    'see' instead.
+    """
+
+    def __init__(self, wm):
+        """
+        Takes everything it needs from the given world model, as it is right
+        after processing a 'see'.
+        """
+
+        self.side = wm.side
+        self.abs_coords = wm.abs_coords
+        self.abs_neck_dir = wm.abs_neck_dir
+        self.kickable_margin = wm.server_parameters.kickable_margin
+        self.goal_width = wm.server_parameters.goal_width
+        self.ball_decay = wm.server_parameters.ball_decay
+        self.player_speed_max = wm.server_parameters.player_speed_max
+
+        self.ball = wm.ball
+        self.players = tuple(wm.players)
+
+        # the absolute coordinates of the ball and each player, in order
+        self.ball_coords = None
+        if self.ball is not None:
+            self.ball_coords = self._absolute_coords(self.ball)
+        self.player_coords = tuple(self._absolute_coords(p)
+                for p in self.players)
+
+        # maps the ids of all our objects to their coordinates
+        self.coords_by_id = dict((id(p), c) for p, c in
+                zip(self.players, self.player_coords))
+        if self.ball is not None:
+            self.coords_by_id[id(self.ball)] = self.ball_coords
+
+        # answers to queries already asked, by query and arguments
+        self.cache = {}
+
+    def _absolute_coords(self, obj):
+        """
+        Exactly as WorldModel.get_object_absolute_coords, but for our position
+        and neck direction at the time of the snapshot.
+        """
+
+        return absolute_coords(self.abs_coords, self.abs_neck_dir,
+                obj.distance, obj.direction)
+
+    def _distance(self, point1, point2):
+        """
+        Returns the distance between two points, or 200 (further than anything
+        on the field) if either is unknown, like WorldModel.euclidean_distance.
+        """
+
+        if point1 is None or point2 is None or point1[0] is None:
+            return 200
+
+        return math.sqrt((point1[0] - point2[0]) ** 2 +
+                (point1[1] - point2[1]) ** 2)
+
+    def _angle(self, point):
+        """
+        Returns the absolute angle from us to the given point in degrees, from
+        0 to 360, or 0 if either is unknown, like
+        WorldModel.angle_between_points.
+        """
+
+        if point is None or self.abs_coords[0] is None:
+            return 0
+
+        a = math.degrees(math.atan2(point[1] - self.abs_coords[1],
+            point[0] - self.abs_coords[0]))
+        if a < 0:
+            a = 360 + a
+
+        return a
+
+    def get_coords(self, obj):
+        """
+        Returns the absolute coordinates of the ball or a player from this
+        snapshot, or None if it wasn't seen in it or has no distance.
+        """
+
+        return self.coords_by_id.get(id(obj))
+
+    def has_object(self, obj):
+        """
+        Returns whether the given object was seen in this snapshot.
+        """
+
+        return id(obj) in self.coords_by_id
+
+    def _nearest(self, point, teammates):
+        """
+        Returns the teammate or enemy nearest the given point, or None if we
+        don't see any.  Players of unknown side count as enemies, as they
+        always have in the world model.
+        """
+
+        nearest = None
+        nearest_dist = None
+        for p, coords in zip(self.players, self.player_coords):
+            if (p.side == self.side) != teammates:
+                continue
+
+            d = self._distance(point, coords)
+            if nearest is None or d < nearest_dist:
+                nearest = p
+                nearest_dist = d
+
+        return nearest
+
+    def nearest_teammate_to_point(self, point):
+        """
+        Returns the teammate nearest the given point.
+        """
+
+        key = ("nearest_teammate_to_point", point)
+        if key not in self.cache:
+            self.cache[key] = self._nearest(point, True)
+
+        return self.cache[key]
+
+    def nearest_teammate(self):
+        """
+        Returns the teammate nearest us.
+        """
+
+        if "nearest_teammate" not in self.cache:
+            self.cache["nearest_teammate"] = self._nearest(self.abs_coords,
+                    True)
+
+        return self.cache["nearest_teammate"]
+
+    def nearest_enemy(self):
+        """
+        Returns the enemy nearest us.
+        """
+
+        if "nearest_enemy" not in self.cache:
+            self.cache["nearest_enemy"] = self._nearest(self.abs_coords, False)
+
+        return self.cache["nearest_enemy"]
+
+    def _ball_owned(self, by_us):
+        """
+        Returns whether a player of our team, or of any other, is within the
+        kickable margin of the ball.
+        """
+
+        if self.ball_coords is None:
+            return False
+
+        for p, coords in zip(self.players, self.player_coords):
+            if ((p.side == self.side) == by_us and
+                    self._distance(self.ball_coords, coords) <
+                    self.kickable_margin):
+                return True
+
+        return False
+
+    def is_ball_owned_by_us(self):
+        """
+        Returns whether one of our teammates has the ball.
+        """
+
+        if "owned_by_us" not in self.cache:
+            self.cache["owned_by_us"] = self._ball_owned(True)
+
+        return self.cache["owned_by_us"]
+
+    def is_ball_owned_by_enemy(self):
+        """
+        Returns whether an enemy has the ball.
+        """
+
+        if "owned_by_enemy" not in self.cache:
+            self.cache["owned_by_enemy"] = self._ball_owned(False)
+
+        return self.cache["owned_by_enemy"]
+
+    def is_clear(self, point, min_angle=20):
+        """
+        Returns whether the path from us to the given point is clear of the
+        nearest enemy: either the point is closer than that enemy, or the
+        enemy is more than 'min_angle' degrees off the path.  A path is never
+        clear if we can't see any enemy to judge it by.
+        """
+
+        key = ("is_clear", point, min_angle)
+        if key in self.cache:
+            return self.cache[key]
+
+        clear = False
+        enemy = self.nearest_enemy()
+        if enemy is not None:
+            enemy_coords = self.get_coords(enemy)
+            enemy_dist = self._distance(self.abs_coords, enemy_coords)
+            point_dist = self._distance(self.abs_coords, point)
+
+            # our body direction cancels out of the difference between the
+            # two relative angles, so we compare absolute ones.
+            clear = (point_dist < enemy_dist or
+                    abs(self._angle(enemy_coords) - self._angle(point)) >
+                    min_angle)
+
+        self.cache[key] = clear
+        return clear
+
+    def ball_intercept(self):
+        """
+        Returns the (cycles, distance, direction) of the soonest point where we
+        could reach the ball, relative to us, or None if we can't see it.
+        """
+
+        if "ball_intercept" in self.cache:
+            return self.cache["ball_intercept"]
+
+        ball = self.ball
+        intercept = None
+        if ball is not None and ball.direction is not None:
+            if ball.distance is None or ball.velocity is None:
+                intercept = (0, ball.distance, ball.direction)
+            else:
+                intercept = velocity.solve_intercept(ball.distance,
+                        ball.direction, ball.velocity, self.ball_decay,
+                        self.player_speed_max, self.kickable_margin)
+
+        self.cache["ball_intercept"] = intercept
+        return intercept
+
+    def _grid(self, teammates):
+        """
+        Returns a spatial_index.PointGrid of the teammates or enemies with
+        known coordinates, built the first time it's needed.
+        """
+
+        key = ("grid", teammates)
+        if key not in self.cache:
+            self.cache[key] = spatial_index.PointGrid(
+                    (c[0], c[1], p) for p, c in
+                    zip(self.players, self.player_coords)
+                    if c is not None and (p.side == self.side) == teammates)
+
+        return self.cache[key]
+
+    def teammate_grid(self):
+        """
+        Returns a spatial index of the teammates we know the position of.
+        """
+
+        return self._grid(True)
+
+    def enemy_grid(self):
+        """
+        Returns a spatial index of the enemies we know the position of.
+        """
+
+        return self._grid(False)
+
+    def lane_clearance(self, point):
+        """
+        Returns how far the nearest enemy within LANE_WIDTH of the straight
+        path from us to the given point is from that path, or LANE_WIDTH if
+        there's none.
+        """
+
+        if self.abs_coords[0] is None:
+            return 0.0
+
+        blockers = self.enemy_grid().in_corridor(self.abs_coords, point,
+                LANE_WIDTH)
+        if len(blockers) == 0:
+            return LANE_WIDTH
+
+        return min(b[0] for b in blockers)
+
+    def pass_candidates(self, goal):
+        """
+        Scores a pass to every teammate we know the position of, by how much
+        closer than us they are to the given goal.  Returns (score, player,
+        coords) tuples for those with a clear lane that are closer, best
+        first.
+        """
+
+        key = ("pass_candidates", goal)
+        if key in self.cache:
+            return self.cache[key]
+
+        candidates = []
+        if self.abs_coords[0] is not None:
+            our_dist = self._distance(self.abs_coords, goal)
+            for p, coords in zip(self.players, self.player_coords):
+                if p.side != self.side or coords is None:
+                    continue
+
+                gain = our_dist - self._distance(coords, goal)
+                if gain > 0 and self.lane_clearance(coords) >= LANE_WIDTH:
+                    candidates.append((gain, p, coords))
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+
+        self.cache[key] = candidates
+        return candidates
+
+    def best_pass(self, goal):
+        """
+        Returns the (score, player, coords) of the best pass towards the given
+        goal, or None if there's no teammate worth passing to.
+        """
+
+        candidates = self.pass_candidates(goal)
+        if len(candidates) == 0:
+            return None
+
+        return candidates[0]
+
+    def best_shot(self, goal):
+        """
+        Returns the point across the mouth of the goal centered on the given
+        point whose path from us passes furthest from any enemy.
+        """
+
+        key = ("best_shot", goal)
+        if key in self.cache:
+            return self.cache[key]
+
+        # aim inside the posts, not at them
+        half_width = self.goal_width * 0.4
+        best = goal
+        best_clearance = -1.0
+        for i in xrange(SHOT_TARGETS):
+            offset = half_width * (2.0 * i / (SHOT_TARGETS - 1) - 1.0)
+            target = (goal[0], goal[1] + offset)
+            clearance = self.lane_clearance(target)
+
+            # prefer the center when targets are equally clear
+            if (clearance > best_clearance or (clearance == best_clearance and
+                    abs(offset) < abs(best[1] - goal[1]))):
+                best = target
+                best_clearance = clearance
+
+        self.cache[key] = best
+        return best
@@ -1,3 +1,4 @@
+import errno
 import socket
 
 class Socket:
@@ -17,6 +18,10 @@ class Socket:
         
         # the socket communication with the server takes place on (ipv4, udp)
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        # the buffer recv_into and recv_into_nowait receive into, allocated
+        # once and reused for every message.
+        self.buffer = bytearray(bufsize)
     
     def send(self, msg, append_null_terminator=True):
         """
@@ -42,3 +47,63 @@ class Socket:
             self.address = address
         
         return data
+
+    def recv_nowait(self, conform_address=True):
+        """
+        Like recv, but returns None immediately instead of blocking if no
+        message is waiting.
+        """
+
+        try:
+            data, address = self.sock.recvfrom(self.bufsize,
+                    socket.MSG_DONTWAIT)
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return None
+            raise
+
+        if conform_address:
+            self.address = address
+
+        return data
+
+    def recv_into(self, conform_address=True):
+        """
+        Like recv, but receives into our reusable 'buffer' instead of a new
+        string, and returns the number of bytes received.  The message is only
+        valid until the next call.
+        """
+
+        length, address = self.sock.recvfrom_into(self.buffer)
+
+        if conform_address:
+            self.address = address
+
+        return length
+
+    def recv_into_nowait(self, conform_address=True):
+        """
+        Like recv_into, but returns None immediately instead of blocking if no
+        message is waiting.
+        """
+
+        try:
+            length, address = self.sock.recvfrom_into(self.buffer, 0,
+                    socket.MSG_DONTWAIT)
+        except socket.error as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return None
+            raise
+
+        if conform_address:
+            self.address = address
+
+        return length
+
+    def fileno(self):
+        """
+        Returns the file descriptor of the underlying socket, so this object
+        can be waited on with select.
+        """
+
+        return self.sock.fileno()
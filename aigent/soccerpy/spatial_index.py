@@ -0,0 +1,162 @@
+import math
+
+# the area the grid covers.  anything outside it is kept in the nearest cell
+# along the border, so badly localized players are still found.
+FIELD_MIN_X = -60.0
+FIELD_MAX_X = 60.0
+FIELD_MIN_Y = -40.0
+FIELD_MAX_Y = 40.0
+
+# the width and height of a grid cell, in meters
+CELL_SIZE = 10.0
+
+def segment_distance(point, start, end):
+    """
+    Returns the distance from a point to the closest point on the line segment
+    between 'start' and 'end'.
+    """
+
+    sx = end[0] - start[0]
+    sy = end[1] - start[1]
+    px = point[0] - start[0]
+    py = point[1] - start[1]
+
+    length_sq = sx * sx + sy * sy
+    t = 0.0
+    if length_sq > 0:
+        t = max(0.0, min(1.0, (px * sx + py * sy) / float(length_sq)))
+
+    dx = px - t * sx
+    dy = py - t * sy
+    return math.sqrt(dx * dx + dy * dy)
+
+class PointGrid:
+    """
+    A uniform grid over the field, holding items at (x, y) positions.  It's
+    meant to be built once per cycle from the positions of the players we see,
+    and answers nearest, radius and corridor queries by looking only at the
+    cells that could hold an answer.
+    """
+
+    def __init__(self, entries, cell_size=CELL_SIZE):
+        """
+        'entries' is a sequence of (x, y, item) tuples.
+        """
+
+        self.cell_size = float(cell_size)
+        self.columns = int(math.ceil((FIELD_MAX_X - FIELD_MIN_X) /
+            self.cell_size))
+        self.rows = int(math.ceil((FIELD_MAX_Y - FIELD_MIN_Y) / self.cell_size))
+
+        # cells in row-major order, each a list of (x, y, item) tuples
+        self.cells = [[] for i in xrange(self.columns * self.rows)]
+
+        self.count = 0
+        for entry in entries:
+            cx, cy = self._cell_of(entry[0], entry[1])
+            self.cells[cy * self.columns + cx].append(entry)
+            self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def _cell_of(self, x, y):
+        """
+        Returns the (column, row) of the cell holding the given position,
+        clamped to the grid.
+        """
+
+        cx = int((x - FIELD_MIN_X) // self.cell_size)
+        cy = int((y - FIELD_MIN_Y) // self.cell_size)
+
+        return (max(0, min(self.columns - 1, cx)),
+                max(0, min(self.rows - 1, cy)))
+
+    def _cells_in_box(self, min_x, min_y, max_x, max_y):
+        """
+        Yields the contents of every cell overlapping the given box.
+        """
+
+        cx0, cy0 = self._cell_of(min_x, min_y)
+        cx1, cy1 = self._cell_of(max_x, max_y)
+        for cy in xrange(cy0, cy1 + 1):
+            row = cy * self.columns
+            for cx in xrange(cx0, cx1 + 1):
+                yield self.cells[row + cx]
+
+    def nearest(self, point, k=1):
+        """
+        Returns up to 'k' (distance, x, y, item) tuples for the items nearest
+        the given point, nearest first.
+        """
+
+        if self.count == 0 or k <= 0:
+            return []
+
+        px, py = point
+        ccx, ccy = self._cell_of(px, py)
+
+        found = []
+        max_ring = max(self.columns, self.rows)
+        for ring in xrange(max_ring + 1):
+            # visit only the cells on the border of this ring
+            for cy in xrange(ccy - ring, ccy + ring + 1):
+                if cy < 0 or cy >= self.rows:
+                    continue
+
+                step = 1
+                if cy != ccy - ring and cy != ccy + ring:
+                    step = max(1, 2 * ring)
+
+                for cx in xrange(ccx - ring, ccx + ring + 1, step):
+                    if cx < 0 or cx >= self.columns:
+                        continue
+
+                    for x, y, item in self.cells[cy * self.columns + cx]:
+                        d = math.sqrt((x - px) ** 2 + (y - py) ** 2)
+                        found.append((d, x, y, item))
+
+            # everything in later rings is at least this far from the point
+            if len(found) >= k:
+                found.sort(key=lambda f: f[0])
+                if found[k - 1][0] <= ring * self.cell_size:
+                    break
+
+        found.sort(key=lambda f: f[0])
+        return found[:k]
+
+    def within(self, point, radius):
+        """
+        Returns a (distance, x, y, item) tuple for every item within 'radius'
+        of the given point, in no particular order.
+        """
+
+        px, py = point
+        result = []
+        for cell in self._cells_in_box(px - radius, py - radius, px + radius,
+                py + radius):
+            for x, y, item in cell:
+                d = math.sqrt((x - px) ** 2 + (y - py) ** 2)
+                if d <= radius:
+                    result.append((d, x, y, item))
+
+        return result
+
+    def in_corridor(self, start, end, width):
+        """
+        Returns a (distance, x, y, item) tuple for every item within 'width'
+        of the line segment from 'start' to 'end', where the distance is to
+        the segment, in no particular order.
+        """
+
+        result = []
+        for cell in self._cells_in_box(min(start[0], end[0]) - width,
+                min(start[1], end[1]) - width,
+                max(start[0], end[0]) + width,
+                max(start[1], end[1]) + width):
+            for x, y, item in cell:
+                d = segment_distance((x, y), start, end)
+                if d <= width:
+                    result.append((d, x, y, item))
+
+        return result
@@ -0,0 +1,290 @@
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import local_server
+import select_loop
+from agent import Agent
+
+# the cycle lengths tried, in seconds, from rcssserver's default down
+STRESS_STEPS = (0.1, 0.08, 0.06, 0.05, 0.04, 0.03, 0.02, 0.015, 0.01)
+
+# how many cycles each cycle length is run for
+STRESS_CYCLES = 100
+
+# the team name stressed agents play under
+STRESS_TEAMNAME = "stress"
+
+# how long, in seconds, every agent is given to connect before the cycles
+# start, and to send back its results once they're over
+CONNECT_TIMEOUT = 10.0
+RESULT_TIMEOUT = 5.0
+
+class AgentResult:
+    """
+    How well one agent kept up with the cycles of a stress run.  A cycle is
+    missed if the agent finished deciding on it more than a cycle after the
+    server sent its 'sense_body', and skipped if it never thought about it at
+    all.  'worst' is the longest such delay in seconds, 'idle' the cycles the
+    server got no primary command for, and 'think' the agent's sorted think
+    times in seconds.
+    """
+
+    def __init__(self, name, cycles, missed, skipped, worst, idle, think):
+        self.name = name
+        self.cycles = cycles
+        self.missed = missed
+        self.skipped = skipped
+        self.worst = worst
+        self.idle = idle
+        self.think = think
+
+    def percentile(self, p):
+        """
+        Returns the 'p'th percentile of our think times.
+        """
+
+        if len(self.think) == 0:
+            return 0.0
+
+        return self.think[min(len(self.think) - 1,
+            int(p / 100.0 * len(self.think)))]
+
+    def kept_up(self):
+        """
+        Returns whether we responded to every cycle within the deadline.
+        """
+
+        return self.cycles > 0 and self.missed == 0 and self.skipped == 0
+
+class StepResult:
+    """
+    The AgentResult of every agent run at one cycle length.
+    """
+
+    def __init__(self, step, agents):
+        self.step = step
+        self.agents = agents
+
+    def kept_up(self):
+        """
+        Returns whether every agent responded to every cycle in time.
+        """
+
+        return all(a.kept_up() for a in self.agents)
+
+    def report(self, out=sys.stdout):
+        """
+        Prints each agent's results, with think times in milliseconds.
+        """
+
+        out.write("%.0f ms cycles (%.0f Hz): %s\n" % (self.step * 1e3,
+            1.0 / self.step, "kept up" if self.kept_up() else "fell behind"))
+        out.write("%-8s %7s %7s %8s %6s %9s %8s %8s %8s\n" % ("agent",
+            "cycles", "missed", "skipped", "idle", "worst ms", "p50 ms",
+            "p90 ms", "p99 ms"))
+        for a in self.agents:
+            out.write("%-8s %7d %7d %8d %6d %9.2f %8.2f %8.2f %8.2f\n" % (
+                a.name, a.cycles, a.missed, a.skipped, a.idle, a.worst * 1e3,
+                a.percentile(50) * 1e3, a.percentile(90) * 1e3,
+                a.percentile(99) * 1e3))
+
+def _timed(cls):
+    """
+    Returns a subclass of the given agent class that records when it first
+    finished thinking during each cycle, in its 'decided' dict by the number
+    of cycles its clock had counted when it started.
+    """
+
+    class TimedAgent(cls):
+        def think(self):
+            cycle = self.wm.clock.cycles
+            cls.think(self)
+            self.decided.setdefault(cycle, time.time())
+
+    return TimedAgent
+
+def _run_agents(agent_classes, positions, port, workers, quiet, conn):
+    """
+    Runs the agents of the given positions, numbered from 1 into
+    'agent_classes', against the server at 'port' until anything arrives on
+    'conn', then sends back (position, uniform number, decision times, think
+    times) for each.  Like main.py, a worker drives all its agents from one
+    SelectLoop, while an agent run alone uses the threaded runtime.
+    """
+
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+
+    loop = None
+    runtime = Agent.RUNTIME_THREADED
+    if workers is not None:
+        loop = select_loop.SelectLoop()
+        runtime = Agent.RUNTIME_SELECT
+
+    agents = []
+    for position in positions:
+        agent = _timed(agent_classes[position - 1])()
+        agent.decided = {}
+        agent.connect("localhost", port, STRESS_TEAMNAME, runtime=runtime,
+                loop=loop)
+
+        # we only want the think times, never a dump
+        agent.enable_instruments(interval=float("inf"),
+                name="agent %d" % position)
+        agent.play(loop)
+        agents.append((position, agent))
+
+    def stop():
+        conn.recv()
+        loop.stop()
+
+    if loop is None:
+        conn.recv()
+    else:
+        loop.add_reader(conn, stop)
+        loop.run()
+
+    conn.send([(position, agent.wm.uniform_number, agent.decided,
+        sorted(agent.wm.instruments.think.recent()))
+        for position, agent in agents])
+    conn.close()
+
+    for position, agent in agents:
+        agent.disconnect()
+
+def run_step(agent_classes, step, cycles=STRESS_CYCLES, workers=None,
+        quiet=True):
+    """
+    Runs one agent of each of the given classes, in order, against a
+    local_server.LocalServer with cycles of 'step' seconds, for 'cycles'
+    cycles.  The agents run as main.py deploys them: each in a process of its
+    own, or if 'workers' is given, dealt out to that many worker processes
+    round-robin.  The server runs in the calling process, and starts its
+    cycles once every agent has connected.  Returns a StepResult.
+
+    If 'quiet' is True, anything the agents print is discarded.
+    """
+
+    server = local_server.LocalServer(port=0, step=step)
+    loop = select_loop.SelectLoop(poll_interval=step, deadline=step)
+    server.attach(loop)
+
+    groups = [[position] for position in xrange(1, len(agent_classes) + 1)]
+    if workers is not None:
+        groups = [range(worker + 1, len(agent_classes) + 1, workers)
+                for worker in xrange(workers)]
+        groups = [g for g in groups if len(g) > 0]
+
+    processes = []
+    reports = []
+    try:
+        for positions in groups:
+            conn, child_conn = mp.Pipe()
+            p = mp.Process(target=_run_agents, args=(agent_classes,
+                positions, server.address[1], workers, quiet, child_conn))
+            p.daemon = True
+            p.start()
+            child_conn.close()
+            processes.append((p, conn))
+
+        deadline = time.time() + CONNECT_TIMEOUT
+        while (len(server.players) < len(agent_classes) and
+                time.time() < deadline):
+            loop.run_once(0.05)
+
+        # when each cycle was sent, so every agent's k'th 'sense_body' was
+        # sent at starts[k - 1].
+        starts = []
+        while server.cycle < cycles and len(server.players) > 0:
+            now = time.time()
+            if server.start_cycle_if_due(now):
+                starts.append(now)
+            loop.run_once(max(0.0, server.time_until_cycle()))
+
+        # collect the commands answering the last cycle
+        end = time.time() + step
+        while time.time() < end:
+            loop.run_once(max(0.0, end - time.time()))
+
+        for p, conn in processes:
+            conn.send(None)
+        for p, conn in processes:
+            if conn.poll(RESULT_TIMEOUT):
+                reports.extend(conn.recv())
+    finally:
+        for p, conn in processes:
+            p.join(RESULT_TIMEOUT)
+            if p.is_alive():
+                p.terminate()
+        server.close()
+
+    # the server's players by the uniform numbers it gave them
+    players = dict((p.uniform_number, p) for p in server.players.itervalues())
+
+    results = []
+    for position, uniform_number, decided, think in sorted(reports):
+        player = players.get(uniform_number)
+
+        missed = skipped = 0
+        worst = 0.0
+        sent = 0
+        if player is not None:
+            sent = min(player.cycles, len(starts))
+            for k in xrange(1, sent + 1):
+                if k not in decided:
+                    skipped += 1
+                    continue
+
+                delay = decided[k] - starts[k - 1]
+                worst = max(worst, delay)
+                if delay > step:
+                    missed += 1
+
+        idle = 0
+        if player is not None:
+            idle = player.missed
+
+        results.append(AgentResult(str(position), sent, missed, skipped,
+            worst, idle, think))
+
+    return StepResult(step, results)
+
+def find_saturation(agent_classes, steps=STRESS_STEPS, cycles=STRESS_CYCLES,
+        workers=None, out=sys.stdout):
+    """
+    Runs the given agents at each of the cycle lengths in 'steps', longest
+    first, reporting on each to 'out', until they fall behind at one.
+    'workers' is as for run_step.  Returns the list of StepResults, and the
+    shortest cycle length at which all the agents kept up, or None if they
+    didn't even at the longest.
+    """
+
+    out.write("Running %d agents %s, localizing with %s, %s the see "
+            "decoder.\n\n" % (len(agent_classes), "in one process each" if
+                workers is None else "in %d workers" % workers,
+                Agent.LOCALIZER, "with" if Agent.USE_SEE_DECODER else
+                "without"))
+
+    results = []
+    saturation = None
+    for step in steps:
+        result = run_step(agent_classes, step, cycles, workers)
+        result.report(out)
+        out.write("\n")
+
+        results.append(result)
+        if not result.kept_up():
+            break
+        saturation = step
+
+    if saturation is None:
+        out.write("The agents fell behind even at %.0f ms cycles.\n" % (
+            steps[0] * 1e3))
+    else:
+        out.write("The agents keep up with cycles of %.0f ms, %.0f Hz, or "
+                "%.1f times the default rate.\n" % (saturation * 1e3,
+                    1.0 / saturation, local_server.DEFAULT_STEP / saturation))
+
+    return results, saturation
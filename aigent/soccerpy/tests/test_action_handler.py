@@ -0,0 +1,100 @@
+import unittest
+
+from soccerpy import handler
+
+class FakeSocket:
+    """
+    Keeps every datagram sent instead of sending it.
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+class ActionHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sock = FakeSocket()
+        self.ah = handler.ActionHandler(self.sock)
+
+    def test_one_datagram(self):
+        # secondary commands go first, in slot order, and the primary last
+        self.ah.dash(50)
+        self.ah.change_view("wide", "high")
+        self.ah.say("hello")
+        self.ah.turn_neck(-30)
+        self.ah.send_commands()
+
+        self.assertEqual(self.sock.sent, ["(turn_neck -30)(say hello)"
+            "(change_view wide high)(dash 50)"])
+        self.assertEqual(self.ah.commands_sent, 4)
+        self.assertEqual(self.ah.datagrams_sent, 1)
+        self.assertEqual(self.ah.sent_primary.name, "dash")
+
+        # the slots are emptied, so nothing more goes out
+        self.ah.send_commands()
+        self.assertEqual(len(self.sock.sent), 1)
+
+    def test_datagram_split(self):
+        # room is left for the terminator, so 8191 bytes still fit in one
+        self.ah.say("x" * (handler.MAX_DATAGRAM_SIZE - 16))
+        self.ah.dash(50)
+        self.ah.send_commands()
+        self.assertEqual([len(d) for d in self.sock.sent],
+                [handler.MAX_DATAGRAM_SIZE - 1])
+
+        # but a byte more and the primary goes out on its own
+        self.ah.say("x" * (handler.MAX_DATAGRAM_SIZE - 15))
+        self.ah.dash(50)
+        self.ah.send_commands()
+        self.assertEqual(len(self.sock.sent), 3)
+        self.assertEqual(len(self.sock.sent[1]), handler.MAX_DATAGRAM_SIZE - 9)
+        self.assertEqual(self.sock.sent[2], "(dash 50)")
+
+        self.assertEqual(self.ah.commands_sent, 4)
+        self.assertEqual(self.ah.datagrams_sent, 3)
+
+    def test_format_float(self):
+        for x, text in ((65.0, "65"), (65, "65"), (-0.25, "-0.25"),
+                (0.0, "0"), (-0.0, "0"), (-0.00001, "0"), (1.23456, "1.2346"),
+                (100.5, "100.5"), (-180, "-180"), (1e-4, "0.0001")):
+            self.assertEqual(handler.format_float(x), text)
+
+        self.ah.kick(100.0, -12.5)
+        self.ah.send_commands()
+        self.assertEqual(self.sock.sent, ["(kick 100 -12.5)"])
+
+    def test_dropped(self):
+        # a command replacing one of its kind in the same cycle drops it
+        self.ah.dash(50)
+        self.ah.dash(60)
+        self.ah.kick(100, 0)
+        self.ah.turn_neck(10)
+        self.ah.turn_neck(20)
+        self.ah.say("a")
+        self.ah.send_commands()
+
+        self.assertEqual(dict(self.ah.dropped), {"dash": 2, "turn_neck": 1})
+        self.assertEqual(self.sock.sent, ["(turn_neck 20)(say a)(kick 100 0)"])
+        self.assertEqual(self.ah.primary_requests, 3)
+
+        # commands sent in an earlier cycle are never dropped
+        self.ah.turn(30)
+        self.ah.send_commands()
+        self.assertEqual(dict(self.ah.dropped), {"dash": 2, "turn_neck": 1})
+
+    def test_late_primary_not_dropped(self):
+        # a command decided on too late for its cycle is counted by the clock,
+        # not again when the next cycle's command replaces it
+        self.ah.dash(50)
+        self.ah.primary_late = True
+        self.ah.turn(30)
+
+        self.assertEqual(dict(self.ah.dropped), {})
+        self.assertFalse(self.ah.primary_late)
+        self.assertEqual(self.ah.primary_requests, 2)
+
+if __name__ == "__main__":
+    unittest.main()
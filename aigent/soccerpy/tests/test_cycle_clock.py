@@ -0,0 +1,83 @@
+import unittest
+
+from soccerpy import cycle_clock
+
+class FakeTime:
+    """
+    A clock that only moves when told to.
+    """
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class CycleClockTest(unittest.TestCase):
+
+    def setUp(self):
+        self.time = FakeTime()
+        self.clock = cycle_clock.CycleClock(step=0.1, send_offset=0.05,
+                clock=self.time)
+
+    def run_cycle(self, requests, late_requests=0):
+        """
+        Runs one cycle in which 'requests' primary commands are decided on
+        before the send point and 'late_requests' after it.  Returns what
+        decide said about the late ones.
+        """
+
+        self.clock.sense_body()
+        cycle = self.clock.cycles
+
+        self.time.now += 0.01
+        self.assertFalse(self.clock.decide(cycle, requests=requests))
+        self.assertAlmostEqual(self.clock.time_until_send(), 0.04)
+
+        self.time.now += 0.04
+        self.assertAlmostEqual(self.clock.time_until_send(), 0.0)
+        self.clock.sent(requests > 0)
+        self.assertEqual(self.clock.time_until_send(), None)
+
+        self.time.now += 0.02
+        late = self.clock.decide(cycle, requests=late_requests)
+
+        self.time.now += 0.03
+        return late
+
+    def test_cycles(self):
+        self.assertFalse(self.run_cycle(0))
+        self.assertFalse(self.run_cycle(1))
+        self.assertTrue(self.run_cycle(1, late_requests=1))
+        self.assertFalse(self.run_cycle(2))
+
+        # the last cycle only ends with the next 'sense_body'
+        self.clock.sense_body()
+
+        self.assertEqual(self.clock.cycles, 5)
+        self.assertEqual(self.clock.empty, 1)
+        self.assertEqual(self.clock.multiple, 1)
+        self.assertEqual(self.clock.decided_late, 1)
+        self.assertEqual(self.clock.late, 0)
+
+        self.assertEqual(self.clock.latency_count, 4)
+        self.assertAlmostEqual(self.clock.latency_worst, 0.01)
+        self.assertAlmostEqual(self.clock.offset_worst, 0.05)
+
+    def test_decisions_before_the_first_cycle(self):
+        self.assertFalse(self.clock.decide(0, requests=1))
+        self.assertEqual(self.clock.decided_late, 0)
+
+    def test_sent_late(self):
+        self.clock.sense_body()
+        self.clock.decide(1, requests=1)
+
+        self.time.now += 0.15
+        self.clock.sent(True)
+        self.clock.sense_body()
+
+        self.assertEqual(self.clock.late, 1)
+        self.assertEqual(self.clock.empty, 0)
+
+if __name__ == "__main__":
+    unittest.main()
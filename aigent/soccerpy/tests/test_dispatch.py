@@ -0,0 +1,120 @@
+import unittest
+
+from soccerpy import handler
+from soccerpy import sp_exceptions
+from soccerpy.handler import MessageHandler
+
+class FakeWorldModel:
+    """
+    Just what a MessageHandler needs to parse and dispatch messages.
+    """
+
+    def __init__(self):
+        self.instruments = None
+        self.teamname = "test"
+
+class RecordingHandler(MessageHandler):
+    """
+    Records which of its handlers was given which message.
+    """
+
+    def __init__(self):
+        MessageHandler.__init__(self, FakeWorldModel())
+        self.calls = []
+
+    def _handle_error(self, msg):
+        self.calls.append(("error", msg))
+
+    @handler.handles("fullstate", "custom")
+    def fullstate(self, msg):
+        self.calls.append(("fullstate", msg))
+
+    @handler.handles_raw("hear")
+    def hear(self, text):
+        self.calls.append(("hear", text))
+
+def registered(h, msg):
+    h.calls.append(("registered", msg))
+
+class DispatchTest(unittest.TestCase):
+
+    def tearDown(self):
+        # forget anything registered on our classes
+        for cls in (RecordingHandler, MessageHandler):
+            if "_registered_handlers" in cls.__dict__:
+                del cls._registered_handlers
+        handler._dispatch_tables.clear()
+
+    def test_override(self):
+        # a subclass's method replaces the base class's, name or decorator
+        h = RecordingHandler()
+        self.assertEqual(h.handle_message("(error unknown_command)"), "error")
+        self.assertEqual(h.handle_message("(fullstate 5)"), "fullstate")
+        self.assertEqual(h.handle_message("(custom 1.5)"), "custom")
+        self.assertEqual(h.calls, [("error", ["error", "unknown_command"]),
+            ("fullstate", ["fullstate", 5]), ("fullstate", ["custom", 1.5])])
+
+        self.assertTrue(MessageHandler.get_dispatch_table()["error"] is
+                MessageHandler.__dict__["_handle_error"])
+        self.assertFalse("fullstate" in MessageHandler.get_dispatch_table())
+
+    def test_unknown(self):
+        h = RecordingHandler()
+        self.assertRaises(sp_exceptions.MessageTypeError, h.handle_message,
+                "(nonsense 1)")
+
+    def test_registered(self):
+        # a registered handler beats any method, even on the same class
+        RecordingHandler.register_handler("custom", registered)
+        RecordingHandler.register_handler("error", registered)
+
+        h = RecordingHandler()
+        h.handle_message("(custom 1)")
+        h.handle_message("(error x)")
+        h.handle_message("(fullstate 2)")
+        self.assertEqual(h.calls, [("registered", ["custom", 1]),
+            ("registered", ["error", "x"]), ("fullstate", ["fullstate", 2])])
+
+        # and is inherited, but never passed up to the base class
+        class Sub(RecordingHandler):
+            pass
+
+        self.assertTrue(Sub.get_dispatch_table()["custom"] is registered)
+        self.assertFalse("custom" in MessageHandler.get_dispatch_table())
+
+    def test_registered_on_base(self):
+        # a subclass's method still overrides a handler registered on a base
+        MessageHandler.register_handler("error", registered)
+        self.assertTrue(MessageHandler.get_dispatch_table()["error"] is
+                registered)
+
+        h = RecordingHandler()
+        h.handle_message("(error x)")
+        self.assertEqual(h.calls, [("error", ["error", "x"])])
+
+    def test_registered_raw(self):
+        RecordingHandler.register_handler("custom", registered, raw=True)
+
+        h = RecordingHandler()
+        h.handle_message("(custom (a b) 1)")
+        self.assertEqual(h.calls, [("registered", "(custom (a b) 1)")])
+        self.assertFalse("custom" in h.dispatch)
+
+    def test_raw(self):
+        h = RecordingHandler()
+        msg = '(hear 10 self "hello (there)")'
+
+        parsed = h.parse(msg)
+        self.assertTrue(isinstance(parsed, MessageHandler.RawMessage))
+        self.assertEqual(parsed, ("hear", msg))
+
+        # parsing from a buffer gives the same message, copied out of it
+        buf = bytearray(msg + "garbage")
+        self.assertEqual(h.parse_buffer(buf, len(msg)), parsed)
+
+        self.assertEqual(h.handle_parsed(parsed), "hear")
+        self.assertEqual(h.calls, [("hear", msg)])
+        self.assertFalse("hear" in h.dispatch)
+
+if __name__ == "__main__":
+    unittest.main()
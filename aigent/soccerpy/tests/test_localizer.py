@@ -0,0 +1,133 @@
+import math
+import unittest
+
+from soccerpy import localizer
+from soccerpy.game_object import Flag
+from soccerpy.handler import ActionHandler
+from soccerpy.world_model import ServerParameters
+
+def flag_points(x, y, flags, places=None):
+    """
+    Returns the (x, y, distance) points of the given flags as seen from (x, y),
+    with distances rounded to 'places' decimal places if given.
+    """
+
+    points = []
+    for f in flags:
+        fx, fy = Flag.FLAG_COORDS[f]
+        d = math.sqrt((x - fx) ** 2 + (y - fy) ** 2)
+        if places is not None:
+            d = round(d, places)
+        points.append((fx, fy, d))
+
+    return points
+
+# flags spread around the half we look at from near the center
+FLAGS = ["tr10", "tr30", "prt", "prc", "prb", "br20", "gr"]
+
+class LocateTest(unittest.TestCase):
+
+    def test_exact(self):
+        x, y = localizer.locate(flag_points(10, -5, FLAGS))
+        self.assertAlmostEqual(x, 10.0, 6)
+        self.assertAlmostEqual(y, -5.0, 6)
+
+    def test_three_flags(self):
+        x, y = localizer.locate(flag_points(-30, 20, ["tl30", "plt", "c"]))
+        self.assertAlmostEqual(x, -30.0, 6)
+        self.assertAlmostEqual(y, 20.0, 6)
+
+    def test_rounded_distances(self):
+        # the server reports distances to a tenth of a meter
+        x, y = localizer.locate(flag_points(10, -5, FLAGS, 1))
+        self.assertTrue(abs(x - 10.0) < 0.1)
+        self.assertTrue(abs(y + 5.0) < 0.1)
+
+    def test_undetermined(self):
+        # two flags leave two candidate points
+        self.assertEqual(localizer.locate(flag_points(0, 0, ["tr10", "gr"])),
+                None)
+
+        # flags in a line can't tell which side of it we're on
+        self.assertEqual(localizer.locate(
+            flag_points(0, 0, ["tl10", "t0", "tr10", "tr20"])), None)
+
+class MotionFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.params = ServerParameters()
+        self.filter = localizer.MotionFilter()
+
+    def test_first_fix(self):
+        self.assertEqual(self.filter.get_position(), None)
+        self.assertEqual(self.filter.correct([]), None)
+
+        x, y = self.filter.correct(flag_points(10, -5, FLAGS))
+        self.assertAlmostEqual(x, 10.0, 6)
+        self.assertAlmostEqual(y, -5.0, 6)
+        self.assertEqual(self.filter.fixes, 1)
+        self.assertEqual(self.filter.corrections, 0)
+
+    def test_predict_and_correct(self):
+        self.filter.correct(flag_points(10, -5, FLAGS))
+        self.filter.correct_direction(0.0)
+
+        # a reported speed of 0.4 along our body means we moved 1 m along +x
+        self.filter.predict(self.params, speed_amount=0.4,
+                speed_direction=0.0)
+        x, y = self.filter.get_position()
+        self.assertAlmostEqual(x, 11.0, 6)
+        self.assertAlmostEqual(y, -5.0, 6)
+
+        # flags that agree are a cheap correction, not a new fix
+        x, y = self.filter.correct(flag_points(11, -5, FLAGS))
+        self.assertAlmostEqual(x, 11.0, 6)
+        self.assertAlmostEqual(y, -5.0, 6)
+        self.assertEqual(self.filter.fixes, 1)
+        self.assertEqual(self.filter.corrections, 1)
+
+    def test_dash_without_speed(self):
+        self.filter.correct(flag_points(10, -5, FLAGS))
+        self.filter.correct_direction(90.0)
+
+        dash = ActionHandler.Command(ActionHandler.CommandType.TYPE_PRIMARY,
+                "(dash 100)", "dash", (100,))
+        self.filter.predict(self.params, dash)
+        x, y = self.filter.get_position()
+        self.assertAlmostEqual(x, 10.0, 6)
+        self.assertAlmostEqual(y, -5.0 + self.params.dash_power_rate * 100, 6)
+
+    def test_blended_correction(self):
+        self.filter.correct(flag_points(10, -5, FLAGS))
+        self.filter.correct_direction(0.0)
+        self.filter.predict(self.params, speed_amount=0.4,
+                speed_direction=0.0)
+
+        # two flags are enough to correct a prediction, which ends up between
+        # where we predicted and where the flags put us
+        x, y = self.filter.correct(flag_points(10.5, -5, ["prt", "prb"]))
+        self.assertTrue(10.5 < x < 11.0)
+        self.assertAlmostEqual(y, -5.0, 1)
+        self.assertEqual(self.filter.fixes, 1)
+        self.assertEqual(self.filter.corrections, 1)
+
+    def test_move_resets(self):
+        self.filter.correct(flag_points(10, -5, FLAGS))
+        self.filter.correct_direction(0.0)
+
+        move = ActionHandler.Command(ActionHandler.CommandType.TYPE_PRIMARY,
+                "(move -10 0)", "move", (-10, 0))
+        self.filter.predict(self.params, move)
+        self.assertEqual(self.filter.get_position(), None)
+        self.assertEqual(self.filter.body_dir, None)
+
+    def test_direction(self):
+        self.assertEqual(self.filter.correct_direction(None), None)
+        self.assertAlmostEqual(self.filter.correct_direction(-10.0), 350.0)
+
+        # a new reading is blended in across the wrap at 0 degrees
+        d = self.filter.correct_direction(10.0)
+        self.assertTrue(d > 350.0 or d < 10.0)
+
+if __name__ == "__main__":
+    unittest.main()
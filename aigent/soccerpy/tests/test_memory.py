@@ -0,0 +1,122 @@
+import unittest
+
+from soccerpy import memory
+from soccerpy.game_object import Ball, Player
+from soccerpy.world_model import ServerParameters
+
+class FakeSnapshot:
+    """
+    Just the parts of a WorldSnapshot that ObjectMemory reads.
+    """
+
+    def __init__(self, ball=None, ball_coords=None, players=(),
+            player_coords=()):
+        self.ball = ball
+        self.ball_coords = ball_coords
+        self.players = players
+        self.player_coords = player_coords
+
+def ball(abs_velocity=None):
+    """
+    Returns a seen ball, moving with the given velocity on the field if the
+    server reported how it was moving.
+    """
+
+    b = Ball(10.0, 0.0, None, None, None)
+    b.abs_velocity = abs_velocity
+    return b
+
+class RememberedObjectTest(unittest.TestCase):
+
+    def test_extrapolate(self):
+        r = memory.RememberedObject(10, (1.0, 2.0), (1.0, -0.5), None)
+
+        # the velocity halves every cycle, so three cycles cover 1.75 of it
+        x, y, confidence = r.extrapolate(13, 0.5)
+        self.assertAlmostEqual(x, 2.75)
+        self.assertAlmostEqual(y, 1.125)
+        self.assertAlmostEqual(confidence, 0.9 ** 3)
+
+    def test_no_decay(self):
+        r = memory.RememberedObject(10, (1.0, 2.0), (1.0, -0.5), None)
+
+        x, y, confidence = r.extrapolate(14, 1.0)
+        self.assertAlmostEqual(x, 5.0)
+        self.assertAlmostEqual(y, 0.0)
+        self.assertAlmostEqual(confidence, 0.9 ** 4)
+
+    def test_confidence(self):
+        for age in xrange(memory.MAX_AGE):
+            r = memory.RememberedObject(10, (0.0, 0.0), (0.0, 0.0), None)
+            self.assertAlmostEqual(r.extrapolate(10 + age, 0.94)[2],
+                    memory.CONFIDENCE_DECAY ** age)
+
+    def test_past(self):
+        # asking about a time before the sighting is asking about the sighting
+        r = memory.RememberedObject(10, (1.0, 2.0), (1.0, -0.5), None)
+        self.assertEqual(r.extrapolate(8, 0.94), (1.0, 2.0, 1.0))
+
+class ObjectMemoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.params = ServerParameters()
+        self.memory = memory.ObjectMemory()
+
+    def test_reported_velocity(self):
+        self.memory.update(FakeSnapshot(ball(), (0.0, 0.0)), 10, self.params)
+
+        # the velocity the server reported wins over the change in position
+        self.memory.update(FakeSnapshot(ball((0.5, -1.0)), (2.0, 0.0)), 11,
+                self.params)
+        self.assertEqual(self.memory.ball.velocity, (0.5, -1.0))
+
+    def test_position_velocity(self):
+        self.memory.update(FakeSnapshot(ball(), (0.0, 0.0)), 10, self.params)
+        self.memory.update(FakeSnapshot(ball(), (2.0, 1.0)), 12, self.params)
+        self.assertEqual(self.memory.ball.velocity, (1.0, 0.5))
+
+        # too long between sightings to tell how it was moving
+        self.memory.update(FakeSnapshot(ball(), (4.0, 1.0)),
+                12 + memory.MAX_VELOCITY_AGE + 1, self.params)
+        self.assertEqual(self.memory.ball.velocity, (0.0, 0.0))
+
+    def test_max_speed(self):
+        self.memory.update(FakeSnapshot(ball((30.0, 40.0)), (0.0, 0.0)), 10,
+                self.params)
+
+        vx, vy = self.memory.ball.velocity
+        self.assertAlmostEqual(vx, self.params.ball_speed_max * 0.6)
+        self.assertAlmostEqual(vy, self.params.ball_speed_max * 0.8)
+
+    def test_get_ball(self):
+        self.assertEqual(self.memory.get_ball(10, self.params), None)
+
+        self.memory.update(FakeSnapshot(ball((1.0, 0.0)), (0.0, 0.0)), 10,
+                self.params)
+        x, y, confidence = self.memory.get_ball(12, self.params)
+        self.assertAlmostEqual(x, 1.0 + self.params.ball_decay)
+        self.assertAlmostEqual(y, 0.0)
+        self.assertAlmostEqual(confidence, 0.9 ** 2)
+
+    def test_players(self):
+        p = Player(10.0, 0.0, None, None, None, None, "r", 7, None, None)
+        unknown = Player(10.0, 0.0, None, None, None, None, "r", None, None,
+                None)
+        self.memory.update(FakeSnapshot(players=(p, unknown),
+            player_coords=((5.0, 5.0), (6.0, 6.0))), 10, self.params)
+
+        # only players we can tell apart are remembered
+        self.assertEqual(self.memory.players.keys(), [("r", 7)])
+        self.assertEqual(self.memory.get_player("r", 7, 10, self.params),
+                (5.0, 5.0, 1.0))
+
+    def test_forget(self):
+        self.memory.update(FakeSnapshot(ball(), (0.0, 0.0)), 10, self.params)
+        self.memory.update(FakeSnapshot(), 10 + memory.MAX_AGE, self.params)
+        self.assertNotEqual(self.memory.ball, None)
+
+        self.memory.update(FakeSnapshot(), 11 + memory.MAX_AGE, self.params)
+        self.assertEqual(self.memory.ball, None)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+from soccerpy import message_parser
+from soccerpy import replay
+
+# messages the tokenizer and the legacy parser have disagreed on, or that only
+# the legacy parser can handle
+EDGE_CASES = [
+    "(a 0\n)",
+    "(a -1.5\n)",
+    "(a 0\n\n)",
+    "(a 0\nb 1\n(c))",
+    '(a "0\n")',
+    "(a 1.)",
+    "(a -.5 .5 -1)",
+    "(a\t1)",
+    "(a)\n",
+    "(a) 5\n",
+    "(a)) (b",
+    ")(a (b)",
+    '(a "" 2)',
+    '(a "x y" 1)',
+    '(a "x\\"y" 1)',
+    '(see 12 ((p "team" 3) 1.2 -30))',
+    '(see 12 ((p "te(am" 3) 1.2 -30))',
+    "x (a)",
+]
+
+def outcome(func, *args):
+    """
+    Returns the repr of what a parser returns, which tells ints, floats and
+    strings apart where == wouldn't, or the name of the error it raises.
+    """
+
+    try:
+        return repr(func(*args))
+    except Exception as e:
+        return e.__class__.__name__
+
+class ParserAgreementTest(unittest.TestCase):
+
+    def assertAgree(self, text):
+        expected = outcome(message_parser.parse, text)
+
+        self.assertEqual(outcome(message_parser.parse_fast, text), expected,
+                "parse_fast disagrees on %r" % text)
+
+        buf = bytearray(text + "garbage")
+        self.assertEqual(outcome(message_parser.parse_buffer, buf, len(text)),
+                expected, "parse_buffer disagrees on %r" % text)
+
+    def test_log(self):
+        for msg in replay.read_log(replay.DEFAULT_LOG):
+            self.assertAgree(msg)
+
+    def test_edge_cases(self):
+        for text in EDGE_CASES:
+            self.assertAgree(text)
+
+    def test_trailing_newline(self):
+        # a number may end in one newline, as the legacy patterns allow
+        for func in (message_parser.parse, message_parser.parse_fast):
+            self.assertEqual(repr(func("(a 0\n 1.5\n)")), repr(["a", 0, 1.5]))
+            self.assertEqual(func("(a 0\n\n)"), ["a", "0\n\n"])
+
+    def test_unmatched(self):
+        for func in (message_parser.parse, message_parser.parse_fast):
+            self.assertRaises(ValueError, func, "(a (b)")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+
+from soccerpy.game_object import Flag, Goal, Line, ObjectPool
+
+def state(obj):
+    """
+    Returns the class of an object and the value of every slot it has, unset
+    slots included, so objects can be compared field by field.
+    """
+
+    values = []
+    for cls in obj.__class__.__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            values.append((name, getattr(obj, name, "<unset>")))
+
+    return (obj.__class__, sorted(values))
+
+class ObjectPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ObjectPool()
+
+    def see(self):
+        """
+        Hands out a flag, goal and line as for a 'see' of everything, and
+        returns them.
+        """
+
+        self.pool.recycle()
+        return [self.pool.flag(12.5, -30.0, "tr10"),
+                self.pool.goal(40.2, 10.0, "r"),
+                self.pool.line(8.0, 45.0, "t")]
+
+    def test_kept_until_see_after_next(self):
+        first = self.see()
+        second = self.see()
+
+        # the last 'see's objects are still in the world model
+        for a, b in zip(first, second):
+            self.assertFalse(a is b)
+
+        # but the ones before that can be handed out again
+        third = self.see()
+        for a, b in zip(first, third):
+            self.assertTrue(a is b)
+
+        self.assertEqual(self.pool.created, 6)
+        self.assertEqual(self.pool.reused, 3)
+
+    def test_recycled_state_reset(self):
+        self.see()
+        self.see()
+        self.pool.recycle()
+
+        # objects come back exactly as they would if freshly made, even where
+        # the new values are missing or looked up rather than given
+        for made, fresh in (
+                (self.pool.flag(None, None, None), Flag(None, None, None)),
+                (self.pool.goal(None, None, None), Goal(None, None, None)),
+                (self.pool.line(None, None, None), Line(None, None, None))):
+            self.assertEqual(state(made), state(fresh))
+        self.assertEqual(self.pool.reused, 3)
+
+        self.pool.recycle()
+        self.pool.recycle()
+        flag = self.pool.flag(3.0, 4.0, "c")
+        self.assertEqual(state(flag), state(Flag(3.0, 4.0, "c")))
+        self.assertEqual(flag.flag_index, Flag.FLAG_INDEX["c"])
+
+    def test_by_class(self):
+        self.see()
+        self.see()
+        self.pool.recycle()
+
+        # each class is recycled separately, so a class with nothing free
+        # gets a new object instead of another class's
+        self.pool.flag(1.0, 0.0, "c")
+        self.pool.flag(2.0, 0.0, "c")
+        self.assertEqual([len(f) for f in (self.pool.free[Flag],
+            self.pool.free[Goal], self.pool.free[Line])], [0, 1, 1])
+        self.assertEqual(self.pool.created, 7)
+        self.assertEqual(self.pool.reused, 1)
+
+if __name__ == "__main__":
+    unittest.main()
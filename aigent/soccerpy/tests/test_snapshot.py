@@ -0,0 +1,126 @@
+import math
+import unittest
+
+from soccerpy import game_object
+from soccerpy import snapshot
+from soccerpy.world_model import ServerParameters, WorldModel
+
+class FakeWorldModel:
+    """
+    Just what a WorldSnapshot takes from a world model.
+    """
+
+    def __init__(self, abs_coords, abs_neck_dir, ball=None, players=()):
+        self.side = WorldModel.SIDE_L
+        self.abs_coords = abs_coords
+        self.abs_neck_dir = abs_neck_dir
+        self.server_parameters = ServerParameters()
+        self.ball = ball
+        self.players = list(players)
+
+def seen(origin, abs_neck_dir, point):
+    """
+    Returns the (distance, direction) a point is seen at from 'origin' with
+    our neck at 'abs_neck_dir'.
+    """
+
+    dx = point[0] - origin[0]
+    dy = point[1] - origin[1]
+    direction = abs_neck_dir - math.degrees(math.atan2(dy, dx))
+
+    return math.sqrt(dx * dx + dy * dy), direction
+
+def player(origin, abs_neck_dir, point, side, uniform_number):
+    """
+    Returns a Player at 'point' as seen from 'origin'.
+    """
+
+    distance, direction = seen(origin, abs_neck_dir, point)
+    return game_object.Player(distance, direction, None, None, None, None,
+            side, uniform_number, None, None)
+
+class AbsoluteCoordsTest(unittest.TestCase):
+
+    def assertPointEqual(self, a, b, places=2):
+        self.assertAlmostEqual(a[0], b[0], places)
+        self.assertAlmostEqual(a[1], b[1], places)
+
+    def test_flags(self):
+        # facing the top touchline from the center of the field, with 't0'
+        # straight ahead and 'tr10' off to our right
+        for flag_id, direction in (("t0", 0.0), ("tr10", 14.036)):
+            x, y = game_object.Flag.FLAG_COORDS[flag_id]
+            distance = math.sqrt(x * x + y * y)
+            self.assertPointEqual(snapshot.absolute_coords((0.0, 0.0), 90.0,
+                distance, direction), (x, y))
+
+    def test_ball(self):
+        ball = game_object.Ball(1.1, 2.0, None, None, None)
+        wm = FakeWorldModel((-13.142, 0.83), 257.0, ball=ball)
+
+        s = snapshot.WorldSnapshot(wm)
+        self.assertPointEqual(s.ball_coords, (-13.427, -0.232))
+        self.assertPointEqual(s.get_coords(ball), (-13.427, -0.232))
+
+    def test_world_model_matches_snapshot(self):
+        wm = WorldModel(None)
+        wm.abs_coords = (-13.142, 0.83)
+        wm.abs_neck_dir = 257.0
+
+        ball = game_object.Ball(1.1, 2.0, None, None, None)
+        self.assertPointEqual(wm.get_object_absolute_coords(ball),
+                (-13.427, -0.232))
+
+    def test_unknown(self):
+        self.assertEqual(snapshot.absolute_coords((None, None), 0.0, 1.0,
+            0.0), None)
+        self.assertEqual(snapshot.absolute_coords((0.0, 0.0), None, 1.0,
+            0.0), None)
+        self.assertEqual(snapshot.absolute_coords((0.0, 0.0), 0.0, None,
+            0.0), None)
+
+class PassAndShotTest(unittest.TestCase):
+
+    # attacking the right goal from the center, looking towards the top
+    # touchline
+    ORIGIN = (0.0, 0.0)
+    NECK = 90.0
+    GOAL = (52.5, 0.0)
+
+    def snapshot(self, points):
+        players = [player(self.ORIGIN, self.NECK, point, side, number)
+                for number, (point, side) in enumerate(points, 1)]
+        wm = FakeWorldModel(self.ORIGIN, self.NECK, players=players)
+
+        return snapshot.WorldSnapshot(wm), players
+
+    def test_best_pass(self):
+        # the teammate nearer the goal is marked, so we pass to the open one
+        s, players = self.snapshot([
+            ((18.8, 6.8), WorldModel.SIDE_L),
+            ((23.5, -8.5), WorldModel.SIDE_L),
+            ((9.4, -3.4), WorldModel.SIDE_R),
+        ])
+
+        score, target, coords = s.best_pass(self.GOAL)
+        self.assertTrue(target is players[0])
+        self.assertAlmostEqual(coords[0], 18.8, 2)
+        self.assertAlmostEqual(coords[1], 6.8, 2)
+
+        self.assertEqual(len(s.pass_candidates(self.GOAL)), 1)
+
+    def test_best_shot(self):
+        # a keeper just below the center of the goal leaves the target above
+        # it clearest, while the defender covers none of the targets
+        s, players = self.snapshot([
+            ((51.0, -1.5), WorldModel.SIDE_R),
+            ((9.4, -3.4), WorldModel.SIDE_R),
+        ])
+
+        offset = s.goal_width * 0.4 / 2
+        target = s.best_shot(self.GOAL)
+        self.assertAlmostEqual(target[0], self.GOAL[0])
+        self.assertAlmostEqual(target[1], offset)
+
+if __name__ == "__main__":
+    unittest.main()
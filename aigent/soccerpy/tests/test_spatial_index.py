@@ -0,0 +1,125 @@
+import math
+import random
+import unittest
+
+from soccerpy import spatial_index
+
+def brute_within(entries, point, radius):
+    """
+    Returns what PointGrid.within should, by checking every entry.
+    """
+
+    result = []
+    for x, y, item in entries:
+        d = math.sqrt((x - point[0]) ** 2 + (y - point[1]) ** 2)
+        if d <= radius:
+            result.append((d, x, y, item))
+
+    return result
+
+def brute_corridor(entries, start, end, width):
+    """
+    Returns what PointGrid.in_corridor should, by checking every entry.
+    """
+
+    result = []
+    for x, y, item in entries:
+        d = spatial_index.segment_distance((x, y), start, end)
+        if d <= width:
+            result.append((d, x, y, item))
+
+    return result
+
+class PointGridTest(unittest.TestCase):
+
+    def setUp(self):
+        self.random = random.Random(0)
+
+    def random_point(self):
+        # a good share of points are off the field, as badly localized
+        # players can be, and get clamped into the border cells
+        return (self.random.uniform(-90.0, 90.0),
+                self.random.uniform(-60.0, 60.0))
+
+    def random_entries(self, n):
+        return [self.random_point() + (i,) for i in xrange(n)]
+
+    def assertSameItems(self, found, expected):
+        self.assertEqual(sorted(f[3] for f in found),
+                sorted(e[3] for e in expected))
+        for f in found:
+            self.assertEqual(f, [e for e in expected if e[3] == f[3]][0])
+
+    def test_segment_distance(self):
+        self.assertAlmostEqual(spatial_index.segment_distance((0, 5),
+            (-10, 0), (10, 0)), 5.0)
+        self.assertAlmostEqual(spatial_index.segment_distance((13, 4),
+            (-10, 0), (10, 0)), 5.0)
+        self.assertAlmostEqual(spatial_index.segment_distance((3, 4),
+            (0, 0), (0, 0)), 5.0)
+
+    def test_empty(self):
+        grid = spatial_index.PointGrid([])
+        self.assertEqual(len(grid), 0)
+        self.assertEqual(grid.nearest((0, 0), 3), [])
+        self.assertEqual(grid.within((0, 0), 100), [])
+        self.assertEqual(grid.in_corridor((0, 0), (10, 0), 100), [])
+
+    def test_nearest(self):
+        for i in xrange(50):
+            entries = self.random_entries(self.random.randint(1, 30))
+            grid = spatial_index.PointGrid(entries)
+            self.assertEqual(len(grid), len(entries))
+
+            for j in xrange(10):
+                point = self.random_point()
+                expected = sorted(brute_within(entries, point, 1e9))
+                for k in (1, 3, 50):
+                    found = grid.nearest(point, k)
+                    self.assertEqual([f[0] for f in found],
+                            [e[0] for e in expected[:k]])
+
+    def test_within(self):
+        for i in xrange(50):
+            entries = self.random_entries(30)
+            grid = spatial_index.PointGrid(entries)
+
+            for j in xrange(10):
+                point = self.random_point()
+                radius = self.random.uniform(0.0, 40.0)
+                self.assertSameItems(grid.within(point, radius),
+                        brute_within(entries, point, radius))
+
+    def test_in_corridor(self):
+        for i in xrange(50):
+            entries = self.random_entries(30)
+            grid = spatial_index.PointGrid(entries)
+
+            for j in xrange(10):
+                start = self.random_point()
+                end = self.random_point()
+                width = self.random.uniform(0.0, 15.0)
+                self.assertSameItems(grid.in_corridor(start, end, width),
+                        brute_corridor(entries, start, end, width))
+
+    def test_clamped(self):
+        # players far off every edge and corner of the field are still found
+        entries = [(-100.0, 0.0, "left"), (100.0, 0.0, "right"),
+                (0.0, 70.0, "top"), (0.0, -70.0, "bottom"),
+                (-80.0, -50.0, "corner"), (60.0, 40.0, "edge")]
+        grid = spatial_index.PointGrid(entries)
+
+        self.assertEqual(grid.nearest((-95.0, 1.0))[0][3], "left")
+        self.assertEqual(sorted(f[3] for f in grid.nearest((0.0, 0.0), 2)),
+                ["bottom", "top"])
+        self.assertSameItems(grid.within((95.0, 0.0), 10.0),
+                [(5.0, 100.0, 0.0, "right")])
+        self.assertSameItems(grid.within((0.0, 0.0), 75.0),
+                brute_within(entries, (0.0, 0.0), 75.0))
+        self.assertSameItems(grid.in_corridor((0.0, 65.0), (0.0, 80.0), 1.0),
+                [(0.0, 0.0, 70.0, "top")])
+        self.assertSameItems(grid.in_corridor((-90.0, -60.0), (-70.0, -40.0),
+            1.0), [(0.0, -80.0, -50.0, "corner")])
+
+if __name__ == "__main__":
+    unittest.main()
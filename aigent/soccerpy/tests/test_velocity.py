@@ -0,0 +1,97 @@
+import math
+import unittest
+
+from soccerpy import velocity
+from soccerpy.game_object import Ball, Player
+
+class VelocityTest(unittest.TestCase):
+
+    def assertVectorEqual(self, a, b, places=7):
+        self.assertAlmostEqual(a[0], b[0], places)
+        self.assertAlmostEqual(a[1], b[1], places)
+
+    def test_relative_velocity(self):
+        # moving straight away from us, whatever direction it's in
+        self.assertVectorEqual(velocity.relative_velocity(10, 0, 1.0, 0),
+                (1.0, 0.0))
+        self.assertVectorEqual(velocity.relative_velocity(10, 90, 1.0, 0),
+                (0.0, 1.0))
+
+        # moving across our view, as fast as its direction changes
+        self.assertVectorEqual(velocity.relative_velocity(10, 0, 0.0, 5.0),
+                (0.0, math.radians(5.0) * 10))
+        self.assertVectorEqual(velocity.relative_velocity(10, 90, 0.0, 5.0),
+                (-math.radians(5.0) * 10, 0.0))
+
+    def test_own_velocity(self):
+        self.assertEqual(velocity.own_velocity(None, None), (0.0, 0.0))
+        self.assertEqual(velocity.own_velocity(0.5, None), (0.0, 0.0))
+        self.assertVectorEqual(velocity.own_velocity(0.5, 90), (0.0, 0.5))
+
+    def test_estimate_velocities(self):
+        ball = Ball(10.0, 0.0, 1.0, 0.0, None)
+        unmoving = Player(10.0, 30.0, None, None, None, None, "l", 2, None,
+                None)
+        velocity.estimate_velocities([ball, None, unmoving], (0.5, 0.0), 90.0)
+
+        # our own velocity is added back to what the server reports
+        self.assertVectorEqual(ball.velocity, (1.5, 0.0))
+        self.assertAlmostEqual(ball.speed, 1.5)
+
+        # with our neck pointing up the field, straight ahead is up it
+        self.assertVectorEqual(ball.abs_velocity, (0.0, 1.5))
+
+        # objects seen without changes are left alone
+        self.assertEqual(unmoving.velocity, None)
+        self.assertEqual(unmoving.abs_velocity, None)
+
+    def test_estimate_without_direction(self):
+        ball = Ball(10.0, 0.0, 1.0, 0.0, None)
+        velocity.estimate_velocities([ball], (0.0, 0.0), None)
+        self.assertVectorEqual(ball.velocity, (1.0, 0.0))
+        self.assertEqual(ball.abs_velocity, None)
+
+class SolveInterceptTest(unittest.TestCase):
+
+    def test_in_reach(self):
+        self.assertEqual(velocity.solve_intercept(0.5, 30.0, (2.0, 0.0), 0.94,
+            1.0, 1.0), (0, 0.5, 30.0))
+
+    def test_stopped(self):
+        # a ball that isn't moving is reached when we've covered the distance
+        t, d, direction = velocity.solve_intercept(10.0, 30.0, (0.0, 0.0),
+                0.94, 1.0, 1.0)
+        self.assertEqual(t, 9)
+        self.assertAlmostEqual(d, 10.0)
+        self.assertAlmostEqual(direction, 30.0)
+
+    def test_coming_closer(self):
+        t, d, direction = velocity.solve_intercept(10.0, 0.0, (-1.0, 0.0), 1.0,
+                1.0, 1.0)
+        self.assertEqual(t, 5)
+        self.assertAlmostEqual(d, 5.0)
+        self.assertAlmostEqual(direction, 0.0)
+
+    def test_slowing_down(self):
+        # the ball halves its speed every cycle, so it stops just short of 14
+        t, d, direction = velocity.solve_intercept(10.0, 0.0, (2.0, 0.0), 0.5,
+                1.0, 1.0)
+        self.assertEqual(t, 13)
+        self.assertAlmostEqual(d, 14.0 - 4.0 * 0.5 ** 13)
+
+    def test_unreachable(self):
+        # a ball faster than us that never slows down gets away
+        t, d, direction = velocity.solve_intercept(10.0, 90.0, (0.0, 2.0), 1.0,
+                1.0, 1.0)
+        self.assertEqual(t, velocity.MAX_INTERCEPT_CYCLES)
+        self.assertAlmostEqual(d, 10.0 + 2.0 * velocity.MAX_INTERCEPT_CYCLES)
+        self.assertAlmostEqual(direction, 90.0)
+
+        # and we give up on it as soon as we're told to
+        t, d, direction = velocity.solve_intercept(10.0, 90.0, (0.0, 2.0), 1.0,
+                1.0, 1.0, max_cycles=3)
+        self.assertEqual(t, 3)
+        self.assertAlmostEqual(d, 16.0)
+
+if __name__ == "__main__":
+    unittest.main()
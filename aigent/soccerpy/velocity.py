@@ -0,0 +1,105 @@
+import math
+
+# intercepts further than this many cycles away aren't searched for
+MAX_INTERCEPT_CYCLES = 50
+
+def relative_velocity(distance, direction, dist_change, dir_change):
+    """
+    Turns the 'dist_change' and 'dir_change' the server reports for a seen
+    object into its velocity relative to ours, as an (x, y) vector in the
+    frame of our neck, where a direction of 0 is straight ahead and
+    directions grow the same way the server's do.
+
+    The server reports the object's relative velocity split into a part
+    along the line to the object, in meters, and the rate the direction to
+    it changes, in degrees, so we just put the two back together.
+    """
+
+    a = math.radians(direction)
+    ex = math.cos(a)
+    ey = math.sin(a)
+
+    tangential = math.radians(dir_change) * distance
+    return (dist_change * ex - tangential * ey,
+            dist_change * ey + tangential * ex)
+
+def estimate_velocities(objects, own_velocity, abs_neck_dir):
+    """
+    Sets the velocity of every mobile object in the given list that was seen
+    with distance and direction changes, in one pass.  Each gets 'velocity',
+    its own velocity in the frame of our neck, 'speed', the length of that,
+    and 'abs_velocity', the same vector on the field, if 'abs_neck_dir' is
+    known.  'own_velocity' is our velocity in the frame of our neck, which is
+    added back to the relative velocities the server reports.
+    """
+
+    own_x, own_y = own_velocity
+
+    # directions on the field are our neck's direction less relative ones,
+    # so vectors are flipped before being rotated onto the field.
+    rotate = abs_neck_dir is not None
+    if rotate:
+        c = math.cos(math.radians(abs_neck_dir))
+        s = math.sin(math.radians(abs_neck_dir))
+
+    for obj in objects:
+        if (obj is None or obj.dist_change is None or obj.distance is None or
+                obj.direction is None):
+            continue
+
+        vx, vy = relative_velocity(obj.distance, obj.direction,
+                obj.dist_change, obj.dir_change)
+        vx += own_x
+        vy += own_y
+
+        obj.velocity = (vx, vy)
+        obj.speed = math.sqrt(vx * vx + vy * vy)
+
+        if rotate:
+            obj.abs_velocity = (c * vx + s * vy, s * vx - c * vy)
+
+def own_velocity(speed_amount, speed_direction):
+    """
+    Returns our velocity as an (x, y) vector in the frame of our neck, from
+    the speed reported by 'sense_body', or no velocity if there wasn't one.
+    """
+
+    if speed_amount is None or speed_direction is None:
+        return (0.0, 0.0)
+
+    a = math.radians(speed_direction)
+    return (speed_amount * math.cos(a), speed_amount * math.sin(a))
+
+def solve_intercept(distance, direction, velocity, decay, speed_max, reach,
+        max_cycles=MAX_INTERCEPT_CYCLES):
+    """
+    Finds the soonest point at which we could get within 'reach' of a ball
+    seen at the given distance and direction and moving with the given
+    velocity, in the frame of our neck, which decays by 'decay' every cycle.
+    We're assumed to move at up to 'speed_max' every cycle.
+
+    Returns a (cycles, distance, direction) tuple for the point, relative to
+    where we are now.  If we can't get there within 'max_cycles', it's where
+    the ball will be by then.
+    """
+
+    if distance <= reach:
+        return (0, distance, direction)
+
+    a = math.radians(direction)
+    bx = distance * math.cos(a)
+    by = distance * math.sin(a)
+    vx, vy = velocity
+
+    d = distance
+    for t in xrange(1, max_cycles + 1):
+        bx += vx
+        by += vy
+        vx *= decay
+        vy *= decay
+
+        d = math.sqrt(bx * bx + by * by)
+        if d - reach <= speed_max * t:
+            return (t, d, math.degrees(math.atan2(by, bx)))
+
+    return (max_cycles, d, math.degrees(math.atan2(by, bx)))
@@ -1,9 +1,19 @@
 import math
 import random
+import threading
+import time
 
+import cycle_clock
 import message_parser
 import sp_exceptions
 import game_object
+import localizer
+import memory
+import snapshot
+import velocity
+
+# the degrees between points projected around each flag when triangulating
+TRIANGULATION_ANGLE_STEP = 36
 
 class WorldModel:
     """
@@ -15,6 +25,17 @@ class WorldModel:
     SIDE_L = "l"
     SIDE_R = "r"
 
+    # ways of finding our position from the flags we see: k-means clustering
+    # of points around every flag, a least-squares fit to all of them, or a
+    # filter that predicts our movement and corrects it with the flags.
+    LOCALIZER_KMEANS = "kmeans"
+    LOCALIZER_LEAST_SQUARES = "least_squares"
+    LOCALIZER_FILTER = "filter"
+
+    # how sure we must be of where the ball is to turn straight towards it
+    # when it's out of view, rather than searching for it.
+    BALL_SEARCH_CONFIDENCE = 0.5
+
     class PlayModes:
         """
         Acts as a static class containing variables for all valid play modes.
@@ -83,6 +104,35 @@ class WorldModel:
         self.players = []
         self.lines = []
 
+        # the decoded columns of the last 'see' message, if the message handler
+        # decodes them that way.
+        self.see = None
+
+        # the simulation time of the last 'see' or 'sense_body' message
+        self.sim_time = None
+
+        # the raw 'player_param' and 'player_type' messages, which are only
+        # parsed the first time something asks for them, and what they parse
+        # into once they are.
+        self.player_param_message = None
+        self.player_type_messages = []
+        self.player_params = None
+        self.player_types = None
+
+        # the raw 'server_param' message our server_parameters came from, and
+        # an event set once it has arrived
+        self.server_param_message = None
+        self.server_param_received = threading.Event()
+
+        # where we are within the server's cycles, and when to send commands
+        self.clock = cycle_clock.CycleClock()
+
+        # the instruments.Instruments timing our agent's runtime, if enabled
+        self.instruments = None
+
+        # where we last saw the ball and players, for when they're out of view
+        self.memory = memory.ObjectMemory()
+
         # the default position of this player, its home position
         self.home_point = (None, None)
 
@@ -122,6 +172,13 @@ class WorldModel:
         self.move_count = None
         self.change_view_count = None
 
+        # how process_new_info finds our position, one of the LOCALIZER_*
+        # constants.
+        self.localizer = WorldModel.LOCALIZER_KMEANS
+
+        # tracks our movement between cycles for LOCALIZER_FILTER
+        self.motion_filter = localizer.MotionFilter()
+
         # apparent absolute player coordinates and neck/body directions
         self.abs_coords = (None, None)
         self.abs_neck_dir = None
@@ -130,6 +187,10 @@ class WorldModel:
         # create a new server parameter object for holding all server params
         self.server_parameters = ServerParameters()
 
+        # the state of the world as of the last 'see', which answers queries
+        # about the players and ball from then on.
+        self.snapshot = snapshot.WorldSnapshot(self)
+
     def triangulate_direction(self, flags, flag_dict):
         """
         Determines absolute view angle for the player given a list of visible
@@ -137,14 +198,20 @@ class WorldModel:
         of those angles.  Returns 'None' if no angle could be determined.
         """
 
+        return self.triangulate_direction_from_points(
+                self.get_flag_points(flags, flag_dict))
+
+    def triangulate_direction_from_points(self, flag_points):
+        """
+        Like triangulate_direction, but takes the (x, y, distance) tuples of
+        the visible flags directly.
+        """
+
         # average all flag angles together and save that as absolute angle
         abs_angles = []
-        for f in self.flags:
-            # if the flag has useful data, consider it
-            if f.distance is not None and f.flag_id in flag_dict:
-                flag_point = flag_dict[f.flag_id]
-                abs_dir = self.angle_between_points(self.abs_coords, flag_point)
-                abs_angles.append(abs_dir)
+        for fx, fy, fdist in flag_points:
+            abs_dir = self.angle_between_points(self.abs_coords, (fx, fy))
+            abs_angles.append(abs_dir)
 
         # return the average if available
         if len(abs_angles) > 0:
@@ -152,28 +219,68 @@ class WorldModel:
 
         return None
 
-    def triangulate_position(self, flags, flag_dict, angle_step=36):
+    def get_flag_points(self, flags, flag_dict=None):
         """
-        Returns a best-guess position based on the triangulation via distances
-        to all flags in the flag list given.  'angle_step' specifies the
-        increments between angles for projecting points onto the circle
-        surrounding a flag.
+        Returns an (x, y, distance) tuple for every flag in the list that has a
+        distance and a known position.  Positions come from 'flag_dict' if
+        given, otherwise from the coordinate tables in Flag by each flag's
+        index.
         """
 
-        points = []
+        flag_points = []
+        if flag_dict is None:
+            flag_x = game_object.Flag.FLAG_X
+            flag_y = game_object.Flag.FLAG_Y
+            for f in flags:
+                # skip flags without distance information or a known index
+                if f.distance is None or f.flag_index is None:
+                    continue
+
+                i = f.flag_index
+                flag_points.append((flag_x[i], flag_y[i], f.distance))
+
+            return flag_points
+
         for f in flags:
             # skip flags without distance information or without a specific id
             if f.distance is None or f.flag_id not in flag_dict:
                 continue
 
+            fcoords = flag_dict[f.flag_id]
+            flag_points.append((fcoords[0], fcoords[1], f.distance))
+
+        return flag_points
+
+    def triangulate_position(self, flags, flag_dict,
+            angle_step=TRIANGULATION_ANGLE_STEP):
+        """
+        Returns a best-guess position based on the triangulation via distances
+        to all flags in the flag list given.  'angle_step' specifies the
+        increments between angles for projecting points onto the circle
+        surrounding a flag.
+        """
+
+        return self.triangulate_position_from_points(
+                self.get_flag_points(flags, flag_dict), angle_step)
+
+    def triangulate_position_from_points(self, flag_points,
+            angle_step=TRIANGULATION_ANGLE_STEP):
+        """
+        Like triangulate_position, but takes the (x, y, distance) tuples of
+        the visible flags directly.
+        """
+
+        circle = game_object.unit_circle(angle_step)
+
+        points = []
+        for fx, fy, fdist in flag_points:
             # generate points every 'angle_step' degrees around each flag,
             # discarding those off-field.
-            for i in xrange(0, 360, angle_step):
-                dy = f.distance * math.sin(math.radians(i))
-                dx = f.distance * math.cos(math.radians(i))
+            for cos_a, sin_a in circle:
+                dy = fdist * sin_a
+                dx = fdist * cos_a
 
-                fcoords = flag_dict[f.flag_id]
-                new_point = (fcoords[0] + dx, fcoords[1] + dy)
+                new_point = (fx + dx, fy + dy)
 
                 # skip points with a coordinate outside the play boundaries
                 if (new_point[0] > 60 or new_point[0] < -60 or
@@ -300,28 +407,55 @@ class WorldModel:
         except:
             return 0
 
-    def process_new_info(self, ball, flags, goals, players, lines):
+    def process_new_info(self, ball, flags, goals, players, lines, see=None,
+            sim_time=None):
         """
         Update any internal variables based on the currently available
         information.  This also calculates information not available directly
         from server-reported messages, such as player coordinates.
+
+        If 'see' is given, it's the see_decoder.SeeColumns the objects were
+        decoded from, and flags are read from it instead of the flag list.
+        'sim_time' is the simulation time the objects were seen at.
         """
 
+        instruments = self.instruments
+        if instruments is not None:
+            start = time.time()
+
+        if sim_time is not None:
+            self.sim_time = sim_time
+
         # update basic information
         self.ball = ball
         self.flags = flags
         self.goals = goals
         self.players = players
         self.lines = lines
+        self.see = see
 
         # TODO: make all triangulate_* calculations more accurate
 
-        # update the apparent coordinates of the player based on all flag pairs
-        flag_dict = game_object.Flag.FLAG_COORDS
-        self.abs_coords = self.triangulate_position(self.flags, flag_dict)
+        # the positions of and distances to all usable flags
+        if see is not None:
+            flag_points = see.flag_points()
+        else:
+            flag_points = self.get_flag_points(self.flags)
+
+        # update the apparent coordinates of the player based on all flag pairs.
+        # least squares needs three flags that aren't in a line, so we fall
+        # back to clustering when it can't find a position.
+        coords = None
+        if self.localizer == WorldModel.LOCALIZER_LEAST_SQUARES:
+            coords = localizer.locate(flag_points)
+        elif self.localizer == WorldModel.LOCALIZER_FILTER:
+            coords = self.motion_filter.correct(flag_points)
+        if coords is None:
+            coords = self.triangulate_position_from_points(flag_points)
+        self.abs_coords = coords
 
         # set the neck and body absolute directions based on flag directions
-        self.abs_neck_dir = self.triangulate_direction(self.flags, flag_dict)
+        self.abs_neck_dir = self.triangulate_direction_from_points(flag_points)
 
         # set body dir only if we got a neck dir, else reset it
         if self.abs_neck_dir is not None and self.neck_direction is not None:
@@ -329,6 +463,61 @@ class WorldModel:
         else:
             self.abs_body_dir = None
 
+        # smooth the body direction with the filter's prediction
+        if self.localizer == WorldModel.LOCALIZER_FILTER:
+            self.set_filtered_direction(
+                    self.motion_filter.correct_direction(self.abs_body_dir))
+
+        # work out how fast everything that moves is moving
+        velocity.estimate_velocities([self.ball] + self.players,
+                velocity.own_velocity(self.speed_amount, self.speed_direction),
+                self.abs_neck_dir)
+
+        # work out where everything is once for this cycle's queries
+        self.snapshot = snapshot.WorldSnapshot(self)
+
+        # and remember it for when things leave our view
+        self.memory.update(self.snapshot, self.sim_time, self.server_parameters)
+
+        if instruments is not None:
+            instruments.process_new_info.add(time.time() - start)
+
+    def predict_motion(self):
+        """
+        Called on every 'sense_body'.  If we localize with LOCALIZER_FILTER,
+        moves our position and direction forward by the command we sent last
+        cycle and the speed just reported, so they stay current between
+        'see' messages.
+        """
+
+        # the command is used up either way, so a stale one is never applied
+        command = self.ah.sent_primary
+        self.ah.sent_primary = None
+
+        if self.localizer != WorldModel.LOCALIZER_FILTER:
+            return
+
+        self.motion_filter.predict(self.server_parameters, command,
+                self.speed_amount, self.speed_direction, self.neck_direction)
+
+        coords = self.motion_filter.get_position()
+        if coords is not None:
+            self.abs_coords = coords
+        self.set_filtered_direction(self.motion_filter.body_dir)
+
+    def set_filtered_direction(self, body_dir):
+        """
+        Sets our absolute body direction, and our neck direction from it, to
+        one from the motion filter.
+        """
+
+        if body_dir is None:
+            return
+
+        self.abs_body_dir = body_dir
+        if self.neck_direction is not None:
+            self.abs_neck_dir = (body_dir + self.neck_direction) % 360
+
     def is_playon(self):
         """
         Tells us whether it's play time
@@ -496,9 +685,9 @@ class WorldModel:
         relative_dir = self.get_angle_to_point(point)
 
         if relative_dir > 180:
-            relative_dir = relative_dir - 180
+            relative_dir = relative_dir - 360
         elif relative_dir < -180:
-            relative_dir = relative_dir + 180
+            relative_dir = relative_dir + 360
 
         # turn to that angle
         self.ah.turn(relative_dir)
@@ -514,18 +703,24 @@ class WorldModel:
         if obj.distance is None:
             return None
 
-        # get the components of the vector to the object
-        dx = obj.distance * math.cos(obj.direction)
-        dy = obj.distance * math.sin(obj.direction)
+        # objects from the last 'see' were worked out when it arrived, as long
+        # as we haven't moved or turned since.
+        if (self.snapshot.abs_coords == self.abs_coords and
+                self.snapshot.abs_neck_dir == self.abs_neck_dir and
+                self.snapshot.has_object(obj)):
+            return self.snapshot.get_coords(obj)
 
-        # return the point the object is at relative to our current position
-        return (self.abs_coords[0] + dx, self.abs_coords[1] + dy)
+        return snapshot.absolute_coords(self.abs_coords, self.abs_neck_dir,
+                obj.distance, obj.direction)
 
     def teleport_to_point(self, point):
         """
         Teleports the player to a given (x, y) point using the 'move' command.
         """
 
+        # nothing we saw from where we were is worth extrapolating from
+        self.memory.clear()
+
         self.ah.move(point[0], point[1])
 
     def align_neck_with_body(self):
@@ -543,22 +738,7 @@ class WorldModel:
         Returns the uniform number of the fastest teammate to some point.
         """
 
-        # holds tuples of (player dist to point, player)
-        distances = []
-        for p in self.players:
-            # skip enemy and unknwon players
-            if p.side == self.side:
-                # find their absolute position
-                p_coords = self.get_object_absolute_coords(p)
-
-                distances.append((self.euclidean_distance(point, p_coords), p))
-
-        # return the nearest known teammate to the given point
-        try:
-            nearest = min(distances)[1]
-            return nearest
-        except:
-            return None
+        return self.snapshot.nearest_teammate_to_point(point)
 
     # Keng-added
     def get_nearest_teammate(self):
@@ -566,27 +746,7 @@ class WorldModel:
         Returns the teammate player closest to self.
         """
 
-        # holds tuples of (player dist to point, player)
-        distances = []
-        # print "checking from get_nearest_teammate"
-        # print "selfside", self.side
-        for p in self.players:
-            # print p.side
-            # print p.side == self.side
-            # skip enemy and unknwon players
-            if p.side == self.side:
-                # find their absolute position
-                p_coords = self.get_object_absolute_coords(p)
-
-                distances.append((self.get_distance_to_point(p_coords), p))
-
-        # print "finally", distances
-        # return the nearest known teammate to the given point
-        try:
-            nearest = min(distances)[1]
-            return nearest
-        except:
-            return None
+        return self.snapshot.nearest_teammate()
 
     # Keng-added
     def get_nearest_enemy(self):
@@ -594,22 +754,7 @@ class WorldModel:
         Returns the enemy player closest to self.
         """
 
-        # holds tuples of (player dist to point, player)
-        distances = []
-        for p in self.players:
-            # skip enemy and unknwon players
-            if p.side != self.side:
-                # find their absolute position
-                p_coords = self.get_object_absolute_coords(p)
-
-                distances.append((self.get_distance_to_point(p_coords), p))
-
-        # return the nearest known teammate to the given point
-        try:
-            nearest = min(distances)[1]
-            return nearest
-        except:
-            return None
+        return self.snapshot.nearest_enemy()
 
     # Keng-added
     def is_ball_owned_by_us(self):
@@ -617,15 +762,7 @@ class WorldModel:
         Returns if the ball is in possession by our team.
         """
 
-        # holds tuples of (player dist to point, player)
-        for p in self.players:
-            # skip enemy and unknwon players
-            if p.side == self.side and self.euclidean_distance(self.get_object_absolute_coords(self.ball), self.get_object_absolute_coords(p)) < self.server_parameters.kickable_margin:
-                return True
-            else:
-                continue
-
-        return False
+        return self.snapshot.is_ball_owned_by_us()
 
     # Keng-added
     def is_ball_owned_by_enemy(self):
@@ -633,15 +770,148 @@ class WorldModel:
         Returns if the ball is in possession by the enemy team.
         """
 
-        # holds tuples of (player dist to point, player)
-        for p in self.players:
-            # skip enemy and unknwon players
-            if p.side != self.side and self.euclidean_distance(self.get_object_absolute_coords(self.ball), self.get_object_absolute_coords(p)) < self.server_parameters.kickable_margin:
-                return True
-            else:
-                continue
+        return self.snapshot.is_ball_owned_by_enemy()
+
+    def is_clear(self, point):
+        """
+        Returns whether the nearest enemy is out of the way of the straight
+        path from us to some point.
+        """
+
+        return self.snapshot.is_clear(point)
+
+    def set_player_param_message(self, msg):
+        """
+        Stores the raw text of a 'player_param' message, to be parsed by
+        get_player_params if it's ever needed.
+        """
+
+        self.player_param_message = msg
+        self.player_params = None
+
+    def set_server_param_message(self, msg):
+        """
+        Takes our server parameters from the raw text of a 'server_param'
+        message.  They may be shared with other world models, see
+        load_server_parameters.
+        """
+
+        self.server_parameters = load_server_parameters(msg)
+        self.server_param_message = msg
+        self.server_param_received.set()
+
+    def add_player_type_message(self, msg):
+        """
+        Stores the raw text of a 'player_type' message, to be parsed by
+        get_player_types if it's ever needed.
+        """
+
+        self.player_type_messages.append(msg)
+        self.player_types = None
+
+    def _parse_params(self, msg):
+        """
+        Parses a message made up of (name value) pairs into a dict.
+        """
+
+        params = {}
+        for param in message_parser.parse_fast(msg)[1:]:
+            if len(param) == 2:
+                params[param[0]] = param[1]
+
+        return params
+
+    def get_player_params(self):
+        """
+        Returns the parameters of the 'player_param' message as a dict of
+        values by name, or None if we haven't been sent one.  The message is
+        parsed the first time this is called.
+        """
+
+        if self.player_params is None and self.player_param_message is not None:
+            self.player_params = self._parse_params(self.player_param_message)
+
+        return self.player_params
+
+    def get_player_types(self):
+        """
+        Returns the heterogeneous player types we've been sent, as a dict
+        mapping each type's id to a dict of its parameters by name.  The
+        messages are parsed the first time this is called.
+        """
+
+        if self.player_types is None:
+            self.player_types = {}
+            for msg in self.player_type_messages:
+                params = self._parse_params(msg)
+                self.player_types[params.get("id")] = params
 
-        return False
+        return self.player_types
+
+    def get_ball_estimate(self):
+        """
+        Returns an (x, y, confidence) estimate of where the ball is now, from
+        where we last saw it and how it was moving, or None if we don't
+        remember it.  Confidence falls from 1 the longer ago that was.
+        """
+
+        return self.memory.get_ball(self.sim_time, self.server_parameters)
+
+    def get_player_estimate(self, side, uniform_number):
+        """
+        Returns an (x, y, confidence) estimate of where the given player is
+        now, or None if we don't remember them.
+        """
+
+        return self.memory.get_player(side, uniform_number, self.sim_time,
+                self.server_parameters)
+
+    def get_ball_intercept(self):
+        """
+        Returns a (cycles, distance, direction) tuple for the soonest point
+        where we could reach the ball, relative to us like the ball's own
+        distance and direction.  If we don't know how the ball is moving,
+        that's just where it is.  Returns None if we can't see the ball.
+        """
+
+        return self.snapshot.ball_intercept()
+
+    def search_for_ball(self):
+        """
+        Turns towards where the ball should be if we saw it recently enough,
+        otherwise turns a fixed amount to look around for it.
+        """
+
+        ball = self.get_ball_estimate()
+        if (ball is not None and ball[2] >= WorldModel.BALL_SEARCH_CONFIDENCE
+                and self.abs_body_dir is not None):
+            self.turn_body_to_point((ball[0], ball[1]))
+        else:
+            self.ah.turn(30)
+
+    def get_pass_candidates(self, goal):
+        """
+        Returns (score, player, coords) tuples for every teammate closer than
+        us to the given goal with a clear lane to them, best first.
+        """
+
+        return self.snapshot.pass_candidates(goal)
+
+    def get_best_pass(self, goal):
+        """
+        Returns the (score, player, coords) of the best pass towards the given
+        goal, or None if there's no teammate worth passing to.
+        """
+
+        return self.snapshot.best_pass(goal)
+
+    def get_best_shot(self, goal):
+        """
+        Returns the clearest point to shoot at across the mouth of the goal
+        centered on the given point.
+        """
+
+        return self.snapshot.best_shot(goal)
 
     def get_stamina(self):
         """
@@ -841,3 +1111,36 @@ class ServerParameters:
         self.wind_rand = 0
         self.wind_random = 0
 
+# the ServerParameters set by each distinct 'server_param' message, by its
+# text.  every world model in a process, and in any process forked from it,
+# shares the one for the message it got, so none of them may change it.
+_server_parameters = {}
+
+def load_server_parameters(text):
+    """
+    Returns the ServerParameters set by the raw text of a 'server_param'
+    message.  Each text is only parsed the first time it's seen, and the same
+    object is returned for it every time after that.
+    """
+
+    params = _server_parameters.get(text)
+    if params is not None:
+        return params
+
+    params = ServerParameters()
+
+    # each list is two items: a value name and its value
+    for param in message_parser.parse_fast(text)[1:]:
+        if len(param) != 2:
+            continue
+
+        # set the attribute if it was accounted for, otherwise alert the user
+        key, value = param
+        if hasattr(params, key):
+            setattr(params, key, value)
+        else:
+            raise AttributeError("Couldn't find a matching parameter in "
+                    "ServerParameters class: '%s'" % key)
+
+    _server_parameters[text] = params
+    return params
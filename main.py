@@ -6,6 +6,8 @@ import random
 import sys
 import multiprocessing as mp
 import os
+import signal
+import argparse
 
 # import agent types (positions)
 from aigent.soccerpy.agent import Agent as A0
@@ -16,13 +18,89 @@ from aigent.agent_2 import Agent as A2
 # goalie
 from aigent.agent_3 import Agent as A3
 
+from aigent.soccerpy import select_loop
+from aigent.soccerpy.world_model import WorldModel
+from aigent.soccerpy import stress
+
 # set team
 TEAM_NAME = 'Keng'
 NUM_PLAYERS = 11
 
+# how each agent runs: two threads (A0.RUNTIME_THREADED) or a single thread
+# driven by select (A0.RUNTIME_SELECT).
+RUNTIME = A0.RUNTIME_THREADED
+
+# how often, in seconds, packed worker processes report cycle deadline misses
+REPORT_INTERVAL = 10.0
+
+# how long, in seconds, the preloading launcher waits for the first agent to
+# pass on the server's parameters before forking the rest without them
+PRELOAD_TIMEOUT = 2.0
+
 
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description="Run a team of agents.")
+    parser.add_argument("--workers", type=int, default=None,
+            help="pack all agents onto this many processes, each driving its "
+                 "agents from one select loop (default: one process per "
+                 "agent)")
+    parser.add_argument("--instrument", metavar="DIR", default=None,
+            help="time each agent's runtime, dumping the timings to "
+                 "DIR/agent_<position>.txt every few seconds")
+    parser.add_argument("--host", default="localhost",
+            help="address of the server (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=6000,
+            help="port of the server (default: %(default)s)")
+    parser.add_argument("--team", default=TEAM_NAME,
+            help="our team's name (default: %(default)s)")
+    parser.add_argument("--recv-into", action="store_true",
+            help="receive each agent's messages into one reusable buffer and "
+                 "parse them in place")
+    parser.add_argument("--drain", action="store_true",
+            help="have threaded agents handle every waiting message before "
+                 "thinking, instead of thinking after each")
+    parser.add_argument("--see-decoder", action="store_true",
+            help="decode each agent's 'see' messages straight into reusable "
+                 "columns")
+    parser.add_argument("--localizer", default=A0.LOCALIZER,
+            choices=(WorldModel.LOCALIZER_KMEANS,
+                WorldModel.LOCALIZER_LEAST_SQUARES,
+                WorldModel.LOCALIZER_FILTER),
+            help="how each agent finds its position (default: %(default)s)")
+    parser.add_argument("--preload", action="store_true",
+            help="build every agent's tables before forking the agents, and "
+                 "start the first alone so the rest share the server "
+                 "parameters it receives")
+    parser.add_argument("--stress", action="store_true",
+            help="instead of playing, run the team as it would be run "
+                 "against a local stand-in server with ever shorter cycles, "
+                 "down to 10ms, and report the fastest rate every agent "
+                 "keeps up with")
+    parser.add_argument("--stress-cycles", type=int,
+            default=stress.STRESS_CYCLES,
+            help="cycles to run at each rate when stressing (default: "
+                 "%(default)s)")
+    args = parser.parse_args()
+
+    if args.preload and args.workers is not None:
+        parser.error("--preload only forks agents one to a process")
+
+    # every agent type inherits these from the base agent
+    A0.RECEIVE_INTO_BUFFER = args.recv_into
+    A0.DRAIN_MESSAGES = args.drain
+    A0.USE_SEE_DECODER = args.see_decoder
+    A0.LOCALIZER = args.localizer
+
+    def instrument(agent, position):
+        """
+        Enables an agent's instruments if asked to on the command line.
+        """
+
+        if args.instrument is not None:
+            agent.enable_instruments(os.path.join(args.instrument,
+                "agent_%d.txt" % position), name="agent %d" % position)
+
     # return type of agent: midfield, striker etc.
     def agent_type(position):
     	return {
@@ -35,13 +113,22 @@ if __name__ == "__main__":
     	}.get(position, A1)
 
     # spawn an agent of team_name, with position
-    def spawn_agent(team_name, position):
+    def spawn_agent(team_name, position, conn=None):
         """
-        Used to run an agent in a seperate physical process.
+        Used to run an agent in a seperate physical process.  If given the
+        sending end of a pipe, the text of the server's parameters is sent
+        down it as soon as they arrive.
         """
         # return type of agent by position, construct
         a = agent_type(position)()
-        a.connect("localhost", 6000, team_name)
+        a.connect(args.host, args.port, team_name, runtime=RUNTIME)
+        instrument(a, position)
+
+        if conn is not None:
+            conn.send(a.wait_for_server_parameters(PRELOAD_TIMEOUT))
+            conn.close()
+
+        # with the select runtime, this only returns once the agent stops
         a.play()
 
         # we wait until we're killed
@@ -49,18 +136,110 @@ if __name__ == "__main__":
             # we sleep for a good while since we can only exit if terminated.
             time.sleep(1)
 
-    # spawn all agents as seperate processes for maximum processing efficiency
+    # run several agents in one process
+    def spawn_worker(team_name, positions):
+        """
+        Used to run a group of agents in a single physical process, all driven
+        by one select loop.  Reports each agent's cycle deadline misses every
+        REPORT_INTERVAL seconds, and once more when terminated.
+        """
+
+        # make termination unwind normally so we get to report
+        def terminate(signum, frame):
+            raise SystemExit()
+        signal.signal(signal.SIGTERM, terminate)
+
+        # the agents connect without waiting for the server to reply, so their
+        # handshakes all proceed together once the loop runs.
+        loop = select_loop.SelectLoop(poll_interval=REPORT_INTERVAL)
+        for position in positions:
+            a = agent_type(position)()
+            a.connect(args.host, args.port, team_name,
+                    runtime=A0.RUNTIME_SELECT, loop=loop)
+            instrument(a, position)
+            a.play(loop)
+
+        try:
+            while len(loop.agents) > 0:
+                next_report = time.time() + REPORT_INTERVAL
+                while len(loop.agents) > 0 and time.time() < next_report:
+                    loop.run_once(max(0, next_report - time.time()))
+
+                print "Worker %d cycle deadline misses:" % os.getpid()
+                loop.report()
+        except KeyboardInterrupt:
+            # the parent is shutting everything down
+            pass
+        finally:
+            print "Worker %d final cycle deadline misses:" % os.getpid()
+            loop.report()
+
+    if args.stress:
+        results, saturation = stress.find_saturation([agent_type(position)
+            for position in xrange(1, NUM_PLAYERS + 1)],
+            cycles=args.stress_cycles, workers=args.workers)
+        sys.exit(0 if saturation is not None else 1)
+
     agentthreads = []
-    for position in xrange(1, NUM_PLAYERS+1):
-        print "  Spawning agent %d..." % position
+    if args.preload:
+        # every agent process is forked from this one, so whatever's built
+        # here is shared by all of them.
+        for position in xrange(1, NUM_PLAYERS + 1):
+            agent_type(position).preload()
 
-        at = mp.Process(target=spawn_agent, args=(TEAM_NAME, position))
+        # the first agent passes on the server's parameters, which the rest
+        # then share instead of each parsing their own.
+        recv_conn, send_conn = mp.Pipe(False)
+        at = mp.Process(target=spawn_agent, args=(args.team, 1, send_conn))
         at.daemon = True
         at.start()
-
         agentthreads.append(at)
 
-    print "Spawned %d agents." % len(agentthreads)
+        server_param_message = None
+        if recv_conn.poll(PRELOAD_TIMEOUT):
+            server_param_message = recv_conn.recv()
+        A0.preload(server_param_message)
+
+        for position in xrange(2, NUM_PLAYERS + 1):
+            at = mp.Process(target=spawn_agent, args=(args.team, position))
+            at.daemon = True
+            at.start()
+            agentthreads.append(at)
+
+        print "Spawned %d agents, %s shared server parameters." % (
+                len(agentthreads),
+                "with" if server_param_message is not None else "without")
+    elif args.workers is None:
+        # spawn all agents as seperate processes for maximum processing
+        # efficiency
+        for position in xrange(1, NUM_PLAYERS+1):
+            print "  Spawning agent %d..." % position
+
+            at = mp.Process(target=spawn_agent, args=(args.team, position))
+            at.daemon = True
+            at.start()
+
+            agentthreads.append(at)
+
+        print "Spawned %d agents." % len(agentthreads)
+    else:
+        # deal positions out to the workers round-robin
+        for worker in xrange(args.workers):
+            positions = range(worker + 1, NUM_PLAYERS + 1, args.workers)
+            if len(positions) == 0:
+                continue
+
+            print "  Spawning worker %d with agents %s..." % (worker,
+                    ", ".join(str(p) for p in positions))
+
+            at = mp.Process(target=spawn_worker, args=(args.team, positions))
+            at.daemon = True
+            at.start()
+
+            agentthreads.append(at)
+
+        print "Spawned %d agents in %d workers." % (NUM_PLAYERS,
+                len(agentthreads))
     print
     print "Playing soccer..."
 